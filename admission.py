@@ -0,0 +1,168 @@
+"""
+Admission control - per-client rate limits and a cap on in-flight completions
+"""
+import asyncio
+import hashlib
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+# Per client (API key, or session when the server key is used); 0 disables.
+# Limits are per worker process.
+RATE_LIMIT_PER_MINUTE = float(os.getenv("RATE_LIMIT_PER_MINUTE", "20"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "6"))
+# Model calls running at once per worker (0: unlimited), and how many more may wait
+MAX_INFLIGHT_COMPLETIONS = int(os.getenv("MAX_INFLIGHT_COMPLETIONS", "4"))
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "16"))
+ADMISSION_MAX_WAIT = float(os.getenv("ADMISSION_MAX_WAIT", "10"))  # seconds
+MAX_TRACKED_CLIENTS = 10000
+
+
+class Rejected(Exception):
+    """Turned away before reaching the model; ``retry_after`` in whole seconds."""
+
+    def __init__(self, status: int, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.status = status
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+def client_key(api_key: Optional[str], session_id: str) -> str:
+    """Who a request is charged to: its own API key, else its session."""
+    if api_key:
+        return "key:" + hashlib.blake2b(api_key.encode("utf-8"), digest_size=8).hexdigest()
+    return "session:" + session_id
+
+
+class AdmissionController:
+    """Token buckets per client plus a bounded queue in front of the model.
+
+    ``admit`` runs before any work is done for a turn: it takes a token from
+    the client's bucket (refilled at ``rate_per_minute``, holding at most
+    ``burst``) and refuses outright when the wait queue is already full, so
+    bursts are turned away with a Retry-After instead of spending upstream
+    quota. ``slot`` then wraps the model call itself: at most
+    ``max_inflight`` run at once and the rest wait up to ``max_wait``
+    seconds, which bounds the tail latency a queued turn can see.
+    """
+
+    def __init__(self, rate_per_minute: float = RATE_LIMIT_PER_MINUTE, burst: int = RATE_LIMIT_BURST,
+                 max_inflight: int = MAX_INFLIGHT_COMPLETIONS, max_queue: int = ADMISSION_QUEUE,
+                 max_wait: float = ADMISSION_MAX_WAIT):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(burst, 1)
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        # client key -> [tokens, last refill (monotonic)]
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.inflight = 0
+        self.waiting = 0
+        self._hold_ewma = 2.0  # seconds a completion holds its slot
+
+        self.admitted = 0
+        self.rate_limited = 0
+        self.overloaded = 0
+        self.timed_out = 0
+        self.refunded = 0
+        self.peak_waiting = 0
+
+    # ---- Rate limit ----
+
+    def _bucket(self, key: str, now: float) -> list:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [float(self.burst), now]
+            while len(self._buckets) > MAX_TRACKED_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, key: str):
+        """Charge one turn to ``key``; raises Rejected (429 / 503) if it can't run."""
+        if self.max_inflight > 0 and self.waiting >= self.max_queue:
+            self.overloaded += 1
+            raise Rejected(503, self._queue_retry_after(), "queue full")
+        if self.rate > 0:
+            with self._lock:
+                bucket = self._bucket(key, time.monotonic())
+                if bucket[0] < 1:
+                    self.rate_limited += 1
+                    raise Rejected(429, math.ceil((1 - bucket[0]) / self.rate), "rate limit")
+                bucket[0] -= 1
+        self.admitted += 1
+
+    def refund(self, key: str):
+        """Give the token back (the turn never reached the model: cache hit)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket[0] = min(self.burst, bucket[0] + 1)
+                self.refunded += 1
+
+    # ---- Concurrency ----
+
+    def _queue_retry_after(self) -> int:
+        """Rough time for the queue ahead to drain."""
+        return max(1, math.ceil(self._hold_ewma * (self.waiting + 1) / max(self.max_inflight, 1)))
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the ``max_inflight`` model slots for the duration of the block."""
+        if self.max_inflight <= 0:
+            yield
+            return
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_inflight)
+        if not self._slots.locked():
+            await self._slots.acquire()
+        elif self.waiting >= self.max_queue:
+            self.overloaded += 1
+            raise Rejected(503, self._queue_retry_after(), "queue full")
+        else:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.max_wait)
+            except asyncio.TimeoutError:
+                self.timed_out += 1
+                raise Rejected(503, self._queue_retry_after(), "queue wait timed out")
+            finally:
+                self.waiting -= 1
+
+        self.inflight += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._slots.release()
+            self._hold_ewma = 0.8 * self._hold_ewma + 0.2 * (time.monotonic() - started)
+
+    def stats(self) -> Dict:
+        return {
+            "rate_per_minute": self.rate * 60,
+            "burst": self.burst,
+            "max_inflight": self.max_inflight,
+            "inflight": self.inflight,
+            "waiting": self.waiting,
+            "peak_waiting": self.peak_waiting,
+            "admitted": self.admitted,
+            "rate_limited": self.rate_limited,
+            "overloaded": self.overloaded,
+            "timed_out": self.timed_out,
+            "refunded": self.refunded,
+            "avg_slot_seconds": round(self._hold_ewma, 3),
+        }
@@ -0,0 +1,100 @@
+"""
+Benchmark: a chat burst with and without admission control, against fake_groq
+
+A burst of turns from a few clients arrives at once. Without admission
+control every turn goes upstream concurrently; with it, turns over a
+client's rate are refused up front (429) and the rest queue for a bounded
+number of completion slots (503 once the queue is full or the wait too long).
+The fake upstream enforces a free-tier style requests-per-minute quota.
+
+Usage: python benchmarks/bench_admission.py [--clients 6] [--turns 10] [--latency-ms 300]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from groq import AsyncGroq
+
+from admission import AdmissionController, Rejected
+from model_router import ModelManager
+from fake_groq import FakeGroq
+
+MESSAGES = [{"role": "user", "content": "hi riko"}]
+
+
+async def turn(manager, client, admission, key: str, outcomes: dict, latencies: list):
+    started = time.perf_counter()
+    try:
+        if admission is not None:
+            admission.admit(key)
+            async with admission.slot():
+                await manager.chat_completion(client, MESSAGES)
+        else:
+            await manager.chat_completion(client, MESSAGES)
+    except Rejected as e:
+        outcomes[e.status] = outcomes.get(e.status, 0) + 1
+        return
+    except Exception:
+        outcomes["error"] = outcomes.get("error", 0) + 1
+        return
+    outcomes[200] = outcomes.get(200, 0) + 1
+    latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def burst(label: str, fake: FakeGroq, admission, args):
+    http_client = httpx.AsyncClient(timeout=httpx.Timeout(30, connect=1.0),
+                                    limits=httpx.Limits(max_connections=200))
+    client = AsyncGroq(api_key="fake-key", base_url=fake.url, http_client=http_client, max_retries=0)
+    manager = ModelManager()
+    before = sum(fake.requests.values())
+    outcomes, latencies = {}, []
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):  # Router logs every attempt
+        await asyncio.gather(*(
+            turn(manager, client, admission, f"session:c{c}", outcomes, latencies)
+            for t in range(args.turns) for c in range(args.clients)
+        ))
+    elapsed = time.perf_counter() - started
+    await client.close()
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0
+    print(f"  {label:<6} upstream calls {sum(fake.requests.values()) - before:3d}   outcomes {outcomes}   "
+          f"served p50 {pick(0.5):7.1f} ms  p99 {pick(0.99):7.1f} ms   burst {elapsed:5.2f} s")
+
+
+async def main_async(args):
+    print(f"{args.clients} clients x {args.turns} turns at once, upstream {args.latency_ms:g} ms, "
+          f"quota {args.rpm} requests/min")
+    for label, admission in (("before", None), ("after", AdmissionController(max_wait=args.max_wait))):
+        fake = FakeGroq(latency_ms=args.latency_ms, rpm=args.rpm).start()
+        try:
+            await burst(label, fake, admission, args)
+            print(f"         upstream 429s {fake.rate_limited}")
+        finally:
+            fake.stop()
+        if admission is not None:
+            s = admission.stats()
+            print(f"         admitted {s['admitted']}, rate limited {s['rate_limited']}, "
+                  f"overloaded {s['overloaded']}, wait timeouts {s['timed_out']}, peak queue {s['peak_waiting']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clients", type=int, default=6)
+    parser.add_argument("--turns", type=int, default=10, help="turns per client, all at once")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--max-wait", type=float, default=5)
+    parser.add_argument("--rpm", type=int, default=30, help="fake upstream quota (Groq free tier: 30)")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
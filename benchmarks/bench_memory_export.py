@@ -0,0 +1,108 @@
+"""
+Benchmark: bulk memory export/import vs the JSON dump and row-by-row paths
+
+Seeds a throwaway DB with --messages turns over --sessions sessions (a share
+of them archived by retention, as in a long-running install), then times:
+- before: get_all_history() per session into one JSON document, and
+  replaying turns one add_message() at a time (timed on a sample and
+  extrapolated)
+- after: memory_export.export_memory / import_memory
+Peak memory is measured with tracemalloc around each step.
+
+Usage: python benchmarks/bench_memory_export.py [--messages 1000000] [--sessions 1000] [--sample 20000]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import retention
+from memory_export import export_memory, import_memory
+from memory_manager import MemoryManager
+from retention import RetentionManager
+
+SEED_BATCH = 50000
+
+
+def seed(memory: MemoryManager, messages: int, sessions: int):
+    for start in range(0, messages, SEED_BATCH):
+        rows = [(("user", "assistant")[i % 2],
+                 f"turn {i}: " + ("mujhe cricket pasand hai aur kal match hai " if i % 2 else "accha! kaun jeetega? ") * (1 + i % 3),
+                 f"2026-01-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00", f"user-{i % sessions}")
+                for i in range(start, min(messages, start + SEED_BATCH))]
+        with memory.store.transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO short_term_memory (role, content, timestamp, session_id) VALUES (?, ?, ?, ?)", rows)
+    retention.ARCHIVE_AFTER_DAYS = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        RetentionManager(memory).compact()
+
+
+@contextlib.contextmanager
+def measure(label: str, scale: float = 1.0):
+    """Prints wall time (times ``scale``, for extrapolated samples) and peak Python heap."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    yield
+    elapsed = (time.perf_counter() - started) * scale
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    note = " (extrapolated)" if scale != 1.0 else ""
+    print(f"  {label:<40} {elapsed:8.2f} s{note:<15}  peak heap {peak / 1e6:8.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1000000)
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--sample", type=int, default=20000, help="turns replayed through add_message")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = MemoryManager(os.path.join(tmp, "source.db"))
+        started = time.perf_counter()
+        seed(source, args.messages, args.sessions)
+        live = source.store.query_one("SELECT COUNT(*) FROM short_term_memory")[0]
+        print(f"Seeded {args.messages:,} turns over {args.sessions:,} sessions ({args.messages - live:,} archived) "
+              f"in {time.perf_counter() - started:.1f}s; DB {os.path.getsize(source.db_path) / 1e6:.0f} MB")
+
+        print("before:")
+        dump_path = os.path.join(tmp, "dump.json")
+        with measure("JSON dump via get_all_history"):
+            sessions = [r[0] for r in source.store.query("SELECT DISTINCT session_id FROM short_term_memory")]
+            dump = {s: source.get_all_history(s) for s in sessions}
+            with open(dump_path, "w", encoding="utf-8") as f:
+                json.dump(dump, f, ensure_ascii=False)
+        print(f"  {'':<40} {os.path.getsize(dump_path) / 1e6:8.1f} MB")
+        del dump
+
+        replay = MemoryManager(os.path.join(tmp, "replay.db"), durability="sync")
+        sample = source.store.query("SELECT role, content, session_id FROM short_term_memory LIMIT ?", (args.sample,))
+        with measure(f"row-by-row add_message ({len(sample):,} turns)", scale=args.messages / max(len(sample), 1)):
+            for role, content, session_id in sample:
+                replay.add_message(role, content, session_id)
+        replay.close()
+
+        print("after:")
+        export_path = os.path.join(tmp, "memory.rkm")
+        with measure("export_memory"):
+            result = export_memory(source, export_path)
+        print(f"  {'':<40} {result['bytes'] / 1e6:8.1f} MB, {sum(result['rows'].values()):,} rows")
+        target = MemoryManager(os.path.join(tmp, "target.db"))
+        with measure("import_memory"):
+            result = import_memory(target, export_path)
+        print(f"  {'':<40} {sum(result['rows'].values()):,} rows "
+              f"({sum(result['rows'].values()) / result['seconds']:,.0f} rows/s)")
+        target.close()
+        source.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Benchmark: background memory extraction - upstream calls, and chat latency while it runs
+
+Simulated users chat through /api/chat (in-process, fake_groq upstream).
+Pass 1 runs with the extractor idle; pass 2 runs the same load with an
+extraction pass forced every --pass-ms. Reports chat latency for both,
+then how many extraction calls the conversations needed against the one
+call per user message that per-message extraction would make. Runs with
+async durability and checks that a fact said in a turn is already in that
+turn's prompt, though its write is still queued.
+
+Usage: python benchmarks/bench_memory_extraction.py [--users 10] [--turns 12] [--latency-ms 300]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from fake_groq import FakeGroq
+
+LINES = ["mera naam {name} hai", "main {city} mein rehta hoon", "mujhe {topic} bahut pasand hai",
+         "main {topic} seekh raha hoon", "kal mera exam hai", "{topic} ke baare mein kuch batao",
+         "aaj ka din kaisa raha tumhara?", "mere ghar mein ek billi hai"]
+NAMES = ["Aman", "Priya", "Rahul", "Sneha", "Vikram", "Neha"]
+CITIES = ["Delhi", "Pune", "Jaipur", "Indore", "Kochi"]
+TOPICS = ["cricket", "biryani", "python coding", "guitar", "old hindi songs", "chess"]
+
+
+async def chat(client, args, label: str, user: int, latencies: list):
+    rng = random.Random(f"{label}-{user}")
+    for _ in range(args.turns):
+        message = rng.choice(LINES).format(name=rng.choice(NAMES), city=rng.choice(CITIES), topic=rng.choice(TOPICS))
+        started = time.perf_counter()
+        r = await client.post("/api/chat", json={"message": message, "session_id": f"{label}-{user}"})
+        if r.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+
+async def load(server, args, label: str, extract: bool) -> list:
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://app", timeout=60)
+    latencies = []
+    done = asyncio.Event()
+
+    async def extract_loop():
+        while not done.is_set():
+            await server.extractor.run_once(force=True)
+            await asyncio.sleep(args.pass_ms / 1000)
+
+    extraction = asyncio.create_task(extract_loop()) if extract else None
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(chat(client, args, label, u, latencies) for u in range(args.users)))
+        done.set()
+        if extraction:
+            await extraction
+    await client.aclose()
+    return sorted(latencies)
+
+
+async def main_async(args, tmp: str):
+    fake = FakeGroq(latency_ms=args.latency_ms).start()
+    os.environ.update({
+        "MEMORY_DB_PATH": os.path.join(tmp, "extract.db"),
+        "GROQ_BASE_URL": fake.url,
+        "GROQ_API_KEY": "fake-key",
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "MAX_INFLIGHT_COMPLETIONS": "0",
+        "RESPONSE_CACHE": "0",
+        "STARTUP_WARMUP": "0",
+        "MEMORY_EXTRACT_INTERVAL": "3600",  # Passes are driven by hand below
+        "MEMORY_DURABILITY": "async",
+    })
+    print(f"{args.users} users x {args.turns} turns, upstream {args.latency_ms:g} ms")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import server
+        async with server.app.router.lifespan_context(server.app):
+            pick = lambda xs, q: xs[min(len(xs) - 1, int(q * len(xs)))] if xs else 0
+            for label, extract in (("idle", False), ("extracting", True)):
+                before = fake.extraction_requests
+                latencies = await load(server, args, label, extract)
+                print(f"  chat with extractor {label:<10}  p50 {pick(latencies, 0.5):7.1f} ms  "
+                      f"p95 {pick(latencies, 0.95):7.1f} ms   extraction calls {fake.extraction_requests - before}")
+
+            # Whatever the forced passes hadn't reached yet (the idle pass's sessions included)
+            with contextlib.redirect_stdout(io.StringIO()):
+                while (await server.extractor.run_once(force=True))["sessions"]:
+                    pass
+            server.memory.flush()
+            user_messages = server.memory.store.query_one(
+                "SELECT COUNT(*) FROM short_term_memory WHERE role = 'user'")[0]
+            facts = server.memory.store.query_one("SELECT COUNT(*) FROM long_term_memory")[0]
+            s = server.extractor.stats()
+            print(f"  {user_messages} user messages: per-message extraction = {user_messages} calls; "
+                  f"batched = {fake.extraction_requests} calls ({s['turns_per_call']} turns per call)")
+            print(f"  long-term facts {facts} (extracted {s['facts_stored']}), summaries saved {s['summaries_saved']}, "
+                  f"failures {s['failures']}")
+
+            # A turn's own fact is queued, not committed, when its prompt is built
+            server.memory.get_memory_summary("same-turn")
+            server.memory.add_message("user", "mera naam Zoya hai", "same-turn")
+            prompt = server._build_messages("mera naam Zoya hai", "same-turn")[0]["content"]
+            same_turn = "Zoya" in prompt
+            print(f"  fact from this turn in this turn's prompt: {'yes' if same_turn else 'NO'}")
+            if not same_turn:
+                raise SystemExit(1)
+    finally:
+        fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=12, help="chat turns per user")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--pass-ms", type=float, default=500, help="pause between forced extraction passes")
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(main_async(args, tmp))
+
+
+if __name__ == "__main__":
+    main()
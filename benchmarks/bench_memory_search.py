@@ -0,0 +1,102 @@
+"""
+Benchmark: relevance-ranked memory retrieval (FTS5 bm25 x importance x recency) at scale
+
+Fills a scratch DB with N long-term facts spread over --sessions sessions
+(--sessions 1 puts them all in one, the worst case), then times MemoryRetriever.search_facts for typical
+user messages against the old importance-ordered query.
+
+Usage: python benchmarks/bench_memory_search.py [--memories 100000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_manager import MemoryManager, normalize_fact
+from memory_search import MemoryRetriever
+
+SUBJECTS = ["chai", "coffee", "cricket", "football", "biryani", "pizza", "guitar", "python", "java", "movies",
+            "anime", "trekking", "yoga", "gym", "reading", "painting", "dogs", "cats", "travel", "music",
+            "arijit", "lofi", "exam", "college", "office", "startup", "pune", "delhi", "mumbai", "bangalore",
+            "maggi", "samosa", "netflix", "chess", "badminton", "photography", "poetry", "cycling", "coding", "dance"]
+TEMPLATES = [
+    ("preference", "user_preference", 3, "mujhe {a} pasand hai aur {b} bhi"),
+    ("preference", "user_preference", 3, "I love {a} but I hate {b}"),
+    ("fact", "user_fact", 4, "I work on {a} projects in {b}"),
+    ("fact", "user_fact", 4, "mere paas {a} aur {b} ka collection hai"),
+    ("personal", "user_name_context", 5, "main hu {a} lover from {b}"),
+]
+QUERIES = [
+    "kal cricket match dekhne chalein?", "koi achi biryani ki recipe batao", "mujhe python seekhna hai",
+    "guitar practice kaise karu", "pune mein kya ghoomne jaun", "exam ki tension ho rahi hai",
+    "netflix pe kya dekhu aaj", "yoga ke benefits kya hain", "chai ya coffee?", "hi riko",
+]
+
+
+def fill(memory: MemoryManager, n: int, sessions: int):
+    now = datetime.now()
+    rows = []
+    for i in range(n):
+        category, key, importance, template = random.choice(TEMPLATES)
+        value = template.format(a=random.choice(SUBJECTS), b=random.choice(SUBJECTS)) + f" #{i}"
+        # --sessions 1: one huge session (worst case); otherwise spread evenly
+        session = "bench" if i % sessions == 0 else f"other-{i % sessions}"
+        timestamp = (now - timedelta(days=random.uniform(0, 365))).isoformat()
+        rows.append((category, key, value, timestamp, random.randint(1, importance), session, normalize_fact(value)))
+    memory.store.executemany(
+        "INSERT INTO long_term_memory (category, key, value, timestamp, importance, session_id, value_norm) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+    )
+
+
+def percentiles(samples: list) -> str:
+    ordered = sorted(samples)
+    pick = lambda p: ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+    return f"p50 {pick(0.5):6.2f} ms  p95 {pick(0.95):6.2f} ms  p99 {pick(0.99):6.2f} ms"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--memories", type=int, default=100000)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = MemoryManager(os.path.join(tmp, "bench.db"), durability="sync")
+        retriever = MemoryRetriever(memory)
+        started = time.perf_counter()
+        fill(memory, args.memories, args.sessions)
+        print(f"Indexed {args.memories} memories over {args.sessions} sessions in "
+              f"{time.perf_counter() - started:.1f}s (FTS5: {memory.fts_enabled})")
+
+        old, new = [], []
+        for i in range(args.queries):
+            query = QUERIES[i % len(QUERIES)]
+            t0 = time.perf_counter()
+            memory.get_long_term_memories(20, session_id="bench")
+            t1 = time.perf_counter()
+            retriever.search_facts(query, "bench")
+            t2 = time.perf_counter()
+            old.append((t1 - t0) * 1000)
+            new.append((t2 - t1) * 1000)
+
+        print(f"before: top-20 by importance      {percentiles(old)}")
+        print(f"after:  relevance-ranked top-5     {percentiles(new)}")
+        print("\nSample results:")
+        for query in QUERIES[:3]:
+            top = retriever.search_facts(query, "bench", k=3)
+            print(f"  {query!r}")
+            for fact in top:
+                print(f"    {fact['score']:.3f} (imp {fact['importance']}) {fact['value']}")
+        memory.close()
+
+
+if __name__ == "__main__":
+    main()
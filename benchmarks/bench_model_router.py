@@ -0,0 +1,130 @@
+"""
+Benchmark: sequential model fallback vs the health-aware router, against fake_groq
+
+Scenarios: primary model hung (never answers), primary down (slow 503s),
+primary decommissioned, and a primary with a slow tail (hedging on).
+
+Usage: python benchmarks/bench_model_router.py [--requests 40] [--timeout 2]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from groq import AsyncGroq
+
+import model_router
+from model_router import ModelManager
+from fake_groq import FakeGroq
+
+MESSAGES = [{"role": "user", "content": "hi riko"}]
+
+
+class LegacyModelManager(ModelManager):
+    """The original behaviour: try every model in order, every time."""
+
+    async def chat_completion(self, client, messages, temperature=0.7, max_tokens=1024):
+        last_error = None
+        for model in self.models:
+            try:
+                completion = await client.chat.completions.create(
+                    model=model, messages=messages, temperature=temperature, max_tokens=max_tokens,
+                )
+                return completion.choices[0].message.content
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+
+def make_client(base_url: str, timeout: float) -> AsyncGroq:
+    # Legacy relied on the HTTP timeout alone; the router adds its own per attempt
+    http_client = httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=1.0))
+    return AsyncGroq(api_key="fake-key", base_url=base_url, http_client=http_client, max_retries=0)
+
+
+async def run(manager, client, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        await manager.chat_completion(client, MESSAGES)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return latencies
+
+
+def report(label: str, latencies: list):
+    ordered = sorted(latencies)
+    p95 = ordered[int(0.95 * (len(ordered) - 1))]
+    print(f"  {label:<8} mean {statistics.mean(ordered):8.1f} ms   p95 {p95:8.1f} ms   "
+          f"total {sum(ordered) / 1000:6.2f} s")
+
+
+async def scenario(name: str, setup, args, hedge: bool = False):
+    fake = FakeGroq(latency_ms=20).start()
+    setup(fake)
+    client = make_client(fake.url, args.timeout)
+    print(f"\n{name}")
+    try:
+        report("before", await run(LegacyModelManager(), client, args.requests))
+        model_router.HEDGE = hedge
+        router = ModelManager()
+        report("after", await run(router, client, args.requests))
+        states = {m: h["state"] for m, h in router.stats()["models"].items()}
+        print(f"  circuits: {states}  hedges fired: {router.hedges_fired}, won: {router.hedge_wins}")
+    finally:
+        model_router.HEDGE = False
+        await client.close()
+        fake.stop()
+
+
+def hung(fake):
+    fake.model("llama-3.1-8b-instant").hang = True
+
+
+def down(fake):
+    behaviour = fake.model("llama-3.1-8b-instant")
+    behaviour.down = True
+    behaviour.latency_ms = 500  # Overloaded upstream: slow 503s
+
+
+def decommissioned(fake):
+    fake.model("llama-3.1-8b-instant").decommissioned = True
+    fake.model("mixtral-8x7b-32768").decommissioned = True
+
+
+def slow_tail(fake):
+    # Mostly fast, with one in ten requests stalling for seconds
+    import random
+
+    behaviour = fake.model("llama-3.1-8b-instant")
+    original = fake._fault
+
+    def flaky(name):
+        if name == "llama-3.1-8b-instant":
+            behaviour.latency_ms = 1500 if random.random() < 0.1 else 20
+        return original(name)
+
+    fake._fault = flaky
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--timeout", type=float, default=2.0, help="per-attempt timeout (s)")
+    args = parser.parse_args()
+
+    model_router.ATTEMPT_TIMEOUT = args.timeout
+    model_router.HEDGE_MIN_DELAY = 0.05
+
+    await scenario("Primary hung (no response until timeout)", hung, args)
+    await scenario("Primary down (503 after 500 ms)", down, args)
+    await scenario("Two models decommissioned", decommissioned, args)
+    await scenario("Primary slow tail, hedging on", slow_tail, args, hedge=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,90 @@
+"""
+Benchmark: memory trigger detection, per-category `in` loops vs the single-pass matcher
+
+Usage: python benchmarks/bench_pattern_matcher.py [--rounds 2000]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_patterns import MEMORY_PATTERNS, memory_matcher
+
+# Realistic user turns: Hinglish, English, Devanagari, commands and small talk
+CORPUS = [
+    "hi riko kya haal hai",
+    "Mera naam Arjun hai aur main Pune se hoon",
+    "YouTube kholo",
+    "Arijit Singh ka gaana laga do",
+    "I am a software engineer, I work at a startup in Bangalore",
+    "मेरा नाम प्रिया है",
+    "mujhe pasand hai chai aur samosa",
+    "i don't like rainy days yaar",
+    "weather batao delhi ka",
+    "मैं हूँ राहुल, मेरी उम्र 24 साल है",
+    "acha sun, kal mera exam hai",
+    "My favourite movie is 3 Idiots",
+    "Google kholo please",
+    "main hu na, tension mat le",
+    "I love playing cricket on weekends",
+    "mere paas ek dog hai uska naam bruno hai",
+    "tumhara naam kya hai?",
+    "remember that my birthday is on 5th June",
+    "ok bye good night",
+    "I’m feeling a bit low today",
+    "मुझे आइसक्रीम पसंद है",
+    "kya tum mujhe ek joke suna sakti ho",
+    "meri umar 19 saal hai aur I study in class 12",
+    "Play some lofi music",
+    "mere ghar pe aaj party hai",
+    "what is the capital of australia",
+    "I prefer tea over coffee honestly",
+    "मैं पढ़ाई करता हूं दिल्ली में",
+    "haha that's funny",
+    "I live in Mumbai near Bandra",
+]
+
+
+def legacy_categories(content: str) -> set:
+    """The original approach: lowercase, then one `in` loop per category."""
+    content_lower = content.lower()
+    found = set()
+    for category, patterns in MEMORY_PATTERNS.items():
+        for pattern in patterns:
+            if pattern in content_lower:
+                found.add(category)
+                break
+    return found
+
+
+def bench(label: str, fn, rounds: int):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in CORPUS:
+            fn(message)
+    elapsed = time.perf_counter() - started
+    calls = rounds * len(CORPUS)
+    print(f"{label:<36} {elapsed * 1e6 / calls:7.2f} µs/message  ({calls} messages)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    bench("before: per-category `in` loops", legacy_categories, args.rounds)
+    bench("after:  matcher.categories()", memory_matcher.categories, args.rounds)
+    bench("after:  matcher.find_all() (spans)", memory_matcher.find_all, args.rounds)
+
+    # Where the two disagree, the matcher's normalization is the reason (e.g. ’ vs ')
+    print("\nDifferences (legacy -> matcher):")
+    for message in CORPUS:
+        old, new = legacy_categories(message), memory_matcher.categories(message)
+        if old != new:
+            print(f"  {message!r}: {sorted(old)} -> {sorted(new)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Benchmark: a retry storm against /api/chat with and without request coalescing
+
+Each simulated user sends a turn and then resubmits the same message a few
+times before the reply arrives (a double-fired wake word, a mobile client
+retrying on a flaky connection). Counts upstream completions, user messages
+stored, and reply latency, with single-flight on and off, against fake_groq.
+
+Usage: python benchmarks/bench_single_flight.py [--users 20] [--copies 3] [--spread-ms 400] [--latency-ms 600]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+from fake_groq import FakeGroq
+
+TOPICS = ["space travel", "cricket", "biryani", "exams", "monsoon", "startups", "gym routine", "Goa trip"]
+
+
+async def storm(client, args, user: int, rng: random.Random, latencies: list, statuses: dict):
+    message = f"{rng.choice(TOPICS)} ke baare mein detail mein samjhao, user {user}"
+    body = {"message": message, "session_id": f"storm-{user}"}
+
+    async def send(delay: float):
+        await asyncio.sleep(delay)
+        started = time.perf_counter()
+        r = await client.post("/api/chat", json=body)
+        statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+        if r.status_code == 200:
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    delays = [0.0] + sorted(rng.uniform(0, args.spread_ms / 1000) for _ in range(args.copies - 1))
+    await asyncio.gather(*(send(d) for d in delays))
+
+
+async def run(server, fake: FakeGroq, args, enabled: bool):
+    server.single_flight.enabled = enabled
+    transport = httpx.ASGITransport(app=server.app)
+    client = httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60)
+    rng = random.Random(args.seed)
+    before = sum(fake.requests.values())
+    stored_before = server.memory.store.query_one("SELECT COUNT(*) FROM short_term_memory WHERE role = 'user'")[0]
+    latencies, statuses = [], {}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        await asyncio.gather(*(storm(client, args, u, rng, latencies, statuses) for u in range(args.users)))
+        server.memory.flush()
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+    stored = server.memory.store.query_one("SELECT COUNT(*) FROM short_term_memory WHERE role = 'user'")[0] - stored_before
+
+    latencies.sort()
+    pick = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] if latencies else 0
+    label = "on" if enabled else "off"
+    print(f"  single-flight {label:<3}  upstream calls {sum(fake.requests.values()) - before:4d}   "
+          f"user messages stored {stored:4d}   statuses {statuses}   "
+          f"p50 {pick(0.5):7.1f} ms  p95 {pick(0.95):7.1f} ms   {elapsed:5.2f} s")
+
+
+async def main_async(args):
+    fake = FakeGroq(latency_ms=args.latency_ms).start()
+    os.environ.update({
+        "MEMORY_DB_PATH": os.path.join(args.tmp, "storm.db"),
+        "GROQ_BASE_URL": fake.url,
+        "GROQ_API_KEY": "fake-key",
+        "RATE_LIMIT_PER_MINUTE": "0",
+        "MAX_INFLIGHT_COMPLETIONS": "0",
+        "RESPONSE_CACHE": "0",
+        "STARTUP_WARMUP": "0",
+    })
+    print(f"{args.users} users x {args.copies} copies of one turn within {args.spread_ms:g} ms, "
+          f"upstream {args.latency_ms:g} ms")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import server
+        async with server.app.router.lifespan_context(server.app):
+            # A fresh seed per pass, so the second pass asks different questions
+            for enabled in (False, True):
+                await run(server, fake, args, enabled)
+                args.seed += 1
+            s = server.single_flight.stats()
+            print(f"  leaders {s['leaders']}, coalesced {s['coalesced']}, abandoned {s['abandoned']}, "
+                  f"peak waiters {s['peak_waiters']}")
+    finally:
+        fake.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=3, help="submits of the same turn per user")
+    parser.add_argument("--spread-ms", type=float, default=400, help="copies arrive within this window")
+    parser.add_argument("--latency-ms", type=float, default=600)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        args.tmp = tmp
+        asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Micro-benchmark: MemoryManager write throughput, connect-per-call vs pooled WAL store vs write-behind
+
+Every row is timed until committed: the write-behind run includes its final flush().
+
+Usage: python benchmarks/bench_sqlite_writes.py [--writes 2000] [--threads 4]
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory_manager import MemoryManager
+
+
+def legacy_add_message(db_path: str, role: str, content: str):
+    """The original add_message write: fresh connection, default journal, commit, close."""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO short_term_memory (role, content, timestamp) VALUES (?, ?, ?)",
+        (role, content, datetime.now().isoformat())
+    )
+    conn.commit()
+    conn.close()
+
+
+def run(label: str, write, writes: int, threads: int, finish=None):
+    per_thread = writes // threads
+
+    def worker():
+        for i in range(per_thread):
+            write(f"benchmark message {i} - thoda lamba sa text taaki row realistic lage")
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    if finish:
+        finish()
+    elapsed = time.perf_counter() - started
+    total = per_thread * threads
+    print(f"{label:<34} {total:>6} writes  {elapsed:7.3f}s  {total / elapsed:10.0f} writes/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writes", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_db = os.path.join(tmp, "legacy.db")
+        MemoryManager(legacy_db).close()
+        # The old code never enabled WAL, so measure against the default rollback journal
+        conn = sqlite3.connect(legacy_db)
+        conn.execute("PRAGMA journal_mode=DELETE")
+        conn.close()
+
+        pooled = MemoryManager(os.path.join(tmp, "pooled.db"), durability="sync")
+        batched = MemoryManager(os.path.join(tmp, "batched.db"), durability="async")
+
+        for threads in (1, args.threads):
+            print(f"--- {threads} thread(s) ---")
+            run("before: connect-per-write", lambda c: legacy_add_message(legacy_db, "assistant", c), args.writes, threads)
+            run("after:  pooled WAL store", lambda c: pooled.add_message("assistant", c), args.writes, threads)
+            run("after:  + write-behind batching", lambda c: batched.add_message("assistant", c), args.writes, threads,
+                finish=batched.flush)
+        pooled.close()
+        batched.close()
+
+
+if __name__ == "__main__":
+    main()
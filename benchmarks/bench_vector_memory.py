@@ -0,0 +1,78 @@
+"""
+Benchmark: vector memory throughput - embedding, incremental indexing and batched cosine top-k
+
+Usage: python benchmarks/bench_vector_memory.py [--memories 100000] [--sessions 100] [--batch 32]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_memory_search import QUERIES, fill
+from memory_manager import MemoryManager
+from vector_memory import VectorMemory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--memories", type=int, default=100000)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=32)
+    args = parser.parse_args()
+
+    random.seed(7)
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = MemoryManager(os.path.join(tmp, "bench.db"), durability="sync")
+        fill(memory, args.memories, args.sessions)
+        vectors = VectorMemory(memory)
+        print(f"Embedder: {vectors.embedder.name}")
+
+        started = time.perf_counter()
+        vectors.sync()
+        elapsed = time.perf_counter() - started
+        print(f"Index build:   {args.memories} facts in {elapsed:.1f}s ({args.memories / elapsed:,.0f} facts/s)")
+
+        # Incremental: a handful of new facts only embeds those
+        for i in range(10):
+            memory.store_long_term("fact", "user_fact", f"I just started learning tabla, lesson {i}", 4, "bench")
+        started = time.perf_counter()
+        vectors.search("tabla", "bench")
+        print(f"Incremental:   10 new facts indexed + searched in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        for label, session in (("one session of many", "bench"), ("across all facts", None)):
+            if session is None:
+                # Worst case: every fact belongs to the searched session
+                memory2 = MemoryManager(os.path.join(tmp, "single.db"), durability="sync")
+                fill(memory2, args.memories, 1)
+                vectors2 = VectorMemory(memory2)
+                vectors2.sync()
+                target, session = vectors2, "bench"
+            else:
+                target = vectors
+            queries = [QUERIES[i % len(QUERIES)] for i in range(args.queries)]
+
+            started = time.perf_counter()
+            for query in queries:
+                target.search(query, session)
+            single = time.perf_counter() - started
+
+            started = time.perf_counter()
+            for i in range(0, len(queries), args.batch):
+                target.search_many(queries[i:i + args.batch], session)
+            batched = time.perf_counter() - started
+
+            print(f"Search ({label}, {len(target._session_rows.get(target._session_codes[session], []))} vectors):")
+            print(f"  single:      {args.queries / single:8,.0f} queries/s  ({single / args.queries * 1000:.2f} ms each)")
+            print(f"  batch of {args.batch}: {args.queries / batched:8,.0f} queries/s  ({batched / args.queries * 1000:.2f} ms each)")
+
+        print("\nSample:", [(f["value"], f["similarity"]) for f in vectors.search("cricket khelne chalein", "bench", 3)])
+        memory.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Evaluation: local intent fast path against a labeled sample
+
+Each line of the sample is {"text", "action", "argument"}; action null means
+the turn should go to the model. Reports precision of the answers the fast
+path gives (action and argument both right), coverage of the labeled
+commands, and classification latency.
+
+Usage: python benchmarks/eval_intents.py [--samples benchmarks/intent_samples.jsonl] [--min-confidence 0.8]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from intent_engine import IntentEngine
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def load(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--samples", default=os.path.join(HERE, "intent_samples.jsonl"))
+    parser.add_argument("--min-confidence", type=float, default=None)
+    parser.add_argument("--rounds", type=int, default=200, help="timing repetitions")
+    args = parser.parse_args()
+
+    samples = load(args.samples)
+    engine = IntentEngine() if args.min_confidence is None else IntentEngine(args.min_confidence)
+
+    answered = correct = commands = covered = 0
+    mistakes = []
+    for sample in samples:
+        expected = sample["action"]
+        intent = engine.classify(sample["text"])
+        if intent is not None and intent.confidence < engine.min_confidence:
+            intent = None
+        if expected:
+            commands += 1
+        if intent is None:
+            if expected:
+                mistakes.append(("missed", sample, None))
+            continue
+        answered += 1
+        if intent.action == expected and intent.argument.lower() == (sample["argument"] or "").lower():
+            correct += 1
+            covered += 1
+        else:
+            mistakes.append(("wrong", sample, intent))
+
+    latencies = []
+    for _ in range(args.rounds):
+        for sample in samples:
+            started = time.perf_counter()
+            engine.classify(sample["text"])
+            latencies.append((time.perf_counter() - started) * 1e6)
+    latencies.sort()
+
+    print(f"Samples: {len(samples)} ({commands} commands, {len(samples) - commands} for the model)")
+    print(f"Precision: {correct}/{answered} = {correct / answered:.1%}" if answered else "Precision: n/a")
+    print(f"Coverage:  {covered}/{commands} = {covered / commands:.1%}" if commands else "Coverage: n/a")
+    print(f"Latency:   p50 {latencies[len(latencies) // 2]:.1f} µs, "
+          f"p99 {latencies[int(len(latencies) * 0.99)]:.1f} µs, max {latencies[-1]:.1f} µs")
+    if mistakes:
+        print("\nMistakes:")
+        for kind, sample, intent in mistakes:
+            got = f"{intent.action}:{intent.argument} ({intent.confidence}, {intent.rule})" if intent else "model"
+            print(f"  {kind:<6} {sample['text']!r}: expected {sample['action']}:{sample['argument']}, got {got}")
+
+
+if __name__ == "__main__":
+    main()
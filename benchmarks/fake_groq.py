@@ -0,0 +1,229 @@
+"""
+Local stand-in for the Groq chat completions API with per-model fault injection
+
+Serves POST /openai/v1/chat/completions (plain JSON and SSE streaming) and
+GET /openai/v1/models, enough for the groq SDK. Each model can be given its own latency, failure rate, or be
+marked down (503), hung (never answers) or decommissioned (400). An optional
+requests-per-minute quota answers 429 like Groq's free tier. Memory-extraction
+prompts (memory_extractor.py) get a JSON reply built from the user's lines.
+
+Usage: python benchmarks/fake_groq.py [--port 8900] [--latency-ms 200] [--down mixtral-8x7b-32768]
+Then:  GROQ_BASE_URL=http://127.0.0.1:8900 GROQ_API_KEY=fake-key python server.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from collections import deque
+from typing import Dict, Optional
+
+REPLY = "Haan ji, main Riko hoon! Batao kya madad karun? 😊"
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients hanging up mid-reply (timeouts, cancelled hedges) are expected
+
+
+class ModelBehaviour:
+    """Fault knobs for one model."""
+
+    def __init__(self, latency_ms: float = 0, fail_rate: float = 0.0, token_ms: float = 0):
+        self.latency_ms = latency_ms  # Before the response (or first token)
+        self.token_ms = token_ms      # Between streamed tokens
+        self.fail_rate = fail_rate
+        self.down = False
+        self.hang = False
+        self.decommissioned = False
+
+
+class FakeGroq:
+    """OpenAI-compatible fake; unknown models get the default behaviour."""
+
+    def __init__(self, latency_ms: float = 0, fail_rate: float = 0.0, token_ms: float = 0, rpm: int = 0):
+        self.default = ModelBehaviour(latency_ms, fail_rate, token_ms)
+        self.rpm = rpm  # 0: no quota
+        self._recent = deque()
+        self.models: Dict[str, ModelBehaviour] = {}
+        self.reply = REPLY
+        self.requests: Dict[str, int] = {}
+        self.extraction_requests = 0
+        self.failed_requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    def model(self, name: str) -> ModelBehaviour:
+        """Per-model knobs, created from the defaults on first use."""
+        with self._lock:
+            if name not in self.models:
+                d = self.default
+                self.models[name] = ModelBehaviour(d.latency_ms, d.fail_rate, d.token_ms)
+            return self.models[name]
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, port: int = 0) -> "FakeGroq":
+        """Serve on a background thread (port 0 picks a free port)."""
+        self._server = _Server(("127.0.0.1", port), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def content_for(self, messages: list) -> str:
+        """The reply text: canned chat, or an extraction JSON for the memory extractor."""
+        if not messages or "memory extractor" not in str(messages[0].get("content", "")):
+            return self.reply
+        with self._lock:
+            self.extraction_requests += 1
+        lines = [line[len("User: "):] for line in str(messages[-1].get("content", "")).splitlines()
+                 if line.startswith("User: ")]
+        facts = [{"category": "fact", "key": f"topic_{i}", "value": f"User ne kaha: {line[:80]}", "importance": 3}
+                 for i, line in enumerate(lines[:3])]
+        return json.dumps({"facts": facts, "summary": "\n".join(f"User: {line[:60]}" for line in lines[-3:])},
+                          ensure_ascii=False)
+
+    def _fault(self, name: str) -> Optional[tuple]:
+        """(status, error body) if this request should fail, after sleeping the latency."""
+        behaviour = self.model(name)
+        with self._lock:
+            self.requests[name] = self.requests.get(name, 0) + 1
+            if self.rpm:
+                now = time.monotonic()
+                while self._recent and self._recent[0] < now - 60:
+                    self._recent.popleft()
+                if len(self._recent) >= self.rpm:
+                    self.rate_limited += 1
+                    return 429, {"error": {"message": f"Rate limit reached: Limit {self.rpm}, Requests per minute",
+                                           "type": "requests", "code": "rate_limit_exceeded"}}
+                self._recent.append(now)
+        if behaviour.hang:
+            time.sleep(3600)
+        if behaviour.latency_ms:
+            time.sleep(behaviour.latency_ms / 1000)
+        error = None
+        if behaviour.decommissioned:
+            error = (400, {"error": {
+                "message": f"The model `{name}` has been decommissioned and is no longer supported.",
+                "type": "invalid_request_error", "code": "model_decommissioned",
+            }})
+        elif behaviour.down or random.random() < behaviour.fail_rate:
+            error = (503, {"error": {"message": "Service Unavailable (injected)", "type": "internal_server_error"}})
+        if error:
+            with self._lock:
+                self.failed_requests += 1
+        return error
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: dict):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, model: str, behaviour: ModelBehaviour, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+                words = content.split(" ")
+                for i, word in enumerate(words):
+                    if i and behaviour.token_ms:
+                        time.sleep(behaviour.token_ms / 1000)
+                    chunk = {
+                        "id": completion_id, "object": "chat.completion.chunk",
+                        "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": {"content": word if not i else " " + word},
+                                     "finish_reason": None}],
+                    }
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                # The app lists models once at startup to warm its connection
+                if self.path.rstrip("/") != "/openai/v1/models":
+                    return self._reply(404, {"error": {"message": "not found"}})
+                self._reply(200, {"object": "list", "data": [
+                    {"id": name, "object": "model", "owned_by": "fake"} for name in list(fake.models)
+                ]})
+
+            def do_POST(self):
+                if self.path.rstrip("/") != "/openai/v1/chat/completions":
+                    return self._reply(404, {"error": {"message": "not found"}})
+                if not self.headers.get("Authorization", "").startswith("Bearer "):
+                    return self._reply(401, {"error": {"message": "Invalid API Key", "code": "invalid_api_key"}})
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                model = body.get("model", "")
+                error = fake._fault(model)
+                if error:
+                    return self._reply(*error)
+                if body.get("stream"):
+                    return self._stream(model, fake.model(model), fake.content_for(body.get("messages") or []))
+                self._reply(200, {
+                    "id": f"chatcmpl-{uuid.uuid4().hex}", "object": "chat.completion",
+                    "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop", "message": {
+                        "role": "assistant", "content": fake.content_for(body.get("messages") or []),
+                    }}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                })
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--token-ms", type=float, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--rpm", type=int, default=0, help="requests per minute before 429s (0: unlimited)")
+    parser.add_argument("--down", action="append", default=[], help="model answering 503 (repeatable)")
+    parser.add_argument("--hang", action="append", default=[], help="model that never answers (repeatable)")
+    parser.add_argument("--decommissioned", action="append", default=[], help="retired model (repeatable)")
+    args = parser.parse_args()
+
+    fake = FakeGroq(args.latency_ms, args.fail_rate, args.token_ms, args.rpm)
+    for name in args.down:
+        fake.model(name).down = True
+    for name in args.hang:
+        fake.model(name).hang = True
+    for name in args.decommissioned:
+        fake.model(name).decommissioned = True
+    fake.start(args.port)
+    print(f"Fake Groq on {fake.url} (set GROQ_BASE_URL to this)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Local stand-in for the Supabase REST API (PostgREST subset) with fault injection
+
+Supports POST (insert / upsert with ignore-duplicates) and GET on
+/rest/v1/<table>, enough for SupabaseManager. Rows are kept in memory.
+
+Usage: python benchmarks/fake_supabase.py [--port 54321] [--latency-ms 50] [--fail-rate 0.2]
+Then:  SUPABASE_URL=http://127.0.0.1:54321 SUPABASE_KEY=fake.jwt.key python server.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Any JWT-shaped string passes supabase-py's key check
+FAKE_KEY = "fake.jwt.key"
+
+
+class FakeSupabase:
+    """In-memory tables plus knobs for latency and failure injection."""
+
+    def __init__(self, latency_ms: float = 0, fail_rate: float = 0.0):
+        self.latency_ms = latency_ms
+        self.fail_rate = fail_rate
+        self.down = False
+        self.tables = {}
+        self.requests = 0
+        self.failed_requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def rows(self, table: str = "messages") -> list:
+        with self._lock:
+            return list(self.tables.get(table, []))
+
+    def start(self, port: int = 0) -> "FakeSupabase":
+        """Serve on a background thread (port 0 picks a free port)."""
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def _insert(self, table: str, rows: list, on_conflict: str, ignore_duplicates: bool) -> int:
+        with self._lock:
+            existing = self.tables.setdefault(table, [])
+            seen = {r.get(on_conflict) for r in existing} if on_conflict else set()
+            added = 0
+            for row in rows:
+                if on_conflict and row.get(on_conflict) in seen:
+                    if ignore_duplicates:
+                        continue
+                    raise ValueError("duplicate key value violates unique constraint")
+                existing.append(row)
+                seen.add(row.get(on_conflict))
+                added += 1
+            return added
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body=None):
+                data = json.dumps(body if body is not None else []).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _fault(self) -> bool:
+                with fake._lock:
+                    fake.requests += 1
+                if fake.latency_ms:
+                    time.sleep(fake.latency_ms / 1000)
+                if fake.down or random.random() < fake.fail_rate:
+                    with fake._lock:
+                        fake.failed_requests += 1
+                    self._reply(503, {"message": "injected failure"})
+                    return True
+                return False
+
+            def _table(self):
+                parsed = urlparse(self.path)
+                parts = parsed.path.strip("/").split("/")
+                if len(parts) != 3 or parts[:2] != ["rest", "v1"]:
+                    return None, {}
+                return parts[2], parse_qs(parsed.query)
+
+            def do_POST(self):
+                table, query = self._table()
+                if table is None:
+                    return self._reply(404, {"message": "not found"})
+                if self._fault():
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"[]")
+                rows = body if isinstance(body, list) else [body]
+                prefer = self.headers.get("Prefer", "")
+                try:
+                    fake._insert(
+                        table, rows,
+                        on_conflict=query.get("on_conflict", [""])[0],
+                        ignore_duplicates="ignore-duplicates" in prefer,
+                    )
+                except ValueError as e:
+                    return self._reply(409, {"message": str(e)})
+                self._reply(201, [] if "return=minimal" in prefer else rows)
+
+            def do_GET(self):
+                table, query = self._table()
+                if table is None:
+                    return self._reply(404, {"message": "not found"})
+                if self._fault():
+                    return
+                rows = fake.rows(table)
+                order = query.get("order", [""])[0]
+                if order:
+                    column, _, direction = order.partition(".")
+                    rows.sort(key=lambda r: r.get(column) or "", reverse=direction == "desc")
+                limit = query.get("limit", [""])[0]
+                if limit:
+                    rows = rows[:int(limit)]
+                self._reply(200, rows)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--port", type=int, default=54321)
+    parser.add_argument("--latency-ms", type=float, default=0)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeSupabase(args.latency_ms, args.fail_rate).start(args.port)
+    print(f"Fake Supabase on {fake.url} (key: {FAKE_KEY})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
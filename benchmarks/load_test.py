@@ -0,0 +1,408 @@
+"""
+Load test: concurrent simulated users against /api/chat with fake Groq and Supabase
+
+Starts benchmarks/fake_groq.py and fake_supabase.py stand-ins (latency and
+failure injection), runs the app in-process (ASGI transport, one event loop)
+or under uvicorn (real HTTP, --workers N) on a throwaway DB, and drives it
+with simulated users sending a mix of model turns, cacheable greetings,
+ACTION commands and personal facts. Reports RPS, p50/p95/p99 per turn kind,
+and a per-stage breakdown (prompt build, retrieval, SQLite, upstream model
+calls, Supabase sync) from the app's own /metrics histograms.
+
+--json saves the results; --baseline compares against a saved run and
+exits 1 if p95 latency or RPS regressed by more than --tolerance.
+
+Usage: python benchmarks/load_test.py [--users 20] [--duration 20] [--endpoint chat|stream|mix]
+           [--mode inprocess|uvicorn] [--workers 1] [--groq-latency-ms 300] [--groq-token-ms 15]
+           [--groq-fail-rate 0] [--supabase-latency-ms 50] [--supabase-fail-rate 0]
+           [--json results.json] [--baseline results.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from fake_groq import FakeGroq
+from fake_supabase import FAKE_KEY, FakeSupabase
+
+TOPICS = ["space travel", "cricket", "biryani", "exams", "monsoon", "startups", "old hindi songs",
+          "python coding", "gym routine", "Goa trip", "chai vs coffee", "time management"]
+NAMES = ["Aman", "Priya", "Rahul", "Sneha", "Vikram", "Neha"]
+# (kind, weight, message templates)
+TURN_MIX = [
+    ("model", 60, ["{topic} ke baare mein kuch interesting batao", "mujhe {topic} pe advice chahiye",
+                   "{topic} ke baare mein tumhara kya khayal hai?", "ek chhota sa joke sunao about {topic}"]),
+    ("greeting", 15, ["hi riko", "kaise ho", "good morning", "hello", "thank you"]),
+    ("intent", 15, ["youtube kholo", "arijit singh ke gaane lagao", "google pe {topic} search karo",
+                    "delhi ka weather batao"]),
+    ("fact", 10, ["mera naam {name} hai", "mujhe {topic} bahut pasand hai", "main {topic} seekh raha hoon"]),
+]
+
+# Histogram families shown in the stage breakdown, in order
+STAGES = [
+    "riko_chat_seconds", "riko_chat_ttft_seconds", "riko_prompt_build_seconds",
+    "riko_memory_retrieval_seconds", "riko_sqlite_seconds", "riko_model_attempt_seconds",
+    "riko_supabase_push_seconds", "riko_supabase_sync_lag_seconds", "riko_prompt_tokens",
+]
+
+_SAMPLE = re.compile(r'^(?P<name>[a-z_]+?)(?P<suffix>_bucket|_sum|_count)(?:\{(?P<labels>.*)\})? (?P<value>\S+)$')
+_LE = re.compile(r',?le="([^"]+)"')
+
+
+def pick_turn(rng: random.Random) -> Tuple[str, str]:
+    kinds = [k for k, _, _ in TURN_MIX]
+    kind = rng.choices(kinds, weights=[w for _, w, _ in TURN_MIX])[0]
+    template = rng.choice(next(t for k, _, t in TURN_MIX if k == kind))
+    return kind, template.format(topic=rng.choice(TOPICS), name=rng.choice(NAMES))
+
+
+def percentile(ordered: List[float], q: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+# ---- /metrics parsing ----
+
+def parse_histograms(text: str) -> Dict[Tuple[str, str], Dict]:
+    """(family, labels) -> {"buckets": [(le, cumulative)], "sum", "count"}."""
+    series: Dict[Tuple[str, str], Dict] = {}
+    for line in text.splitlines():
+        m = _SAMPLE.match(line)
+        if not m:
+            continue
+        labels = m.group("labels") or ""
+        le = _LE.search(labels)
+        key = (m.group("name"), _LE.sub("", labels).strip(","))
+        entry = series.setdefault(key, {"buckets": [], "sum": 0.0, "count": 0})
+        value = float(m.group("value"))
+        if m.group("suffix") == "_bucket" and le:
+            entry["buckets"].append((float(le.group(1)), value))
+        elif m.group("suffix") == "_sum":
+            entry["sum"] = value
+        else:
+            entry["count"] = value
+    return series
+
+
+def diff_histograms(before: Dict, after: Dict) -> Dict:
+    """What was observed between two scrapes."""
+    out = {}
+    for key, entry in after.items():
+        old = before.get(key, {"buckets": [], "sum": 0.0, "count": 0})
+        old_buckets = dict(old["buckets"])
+        count = entry["count"] - old["count"]
+        if count <= 0:
+            continue
+        out[key] = {
+            "buckets": [(le, n - old_buckets.get(le, 0)) for le, n in entry["buckets"]],
+            "sum": entry["sum"] - old["sum"],
+            "count": count,
+        }
+    return out
+
+
+def histogram_quantile(q: float, entry: Dict) -> float:
+    """Prometheus-style estimate: linear interpolation inside the bucket."""
+    rank = q * entry["count"]
+    lower, below = 0.0, 0
+    for le, cumulative in entry["buckets"]:
+        if cumulative >= rank:
+            if le == float("inf"):
+                return lower
+            inside = cumulative - below
+            return lower + (le - lower) * ((rank - below) / inside if inside else 0)
+        lower, below = le, cumulative
+    return lower
+
+
+# ---- Running the app ----
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60, proc: Optional[subprocess.Popen] = None,
+                     log_path: str = ""):
+    """Poll /api/ready until warm-up has finished."""
+    deadline = time.monotonic() + timeout
+    while True:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {proc.returncode}, see {log_path}")
+        try:
+            if (await client.get("/api/ready")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"app did not become ready, see {log_path or 'its output'}")
+        await asyncio.sleep(0.1)
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def app_env(args, groq: FakeGroq, supabase: FakeSupabase, db_path: str) -> Dict[str, str]:
+    env = {
+        "MEMORY_DB_PATH": db_path,
+        "GROQ_BASE_URL": groq.url,
+        "GROQ_API_KEY": "fake-key",
+        "SUPABASE_URL": supabase.url,
+        "SUPABASE_KEY": FAKE_KEY,
+        "METRICS": "1",
+    }
+    if not args.rate_limit:
+        # Simulated users chat far faster than people; measure the app, not the limiter
+        env["RATE_LIMIT_PER_MINUTE"] = "0"
+    return env
+
+
+@contextlib.asynccontextmanager
+async def inprocess_app(env: Dict[str, str]):
+    os.environ.update(env)
+    with contextlib.redirect_stdout(io.StringIO()):  # The app logs every model attempt
+        import server
+        async with server.app.router.lifespan_context(server.app):
+            transport = httpx.ASGITransport(app=server.app)
+            client = httpx.AsyncClient(transport=transport, base_url="http://app", timeout=60)
+            try:
+                await wait_ready(client)
+                yield client
+            finally:
+                await client.aclose()
+
+
+@contextlib.asynccontextmanager
+async def uvicorn_app(env: Dict[str, str], workers: int, log_path: str):
+    port = free_port()
+    log = open(log_path, "w")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, **env}, stdout=log, stderr=subprocess.STDOUT,
+    )
+    client = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", timeout=60,
+                               limits=httpx.Limits(max_connections=1000))
+    try:
+        await wait_ready(client, proc=proc, log_path=log_path)
+        yield client
+    finally:
+        await client.aclose()
+        proc.terminate()
+        try:
+            proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+# ---- Simulated users ----
+
+async def one_turn(client: httpx.AsyncClient, endpoint: str, session_id: str, message: str) -> Tuple[int, Optional[float]]:
+    """(status, time to first token in s for streams)."""
+    body = {"message": message, "session_id": session_id}
+    if endpoint == "chat":
+        r = await client.post("/api/chat", json=body)
+        return r.status_code, None
+
+    started = time.perf_counter()
+    ttft = None
+    async with client.stream("POST", "/api/chat/stream", json=body) as r:
+        if r.status_code != 200:
+            await r.aread()
+            return r.status_code, None
+        status = 200
+        async for line in r.aiter_lines():
+            if ttft is None and line.startswith("event: token"):
+                ttft = time.perf_counter() - started
+            elif line.startswith("event: error"):
+                status = 599  # Failed after the stream started
+    return status, ttft
+
+
+async def user(client, args, index: int, run_id: str, deadline: float, results: list):
+    rng = random.Random(args.seed * 1000 + index)
+    session_id = f"load-{run_id}-{index}"
+    while time.monotonic() < deadline:
+        kind, message = pick_turn(rng)
+        endpoint = args.endpoint if args.endpoint != "mix" else rng.choice(["chat", "stream"])
+        started = time.perf_counter()
+        try:
+            status, ttft = await one_turn(client, endpoint, session_id, message)
+        except httpx.HTTPError:
+            status, ttft = 0, None
+        results.append({"kind": kind, "endpoint": endpoint, "status": status,
+                        "latency": time.perf_counter() - started, "ttft": ttft})
+        if args.think_ms:
+            await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+
+async def drive(args, groq: FakeGroq, supabase: FakeSupabase, tmp: str) -> Dict:
+    env = app_env(args, groq, supabase, os.path.join(tmp, "load.db"))
+    app = inprocess_app(env) if args.mode == "inprocess" else uvicorn_app(env, args.workers, os.path.join(tmp, "uvicorn.log"))
+    run_id = f"{int(time.time())}"
+    quiet = contextlib.redirect_stdout(io.StringIO()) if args.mode == "inprocess" else contextlib.nullcontext()
+    async with app as client:
+        with quiet:
+            # Warm-up: pooled clients, prepared statements, static prompt caches
+            for i in range(min(args.users, 5)):
+                await one_turn(client, "chat", f"warmup-{run_id}-{i}", "hi riko")
+            before = parse_histograms((await client.get("/metrics")).text)
+
+            results: List[Dict] = []
+            started = time.monotonic()
+            await asyncio.gather(*(user(client, args, i, run_id, started + args.duration, results)
+                                   for i in range(args.users)))
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(1.5)  # Let the Supabase outbox sync the tail
+            after = parse_histograms((await client.get("/metrics")).text)
+    return {"results": results, "elapsed": elapsed, "stages": diff_histograms(before, after)}
+
+
+# ---- Reporting ----
+
+def summarize(run: Dict, args) -> Dict:
+    results, elapsed = run["results"], run["elapsed"]
+    ok = [r for r in results if r["status"] == 200]
+    statuses: Dict[str, int] = {}
+    for r in results:
+        statuses[str(r["status"])] = statuses.get(str(r["status"]), 0) + 1
+
+    def latency(rows):
+        ordered = sorted(r["latency"] for r in rows)
+        return {"count": len(ordered), "p50": percentile(ordered, 0.5), "p95": percentile(ordered, 0.95),
+                "p99": percentile(ordered, 0.99)}
+
+    by_kind = {kind: latency([r for r in ok if r["kind"] == kind]) for kind, _, _ in TURN_MIX}
+    ttfts = sorted(r["ttft"] for r in ok if r["ttft"] is not None)
+    stages = {}
+    for (name, labels), entry in sorted(run["stages"].items()):
+        if name not in STAGES:
+            continue
+        stages[f"{name}{{{labels}}}" if labels else name] = {
+            "count": int(entry["count"]), "mean": entry["sum"] / entry["count"],
+            "p50": histogram_quantile(0.5, entry), "p95": histogram_quantile(0.95, entry),
+        }
+    return {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "requests": len(results),
+        "rps": len(ok) / elapsed if elapsed else 0.0,
+        "statuses": statuses,
+        "latency": latency(ok),
+        "by_kind": by_kind,
+        "ttft": {"p50": percentile(ttfts, 0.5), "p95": percentile(ttfts, 0.95)} if ttfts else None,
+        "stages": stages,
+    }
+
+
+def print_report(summary: Dict, groq: FakeGroq, supabase: FakeSupabase):
+    cfg = summary["config"]
+    ms = lambda s: f"{s * 1000:8.1f}"
+    mode = cfg["mode"] if cfg["mode"] == "inprocess" else f"uvicorn ({cfg['workers']} workers)"
+    print(f"\n{cfg['users']} users x {cfg['duration']:g}s, {cfg['endpoint']} endpoint, {mode}; "
+          f"groq {cfg['groq_latency_ms']:g} ms + {cfg['groq_token_ms']:g} ms/token, "
+          f"fail {cfg['groq_fail_rate']:g}; supabase {cfg['supabase_latency_ms']:g} ms, fail {cfg['supabase_fail_rate']:g}")
+    print(f"Requests {summary['requests']}   OK throughput {summary['rps']:.1f} req/s   statuses {summary['statuses']}")
+    print(f"Upstream: groq {sum(groq.requests.values())} calls ({groq.failed_requests} failed), "
+          f"supabase {supabase.requests} calls, {len(supabase.rows())} rows synced")
+
+    print(f"\n{'latency (ms)':<18}{'count':>7}{'p50':>9}{'p95':>9}{'p99':>9}")
+    rows = [("all", summary["latency"])] + list(summary["by_kind"].items())
+    for label, s in rows:
+        if s["count"]:
+            print(f"{label:<18}{s['count']:>7}{ms(s['p50']):>9}{ms(s['p95']):>9}{ms(s['p99']):>9}")
+    if summary["ttft"]:
+        print(f"{'stream ttft':<18}{'':>7}{ms(summary['ttft']['p50']):>9}{ms(summary['ttft']['p95']):>9}")
+
+    print(f"\n{'stage (server side)':<70}{'count':>7}{'mean':>10}{'p50':>10}{'p95':>10}")
+    for name, s in summary["stages"].items():
+        tokens = name.startswith("riko_prompt_tokens")
+        fmt = (lambda v: f"{v:10.0f}") if tokens else (lambda v: f"{v * 1000:8.2f}ms")
+        print(f"{name:<70}{s['count']:>7}{fmt(s['mean'])}{fmt(s['p50'])}{fmt(s['p95'])}")
+    if summary["config"]["mode"] == "uvicorn" and summary["config"]["workers"] > 1:
+        print("(stage numbers come from whichever worker answered /metrics)")
+
+
+def compare(summary: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """Regressions beyond ``tolerance`` (fraction) against a saved run."""
+    problems = []
+    changed = [k for k, v in baseline.get("config", {}).items() if summary["config"].get(k) != v and k != "seed"]
+    if changed:
+        print(f"\n⚠️ Baseline was run with different settings: {', '.join(changed)}")
+    if summary["rps"] < baseline["rps"] * (1 - tolerance):
+        problems.append(f"throughput {summary['rps']:.1f} req/s vs {baseline['rps']:.1f}")
+    for label in ["all"] + [k for k, _, _ in TURN_MIX]:
+        now = summary["latency"] if label == "all" else summary["by_kind"].get(label)
+        then = baseline["latency"] if label == "all" else baseline["by_kind"].get(label)
+        if now and then and now["count"] and then["count"] and now["p95"] > then["p95"] * (1 + tolerance):
+            problems.append(f"{label} p95 {now['p95'] * 1000:.1f} ms vs {then['p95'] * 1000:.1f} ms")
+    for name, then in baseline.get("stages", {}).items():
+        now = summary["stages"].get(name)
+        # Sub-millisecond stages are noise at this resolution
+        if now and then["p95"] >= 0.001 and now["p95"] > then["p95"] * (1 + tolerance):
+            problems.append(f"{name} p95 {now['p95'] * 1000:.2f} ms vs {then['p95'] * 1000:.2f} ms")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load")
+    parser.add_argument("--endpoint", choices=["chat", "stream", "mix"], default="mix")
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn"], default="inprocess")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's turns")
+    parser.add_argument("--groq-latency-ms", type=float, default=300)
+    parser.add_argument("--groq-token-ms", type=float, default=15)
+    parser.add_argument("--groq-fail-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-latency-ms", type=float, default=50)
+    parser.add_argument("--supabase-fail-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", action="store_true", help="keep the per-client rate limiter on")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results here")
+    parser.add_argument("--baseline", help="compare against a --json file from an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed regression (0.2 = 20%%)")
+    args = parser.parse_args()
+
+    groq = FakeGroq(latency_ms=args.groq_latency_ms, fail_rate=args.groq_fail_rate, token_ms=args.groq_token_ms).start()
+    supabase = FakeSupabase(latency_ms=args.supabase_latency_ms, fail_rate=args.supabase_fail_rate).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            run = asyncio.run(drive(args, groq, supabase, tmp))
+    finally:
+        groq.stop()
+        supabase.stop()
+
+    summary = summarize(run, args)
+    print_report(summary, groq, supabase)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+        print(f"\nSaved {args.json}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(summary, json.load(f), args.tolerance)
+        if problems:
+            print(f"\nRegressions vs {args.baseline}:")
+            for problem in problems:
+                print(f"  ❌ {problem}")
+            sys.exit(1)
+        print(f"\nNo regressions vs {args.baseline} (tolerance {args.tolerance:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Context window - token-budgeted packing of conversation history
+"""
+import os
+import re
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Context length per model (prompt + completion)
+MODEL_CONTEXT: Dict[str, int] = {
+    "llama-3.1-8b-instant": 131072,
+    "mixtral-8x7b-32768": 32768,
+    "gemma-7b-it": 8192,
+}
+DEFAULT_CONTEXT = 8192
+
+# History is packed into this many tokens even when the model allows more:
+# older turns go into the rolling summary instead, keeping prompts short
+HISTORY_BUDGET = int(os.getenv("CONTEXT_HISTORY_TOKENS", "1200"))
+SUMMARY_BUDGET = int(os.getenv("CONTEXT_SUMMARY_TOKENS", "250"))
+# Share of the summary budget the background LLM digest may take; the rest
+# is left for turns folded in after it
+DIGEST_BUDGET = int(os.getenv("CONTEXT_DIGEST_TOKENS", "150"))
+# Headroom for our estimate being low
+SAFETY_MARGIN = 256
+# Chat-format overhead per message (role markers etc.)
+MESSAGE_OVERHEAD = 4
+# Characters per summary line
+SUMMARY_SNIPPET = 120
+
+_WORDS = re.compile(r"[A-Za-z0-9]+|[^\sA-Za-z0-9]")
+
+
+@lru_cache(maxsize=16384)
+def count_tokens(text: str) -> int:
+    """Fast local approximation of the BPE token count.
+
+    English/Hinglish words are ~1.3 tokens on average; Devanagari and emoji
+    come out close to one token per character, which the per-symbol count
+    captures. Deliberately errs on the high side. Cached per string, so each
+    message is only counted once while it stays in the window.
+    """
+    tokens = 0
+    for piece in _WORDS.findall(text):
+        tokens += 1 + len(piece) // 5 if piece.isascii() else 1
+    return tokens
+
+
+def message_tokens(message: Dict) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD
+
+
+def prompt_tokens(messages: List[Dict]) -> int:
+    return sum(message_tokens(m) for m in messages)
+
+
+def pack_history(history: List[Dict], budget: int = HISTORY_BUDGET) -> Tuple[List[Dict], List[Dict]]:
+    """Keep the newest turns that fit in ``budget``; returns (kept, dropped)."""
+    used = 0
+    start = len(history)
+    while start > 0:
+        cost = message_tokens(history[start - 1])
+        if used + cost > budget:
+            break
+        used += cost
+        start -= 1
+    # Never start the kept history on an assistant turn with no question before it
+    while start < len(history) and history[start]["role"] != "user":
+        start += 1
+    return history[start:], history[:start]
+
+
+def trim_summary(lines: List[str], budget: int = SUMMARY_BUDGET) -> List[str]:
+    """Drop the oldest lines until ``lines`` fit in ``budget`` tokens."""
+    lines = list(lines)
+    while lines and sum(count_tokens(line) for line in lines) > budget:
+        lines.pop(0)
+    return lines
+
+
+def roll_summary(previous: Optional[str], dropped: List[Dict], budget: int = SUMMARY_BUDGET,
+                 folded_through: str = "") -> Tuple[str, str]:
+    """Fold turns that no longer fit into an extractive running summary.
+
+    One short line per turn; the oldest lines fall off once the summary
+    exceeds its token budget. Only turns newer than ``folded_through`` (the
+    timestamp of the last turn already folded in) are added, so lines that
+    were trimmed never come back. Returns (summary, new folded_through).
+    """
+    lines = previous.splitlines() if previous else []
+    for message in dropped:
+        timestamp = message.get("timestamp", "")
+        if timestamp and timestamp <= folded_through:
+            continue
+        who = "User" if message["role"] == "user" else "Riko"
+        text = " ".join(message["content"].split())
+        if len(text) > SUMMARY_SNIPPET:
+            text = text[:SUMMARY_SNIPPET].rstrip() + "…"
+        lines.append(f"{who}: {text}")
+        folded_through = max(folded_through, timestamp)
+    return "\n".join(trim_summary(lines, budget)), folded_through
+
+
+def fit_to_model(messages: List[Dict], model: str, max_tokens: int) -> List[Dict]:
+    """Trim the oldest non-system messages until the prompt fits ``model``.
+
+    Packing already targets HISTORY_BUDGET, so this only bites for small
+    context models in the fallback chain.
+    """
+    limit = MODEL_CONTEXT.get(model, DEFAULT_CONTEXT) - max_tokens - SAFETY_MARGIN
+    if prompt_tokens(messages) <= limit:
+        return messages
+
+    system = [m for m in messages if m["role"] == "system"]
+    rest = [m for m in messages if m["role"] != "system"]
+    kept, _ = pack_history(rest, max(0, limit - prompt_tokens(system)))
+    if not kept and rest:
+        kept = rest[-1:]  # Always send the user's current message
+    return system + kept
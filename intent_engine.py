@@ -0,0 +1,241 @@
+"""
+Intent engine - answers obvious ACTION commands locally, without the LLM
+"""
+import os
+import random
+import re
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from memory_patterns import normalize_text
+from response_cache import FOLLOW_UP_WORDS
+
+FAST_PATH = os.getenv("INTENT_FAST_PATH", "1") == "1"
+# Below this confidence the turn goes to the model as usual
+MIN_CONFIDENCE = float(os.getenv("INTENT_MIN_CONFIDENCE", "0.8"))
+
+SITES: Dict[str, Tuple[str, str]] = {
+    # spoken name -> (display name, url)
+    "youtube": ("YouTube", "https://www.youtube.com"),
+    "you tube": ("YouTube", "https://www.youtube.com"),
+    "google": ("Google", "https://www.google.com"),
+    "gmail": ("Gmail", "https://mail.google.com"),
+    "instagram": ("Instagram", "https://www.instagram.com"),
+    "insta": ("Instagram", "https://www.instagram.com"),
+    "facebook": ("Facebook", "https://www.facebook.com"),
+    "whatsapp": ("WhatsApp", "https://web.whatsapp.com"),
+    "twitter": ("Twitter", "https://x.com"),
+    "linkedin": ("LinkedIn", "https://www.linkedin.com"),
+    "github": ("GitHub", "https://github.com"),
+    "netflix": ("Netflix", "https://www.netflix.com"),
+    "spotify": ("Spotify", "https://open.spotify.com"),
+    "amazon": ("Amazon", "https://www.amazon.in"),
+    "flipkart": ("Flipkart", "https://www.flipkart.com"),
+    "wikipedia": ("Wikipedia", "https://www.wikipedia.org"),
+    "chatgpt": ("ChatGPT", "https://chatgpt.com"),
+    "google maps": ("Google Maps", "https://maps.google.com"),
+    "maps": ("Google Maps", "https://maps.google.com"),
+}
+
+# Politeness and filler that don't change the command
+LEADING_FILLER = re.compile(r"^(?:(?:riko|hey|ok|okay|acha|accha|please|plz|pls|zara|jara|bhai|yaar)\s+)+")
+FILLER = r"(?:\s+(?:please|plz|pls|na|naa|yaar|yar|zara|jaldi|riko|bhai|ji|abhi|jara|now))*"
+OPEN_VERB = r"(?:kholo|khol\s+do|khol\s+de|kholna|open\s+karo|open\s+kar\s+do|open\s+kar|open\s+do|open|chalu\s+karo|chalu\s+kar\s+do|start\s+karo|launch\s+karo|launch)"
+PLAY_VERB = (r"(?:laga\s+do|laga\s+de|lagao|chala\s+do|chala\s+de|chalao|baja\s+do|baja\s+de|bajao|"
+             r"play\s+karo|play\s+kar\s+do|play\s+kar|play\s+do|sunao|suna\s+do|sunado|dikhao|dikha\s+do)")
+MEDIA = r"(?:gaana|gaane|gana|gane|song|songs|music|geet|video|videos)"
+SEARCH_VERB = r"(?:search\s+karo|search\s+kar\s+do|search\s+kar|search\s+do|dhoondo|dhundo|khojo|google\s+karo|google\s+kar\s+do)"
+
+# A media query is a short span ("arijit singh", "shape of you"); longer ones are chat
+MEDIA_QUERY = r"[\w']+(?:\s+[\w']+){0,4}?"
+# A weather place is at most three words, tied to "weather" by a postposition
+PLACE = r"[a-z]+(?:\s+[a-z]+){0,2}?"
+PLACE_OF = r"(?:ka|ki|ke|mein|me|in)"
+WEATHER_VERB = r"(?:batao|bata\s+do|check\s+karo)"
+
+_SITE_NAMES = "|".join(sorted((re.escape(s) for s in SITES), key=len, reverse=True))
+# Site names that are also everyday words: opened only with an explicit verb ("maps kholo", not "maps")
+VERB_ONLY_SITES = {"maps", "amazon"}
+
+# (name, action, compiled pattern, base confidence); first match wins
+RULES = [
+    ("open_site", "OPEN", re.compile(rf"^(?:(?P<verb>{OPEN_VERB})\s+)?(?P<q>{_SITE_NAMES})(?:\s+(?P<verb_after>{OPEN_VERB}))?{FILLER}$"), 0.97),
+    ("youtube_on", "YOUTUBE", re.compile(rf"^(?:youtube|yt)\s+(?:pe|par|pr|on)\s+(?P<q>.+?)\s+(?:{PLAY_VERB}|{SEARCH_VERB}){FILLER}$"), 0.95),
+    ("play_media", "YOUTUBE", re.compile(rf"^(?P<q>{MEDIA_QUERY})\s+(?:(?:ka|ki|ke|wala|wali|vala)\s+)?{MEDIA}\s+{PLAY_VERB}{FILLER}$"), 0.95),
+    ("play_verb_first", "YOUTUBE", re.compile(rf"^(?:play|bajao|lagao|chalao)\s+(?:some\s+|a\s+|the\s+)?(?P<q>{MEDIA_QUERY})(?:\s+(?:on|pe)\s+youtube)?{FILLER}$"), 0.85),
+    ("google_on", "GOOGLE", re.compile(rf"^google\s+(?:pe|par|pr|on)\s+(?P<q>.+?)(?:\s+(?:{SEARCH_VERB}|dekho|batao))?{FILLER}$"), 0.95),
+    ("search_verb_last", "GOOGLE", re.compile(rf"^(?P<q>.+?)\s+{SEARCH_VERB}{FILLER}$"), 0.9),
+    ("search_verb_first", "GOOGLE", re.compile(rf"^(?:search|google\s+search|google\s+karo|google\s+kar\s+do)\s+(?:for\s+)?(?P<q>.+?){FILLER}$"), 0.9),
+    ("weather", "GOOGLE", re.compile(
+        rf"^(?:(?P<pre>{PLACE})\s+{PLACE_OF}\s+|(?P<bare>[a-z]+)\s+)?(?:(?:aaj|kal)\s+ka\s+)?(?:weather|mausam|temperature)"
+        rf"(?:\s+{WEATHER_VERB})?(?:\s+(?:of|in|for|at)\s+(?P<post_en>{PLACE})|\s+(?P<post>{PLACE})\s+{PLACE_OF})?"
+        rf"(?:\s+(?P<ask>{WEATHER_VERB}|kaisa\s+hai|kaisa\s+rahega|kya\s+hai|today|aaj|abhi|now|kal|tomorrow))?{FILLER}$"), 0.9),
+]
+
+# Turns that look like commands but aren't: questions, negations, chit-chat about the thing
+QUESTION_WORDS = {"kya", "kyu", "kyun", "kaise", "kaun", "kab", "kaha", "kahan", "why", "how", "what", "who", "when", "where", "kitna", "kitne"}
+NEGATIONS = {"mat", "nahi", "nahin", "dont", "don't", "band", "stop", "close", "never"}
+# Words left out of a play/search query ("ek", "koi")
+QUERY_NOISE = {"ek", "koi", "kuch", "some", "a", "the", "mera", "mere", "meri", "mujhe", "pe", "par"}
+# A "query" made only of these is a half-parsed verb ("play karo"), not a search
+VERB_WORDS = {"karo", "kar", "do", "de", "dena", "please", "now"}
+# A play query with any of these is talk to Riko ("play with me", "tum mujhe gaana sunao")
+CHAT_WORDS = {"tum", "tu", "tumhe", "tumse", "tujhe", "tujhse", "aap", "aapko", "main", "mai", "hum", "humko", "hume",
+              "with", "me", "us", "hai", "hain", "ho", "karte", "karein", "game", "games"}
+# Left out of a play query along with QUERY_NOISE; nothing else left means no query ("chalao na kuch acha sa")
+PLAY_FILLER = {"na", "naa", "acha", "accha", "achha", "sa", "si", "se", "yaar", "bhi"}
+WEATHER_NOISE = {"aaj", "today", "abhi", "now", "kal", "tomorrow", "ka", "ki", "ke", "batao"}
+# "kal ka mausam" asks for tomorrow's forecast
+TOMORROW = {"kal", "tomorrow"}
+# Words that make a weather "place" something else ("mera phone ka temperature", "the weather")
+NOT_PLACE = {"mera", "meri", "mere", "tera", "teri", "tere", "tumhara", "tumhari", "apna", "apni", "hamara", "i", "my",
+             "your", "the", "is", "so", "its", "it", "this", "that", "yeh", "ye", "wo", "woh", "bahut", "kitna",
+             "phone", "mobile", "laptop", "pc", "cpu", "battery", "body", "bukhar", "fever", "paani", "water",
+             "parso", "yesterday"}
+# A search query with any of these is talk around "search karo", not a search term ("main bore ho raha hoon")
+SEARCH_CHAT_WORDS = {"tum", "tu", "tumhe", "tujhe", "aap", "aapko", "main", "mai", "hum", "hai", "hain", "ho", "hoon",
+                     "hu", "tha", "thi", "liye", "bore", "mood"}
+MAX_QUERY_WORDS = 6
+# Longer turns are conversation, not commands
+MAX_CHARS = 120
+
+REPLIES: Dict[str, List[str]] = {
+    "OPEN": ["{name} open kar rahi hoon! 🎬", "Ye lo, {name} khul gaya! 🌐", "{name} open kar diya! ✨"],
+    "YOUTUBE": ["Haan bilkul! Laga rahi hoon {q}! 🎵", "Chalo, {q} chala rahi hoon! 🎶", "Ye lo {q}, enjoy karo! 🎧"],
+    "GOOGLE": ["Chal check karti hoon! 🔍", "Ek sec, Google pe dekh rahi hoon! 🌐", "Ruko, search kar rahi hoon! 🔎"],
+    "WEATHER": ["Chal check karti hoon! 🌤️", "Mausam dekh rahi hoon, ek sec! ⛅"],
+}
+
+_PUNCT = re.compile(r"[^\w\s']")
+
+
+class Intent(NamedTuple):
+    action: str       # OPEN / YOUTUBE / GOOGLE
+    argument: str     # url or search query
+    reply: str        # Full response, action tag included
+    confidence: float
+    rule: str
+
+
+class IntentEngine:
+    """Rule + keyword classifier for the ACTION commands in SYSTEM_PROMPT.
+
+    Each rule is an anchored pattern over the normalized message that also
+    extracts the argument; a match starts at the rule's base confidence and
+    is discounted for signs that the turn isn't a plain command (question
+    words, negations, follow-ups, long or empty queries). Only intents at or above
+    ``MIN_CONFIDENCE`` are answered locally, with the same
+    "<reply> [ACTION:TYPE:arg]" shape the model produces, so the frontend
+    handles both identically.
+    """
+
+    def __init__(self, min_confidence: float = MIN_CONFIDENCE):
+        self.min_confidence = min_confidence
+        self.handled: Dict[str, int] = {}
+        self.low_confidence = 0
+        self.no_match = 0
+
+    @staticmethod
+    def _normalize(message: str) -> str:
+        text = normalize_text(message).replace("’", "'")
+        return LEADING_FILLER.sub("", " ".join(_PUNCT.sub(" ", text).split()))
+
+    def classify(self, message: str) -> Optional[Intent]:
+        """Best intent for the message, or None if no rule matches."""
+        text = self._normalize(message)
+        if not text or len(text) > MAX_CHARS:
+            return None
+        words = set(text.split())
+
+        for name, action, pattern, base in RULES:
+            m = pattern.match(text)
+            if m is None:
+                continue
+            argument, template = self._argument(name, action, m)
+            if not argument:
+                continue
+            # The weather rule's own "kya hai" / "kaisa hai" is part of the command
+            asked = set((m.groupdict().get("ask") or "").split())
+            confidence = base * self._discount(message, words - asked, argument, name)
+            if action == "OPEN":
+                display, argument = SITES[argument]
+                reply = random.choice(REPLIES[template]).format(name=display)
+            else:
+                reply = random.choice(REPLIES[template]).format(q=argument)
+            return Intent(action, argument, f"{reply} [ACTION:{action}:{argument}]", round(confidence, 3), name)
+        return None
+
+    @staticmethod
+    def _argument(name: str, action: str, m: re.Match) -> Tuple[str, str]:
+        """(argument, reply template) for a matched rule."""
+        if name == "open_site":
+            if m.group("q") in VERB_ONLY_SITES and not (m.group("verb") or m.group("verb_after")):
+                return "", action
+            return m.group("q"), "OPEN"
+        if name == "weather":
+            place = " ".join(p for p in (m.group("pre"), m.group("bare"), m.group("post_en"), m.group("post")) if p)
+            if set(place.split()) & NOT_PLACE:
+                return "", action
+            place = " ".join(w for w in place.split() if w not in QUERY_NOISE and w not in WEATHER_NOISE)
+            day = "tomorrow" if set(m.group(0).split()) & TOMORROW else "today"
+            return (f"{place.title()} weather {day}" if place else f"weather {day}"), "WEATHER"
+
+        words = m.group("q").split()
+        if name in ("play_media", "play_verb_first"):
+            if set(words) & CHAT_WORDS:
+                return "", action
+            words = [w for w in words if w not in PLAY_FILLER]
+        elif name in ("search_verb_last", "search_verb_first") and set(words) & SEARCH_CHAT_WORDS:
+            return "", action
+        words = [w for w in words if w not in QUERY_NOISE]
+        if not words or all(w in VERB_WORDS for w in words):
+            return "", action
+        query = " ".join(words)
+        if name == "play_media":
+            # "arijit singh ka naya gaana" -> "Arijit Singh Naya songs"
+            query = " ".join(w for w in words if w not in ("ka", "ki", "ke")) or query
+            query = f"{query.title()} songs"
+        elif action == "YOUTUBE" and len(words) <= 3:
+            query = query.title()
+        return query, action
+
+    @staticmethod
+    def _discount(message: str, words: set, argument: str, rule: str) -> float:
+        """Confidence multiplier for signs the turn isn't a plain command."""
+        factor = 1.0
+        if words & NEGATIONS:
+            factor *= 0.5
+        # "wo gaana phir lagao" needs the conversation to resolve
+        if words & FOLLOW_UP_WORDS and rule != "open_site":
+            factor *= 0.5
+        if words & QUESTION_WORDS:
+            factor *= 0.5
+        if "?" in message:
+            factor *= 0.8
+        if len(argument.split()) > MAX_QUERY_WORDS:
+            factor *= 0.7
+        return factor
+
+    def answer(self, message: str) -> Optional[Intent]:
+        """The local answer for this turn, or None to use the model."""
+        if not FAST_PATH:
+            return None
+        intent = self.classify(message)
+        if intent is None:
+            self.no_match += 1
+            return None
+        if intent.confidence < self.min_confidence:
+            self.low_confidence += 1
+            return None
+        self.handled[intent.action] = self.handled.get(intent.action, 0) + 1
+        return intent
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": FAST_PATH,
+            "handled": dict(self.handled),
+            "low_confidence": self.low_confidence,
+            "no_match": self.no_match,
+        }
+
+
+intent_engine = IntentEngine()
@@ -0,0 +1,399 @@
+"""
+Memory export - streaming bulk export/import of conversation memory in compressed columnar segments
+
+File layout (all integers big-endian):
+
+    file     := MAGIC frame("HEAD") frame("ARCH" | "MSGS" | "FACT" | "SUMM")* frame("END\\0")
+    MAGIC    := b"RIKOMEM1"
+    frame    := kind (4 bytes) | length (uint32) | crc32 (uint32) | payload (length bytes)
+
+HEAD and END payloads are JSON. Data segments are zlib-compressed JSON
+holding up to ``--chunk`` rows column by column: low-cardinality columns
+(role, session, category) are dictionary-encoded. Each segment records
+the id of the last source row it covers.
+
+ARCH holds turns archived by retention, oldest first. MSGS holds the
+live turns, FACT long-term facts and SUMM conversation summaries.
+
+Both directions hold one segment in memory at a time. An interrupted
+export is continued with --resume: the torn tail is cut off and the
+export carries on after the last complete segment. Import commits each
+segment with its byte offset in ``memory_import_state`` in one
+transaction, so re-running an interrupted import picks up where it
+stopped, without duplicates.
+
+Usage: python memory_export.py export backup.rkm [--session ID] [--chunk 5000] [--resume]
+       python memory_export.py import backup.rkm [--outbox]
+       python memory_export.py inspect backup.rkm
+"""
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+import uuid
+import zlib
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from memory_manager import DB_PATH, MemoryManager, normalize_fact
+
+MAGIC = b"RIKOMEM1"
+FRAME = struct.Struct(">4sII")
+FORMAT_VERSION = 1
+EXPORT_CHUNK = int(os.getenv("MEMORY_EXPORT_CHUNK", "5000"))
+# A column is dictionary-encoded when it has at most this share of distinct values
+DICT_RATIO = 0.25
+
+MESSAGE_COLUMNS = ["role", "content", "timestamp", "session_id"]
+# kind -> (columns, INSERT used on import)
+SEGMENTS: Dict[bytes, Tuple[List[str], str]] = {
+    b"ARCH": (MESSAGE_COLUMNS,
+              "INSERT INTO short_term_memory (role, content, timestamp, session_id) VALUES (?, ?, ?, ?)"),
+    b"MSGS": (MESSAGE_COLUMNS,
+              "INSERT INTO short_term_memory (role, content, timestamp, session_id) VALUES (?, ?, ?, ?)"),
+    b"FACT": (["category", "key", "value", "timestamp", "importance", "session_id"],
+              "INSERT INTO long_term_memory (category, key, value, timestamp, importance, session_id, value_norm) "
+              "VALUES (?, ?, ?, ?, ?, ?, ?) "
+              "ON CONFLICT(session_id, category, key, value_norm) DO UPDATE SET "
+              "value = excluded.value, timestamp = MAX(timestamp, excluded.timestamp), "
+              "importance = MAX(importance, excluded.importance)"),
+    b"SUMM": (["summary", "timestamp", "session_id", "folded_through", "digest"],
+              "INSERT INTO conversation_summaries (summary, timestamp, session_id, folded_through, digest) "
+              "VALUES (?, ?, ?, ?, ?)"),
+}
+# Export order; archived turns go first so each session's turns keep their order on import
+PHASES = [b"ARCH", b"MSGS", b"FACT", b"SUMM"]
+
+
+class ExportError(Exception):
+    """The file isn't a memory export, or doesn't match what was asked for."""
+
+
+# ---- Encoding ----
+
+def _encode_column(values: list) -> dict:
+    distinct = list(dict.fromkeys(values))
+    if len(distinct) <= max(1, len(values) * DICT_RATIO):
+        index = {v: i for i, v in enumerate(distinct)}
+        return {"dict": distinct, "codes": [index[v] for v in values]}
+    return {"values": values}
+
+
+def _decode_column(column: dict) -> list:
+    if "dict" in column:
+        distinct = column["dict"]
+        return [distinct[code] for code in column["codes"]]
+    return column["values"]
+
+
+def encode_segment(rows: List[tuple], last_id: int) -> bytes:
+    columns = [_encode_column(list(values)) for values in zip(*rows)]
+    body = {"last_id": last_id, "rows": len(rows), "columns": columns}
+    return zlib.compress(json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+
+
+def decode_segment(payload: bytes) -> Tuple[List[tuple], int]:
+    body = json.loads(zlib.decompress(payload))
+    columns = [_decode_column(c) for c in body["columns"]]
+    return list(zip(*columns)), body["last_id"]
+
+
+def write_frame(f, kind: bytes, payload: bytes):
+    f.write(FRAME.pack(kind, len(payload), zlib.crc32(payload)))
+    f.write(payload)
+
+
+def read_frames(f) -> Iterator[Tuple[bytes, bytes, int]]:
+    """(kind, payload, offset just past the frame); stops at a torn or corrupt frame."""
+    while True:
+        head = f.read(FRAME.size)
+        if len(head) < FRAME.size:
+            return
+        kind, length, crc = FRAME.unpack(head)
+        payload = f.read(length)
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        yield kind, payload, f.tell()
+
+
+def _read_header(f) -> Dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ExportError("not a Riko memory export")
+    frame = next(read_frames(f), None)
+    if frame is None or frame[0] != b"HEAD":
+        raise ExportError("missing header")
+    header = json.loads(frame[1])
+    if header.get("version") != FORMAT_VERSION:
+        raise ExportError(f"unsupported export version {header.get('version')}")
+    return header
+
+
+# ---- Export ----
+
+def _source_batches(memory: MemoryManager, kind: bytes, after_id: int, chunk: int,
+                    session_id: Optional[str]) -> Iterator[Tuple[List[tuple], int]]:
+    """(rows, last source id) batches of one phase, from ``after_id`` on."""
+    store = memory.store
+    scope = " AND session_id = ?" if session_id else ""
+    extra = (session_id,) if session_id else ()
+
+    if kind == b"ARCH":
+        # Whole archive segments, decompressed, until the batch holds ``chunk`` turns
+        batch = []
+        while True:
+            row = store.query_one(
+                f"SELECT id, session_id, payload FROM memory_archive WHERE id > ?{scope} ORDER BY id LIMIT 1",
+                (after_id,) + extra
+            )
+            if row is None:
+                break
+            after_id = row[0]
+            batch.extend((role, content, timestamp, row[1])
+                         for _, role, content, timestamp in json.loads(zlib.decompress(row[2])))
+            if len(batch) >= chunk:
+                yield batch, after_id
+                batch = []
+        if batch:
+            yield batch, after_id
+        return
+
+    sql = {
+        b"MSGS": "SELECT id, role, content, timestamp, session_id FROM short_term_memory",
+        b"FACT": "SELECT id, category, key, value, timestamp, importance, session_id FROM long_term_memory",
+        b"SUMM": "SELECT id, summary, timestamp, session_id, folded_through, digest FROM conversation_summaries",
+    }[kind]
+    while True:
+        rows = store.query(f"{sql} WHERE id > ?{scope} ORDER BY id LIMIT ?", (after_id,) + extra + (chunk,))
+        if not rows:
+            return
+        after_id = rows[-1][0]
+        yield [r[1:] for r in rows], after_id
+
+
+def _resume_point(path: str, session_id: Optional[str]) -> Tuple[Dict, int, Dict[bytes, int], Dict[str, int], bool]:
+    """(header, good length, last id per kind, rows per kind, finished) of a partial export."""
+    last_ids: Dict[bytes, int] = {}
+    counts: Dict[str, int] = {}
+    with open(path, "rb") as f:
+        header = _read_header(f)
+        if header.get("session_id") != session_id:
+            scope = f"session {header['session_id']!r}" if header.get("session_id") else "all sessions"
+            raise ExportError(f"{path} is an export of {scope}; resume it with the same --session")
+        good = f.tell()
+        for kind, payload, end in read_frames(f):
+            if kind == b"END\0":
+                return header, end, last_ids, counts, True
+            rows, last_id = decode_segment(payload)
+            last_ids[kind] = last_id
+            counts[kind.decode()] = counts.get(kind.decode(), 0) + len(rows)
+            good = end
+    return header, good, last_ids, counts, False
+
+
+def export_memory(memory: MemoryManager, path: str, session_id: Optional[str] = None,
+                  chunk: int = EXPORT_CHUNK, resume: bool = False) -> Dict:
+    """Stream the memory tables into ``path``; returns {"rows": {kind: n}, "bytes", "seconds", "resumed"}."""
+    started = time.perf_counter()
+    memory.flush()
+    last_ids: Dict[bytes, int] = {}
+    counts: Dict[str, int] = {}
+    resumed = resume and os.path.exists(path)
+
+    if resumed:
+        header, good, last_ids, counts, finished = _resume_point(path, session_id)
+        if finished:
+            return {"rows": counts, "bytes": os.path.getsize(path), "seconds": 0.0, "resumed": True}
+        f = open(path, "r+b")
+        f.truncate(good)
+        f.seek(good)
+    else:
+        header = {"version": FORMAT_VERSION, "export_id": uuid.uuid4().hex, "session_id": session_id,
+                  "created_at": datetime.now().isoformat(), "source": os.path.abspath(memory.db_path),
+                  "columns": {kind.decode(): SEGMENTS[kind][0] for kind in PHASES}}
+        f = open(path, "wb")
+        f.write(MAGIC)
+        write_frame(f, b"HEAD", json.dumps(header).encode("utf-8"))
+
+    with f:
+        # Phases before the one that was interrupted are complete
+        start = max((PHASES.index(k) for k in last_ids), default=0)
+        for kind in PHASES[start:]:
+            for rows, last_id in _source_batches(memory, kind, last_ids.get(kind, 0), chunk, session_id):
+                if rows:
+                    write_frame(f, kind, encode_segment(rows, last_id))
+                    counts[kind.decode()] = counts.get(kind.decode(), 0) + len(rows)
+        write_frame(f, b"END\0", json.dumps({"export_id": header["export_id"], "rows": counts}).encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+    return {"rows": counts, "bytes": os.path.getsize(path), "seconds": time.perf_counter() - started,
+            "resumed": resumed}
+
+
+# ---- Import ----
+
+def _insert_turns(cursor, sql: str, rows: List[tuple]):
+    """Insert turns with one session_versions bump per session instead of one per row.
+
+    The per-row version trigger is most of the cost of a bulk insert. It is
+    dropped and recreated inside the caller's transaction, which holds the
+    write lock, so no other writer can slip a row in without it.
+    """
+    trigger = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'trg_short_term_version'"
+    ).fetchone()
+    if trigger:
+        cursor.execute("DROP TRIGGER trg_short_term_version")
+    cursor.executemany(sql, rows)
+    per_session: Dict[str, int] = {}
+    for row in rows:
+        per_session[row[3]] = per_session.get(row[3], 0) + 1
+    cursor.executemany(
+        "INSERT INTO session_versions (session_id, version) VALUES (?, ?) "
+        "ON CONFLICT(session_id) DO UPDATE SET version = version + excluded.version",
+        per_session.items()
+    )
+    if trigger:
+        cursor.execute(trigger[0])
+
+
+def _ensure_state(memory: MemoryManager):
+    memory.store.execute("""
+        CREATE TABLE IF NOT EXISTS memory_import_state (
+            export_id TEXT PRIMARY KEY,
+            offset INTEGER NOT NULL,
+            rows INTEGER NOT NULL,
+            finished INTEGER NOT NULL DEFAULT 0,
+            updated_at TEXT NOT NULL
+        )
+    """)
+
+
+def import_memory(memory: MemoryManager, path: str, outbox: bool = False) -> Dict:
+    """Load an export into ``memory``'s DB, one transaction per segment.
+
+    Meant for an empty DB, or one without the exported sessions: imported
+    turns are appended after any existing turns of the same session.
+    ``outbox`` also queues the turns for Supabase (the sync worker pushes
+    them in batches). Returns {"rows": {kind: n}, "seconds", "resumed", "skipped"}.
+    """
+    started = time.perf_counter()
+    memory.flush()
+    _ensure_state(memory)
+    if outbox:
+        from supabase_manager import SupabaseOutbox
+        SupabaseOutbox(memory.db_path)  # Creates its table
+
+    counts: Dict[str, int] = {}
+    with open(path, "rb") as f:
+        header = _read_header(f)
+        export_id = header["export_id"]
+        state = memory.store.query_one(
+            "SELECT offset, rows, finished FROM memory_import_state WHERE export_id = ?", (export_id,)
+        )
+        if state and state[2]:
+            return {"rows": counts, "seconds": 0.0, "resumed": False, "skipped": True}
+        resumed = state is not None
+        if resumed:
+            f.seek(state[0])
+
+        finished = False
+        for kind, payload, end in read_frames(f):
+            if kind == b"END\0":
+                finished = True
+                memory.store.execute(
+                    "UPDATE memory_import_state SET finished = 1, offset = ?, updated_at = ? WHERE export_id = ?",
+                    (end, datetime.now().isoformat(), export_id)
+                )
+                break
+            if kind not in SEGMENTS:
+                raise ExportError(f"unknown segment {kind!r}")
+            rows, _ = decode_segment(payload)
+            columns, sql = SEGMENTS[kind]
+            missing = len(columns) - len(header["columns"].get(kind.decode(), columns))
+            if missing > 0:
+                # Columns added since the export was written (summary cursor, digest) start out empty
+                rows = [row + ("",) * missing for row in rows]
+            with memory.store.transaction() as cursor:
+                if kind == b"FACT":
+                    cursor.executemany(sql, [r + (normalize_fact(r[2]),) for r in rows])
+                elif kind in (b"ARCH", b"MSGS"):
+                    _insert_turns(cursor, sql, rows)
+                else:
+                    cursor.executemany(sql, rows)
+                if outbox and kind in (b"ARCH", b"MSGS"):
+                    cursor.executemany(
+                        "INSERT INTO supabase_outbox (role, content, timestamp, session_id) VALUES (?, ?, ?, ?)", rows
+                    )
+                cursor.execute(
+                    "INSERT INTO memory_import_state (export_id, offset, rows, updated_at) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(export_id) DO UPDATE SET offset = excluded.offset, "
+                    "rows = rows + ?, updated_at = excluded.updated_at",
+                    (export_id, end, len(rows), datetime.now().isoformat(), len(rows))
+                )
+            counts[kind.decode()] = counts.get(kind.decode(), 0) + len(rows)
+        if not finished:
+            raise ExportError(f"{path} ends before its END frame (interrupted export? re-run it with --resume)")
+
+    # Running workers notice through session_versions, which the insert triggers bumped
+    return {"rows": counts, "seconds": time.perf_counter() - started, "resumed": resumed, "skipped": False}
+
+
+def inspect_export(path: str) -> Dict:
+    """Header, segment and row counts, without decoding any rows."""
+    segments: Dict[str, int] = {}
+    with open(path, "rb") as f:
+        header = _read_header(f)
+        trailer = None
+        for kind, payload, _ in read_frames(f):
+            if kind == b"END\0":
+                trailer = json.loads(payload)
+                break
+            segments[kind.decode()] = segments.get(kind.decode(), 0) + 1
+    return {"header": header, "segments": segments, "complete": trailer is not None,
+            "rows": trailer["rows"] if trailer else None, "bytes": os.path.getsize(path)}
+
+
+def _rate(result: Dict) -> str:
+    total = sum(result["rows"].values())
+    per_second = total / result["seconds"] if result["seconds"] else 0
+    return f"{total:,} rows {result['rows']} in {result['seconds']:.2f}s ({per_second:,.0f} rows/s)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("command", choices=["export", "import", "inspect"])
+    parser.add_argument("path")
+    parser.add_argument("--db", default=DB_PATH, help="memory database (default: MEMORY_DB_PATH or jarvis_memory.db)")
+    parser.add_argument("--session", help="export only this session")
+    parser.add_argument("--chunk", type=int, default=EXPORT_CHUNK, help="rows per segment")
+    parser.add_argument("--resume", action="store_true", help="continue an interrupted export")
+    parser.add_argument("--outbox", action="store_true", help="also queue imported turns for Supabase")
+    args = parser.parse_args()
+
+    if args.command == "inspect":
+        print(json.dumps(inspect_export(args.path), indent=2))
+        return
+
+    memory = MemoryManager(args.db)
+    try:
+        if args.command == "export":
+            result = export_memory(memory, args.path, args.session, args.chunk, args.resume)
+            print(f"📦 Exported {_rate(result)} -> {args.path} ({result['bytes'] / 1e6:.1f} MB)"
+                  + (" [resumed]" if result["resumed"] else ""))
+        else:
+            result = import_memory(memory, args.path, outbox=args.outbox)
+            if result["skipped"]:
+                print(f"✅ {args.path} was already imported into {args.db}")
+            else:
+                print(f"📥 Imported {_rate(result)} into {args.db}" + (" [resumed]" if result["resumed"] else ""))
+    except ExportError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        memory.close()
+
+
+if __name__ == "__main__":
+    main()
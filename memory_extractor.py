@@ -0,0 +1,290 @@
+"""
+Memory extraction - background LLM pass turning recent turns into facts and a rolling summary
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from datetime import datetime
+from typing import Callable, ContextManager, Dict, List, Optional, Tuple
+
+from context_window import DIGEST_BUDGET, trim_summary
+from memory_manager import MemoryManager
+from metrics import MEMORY_EXTRACTIONS
+
+MEMORY_EXTRACTION = os.getenv("MEMORY_EXTRACTION", "1") == "1"
+EXTRACT_INTERVAL = float(os.getenv("MEMORY_EXTRACT_INTERVAL", "60"))  # seconds between passes
+# A session is extracted once it has this many new turns, or once it has
+# any and has been quiet for MEMORY_EXTRACT_IDLE seconds
+EXTRACT_MIN_TURNS = int(os.getenv("MEMORY_EXTRACT_MIN_TURNS", "8"))
+EXTRACT_IDLE = float(os.getenv("MEMORY_EXTRACT_IDLE", "300"))
+# Newest turns sent per call (older unprocessed ones are skipped), and calls per pass
+EXTRACT_MAX_TURNS = int(os.getenv("MEMORY_EXTRACT_MAX_TURNS", "40"))
+EXTRACT_MAX_CALLS = int(os.getenv("MEMORY_EXTRACT_MAX_CALLS", "5"))
+KNOWN_FACTS = 20
+TURN_CHARS = 400
+FACT_CHARS = 200
+
+CATEGORIES = ("personal", "preference", "fact")
+
+EXTRACTION_PROMPT = """You are Riko's memory extractor. Read the conversation below between the user and Riko (a Hinglish assistant).
+
+Return ONLY a JSON object:
+{{"facts": [{{"category": "personal|preference|fact", "key": "short_snake_case_topic", "value": "one short sentence about the user", "importance": 1-5}}],
+ "summary": "the running conversation summary, updated"}}
+
+Rules:
+- Facts are durable things about the USER (name, likes, dislikes, work, studies, city, family, plans), not about Riko and not small talk.
+- Write each value as a standalone sentence in the user's language, e.g. "User ka naam Aman hai".
+- Skip anything already in the known facts. No facts: use an empty list.
+- The summary updates the previous summary with the new turns: at most 5 short lines, newest last.
+
+Known facts:
+{facts}
+
+Previous summary:
+{summary}
+"""
+
+_KEY = re.compile(r"[^a-z0-9]+")
+
+
+def parse_extraction(text: str) -> Tuple[List[Dict], str]:
+    """(facts, summary) from the model's reply; raises ValueError if it isn't the JSON asked for."""
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end < start:
+        raise ValueError("no JSON object in reply")
+    data = json.loads(text[start:end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("reply is not a JSON object")
+
+    facts = []
+    for item in data.get("facts") or []:
+        if not isinstance(item, dict):
+            continue
+        value = " ".join(str(item.get("value") or "").split())[:FACT_CHARS]
+        if not value:
+            continue
+        category = item.get("category") if item.get("category") in CATEGORIES else "fact"
+        key = _KEY.sub("_", str(item.get("key") or "").lower()).strip("_")[:40] or category
+        try:
+            importance = min(5, max(1, int(item.get("importance", 3))))
+        except (TypeError, ValueError):
+            importance = 3
+        facts.append({"category": category, "key": key, "value": value, "importance": importance})
+    summary = str(data.get("summary") or "").strip()
+    return facts, summary
+
+
+class MemoryExtractor:
+    """Periodically distils new conversation turns into long-term memory.
+
+    Each pass picks sessions with enough unprocessed turns in
+    ``short_term_memory`` (per-session cursors in
+    ``memory_extraction_state``), and makes one cheap completion per
+    session for a batch of up to ``EXTRACT_MAX_TURNS`` turns. Facts are upserted through
+    ``store_long_term`` (de-duplicated there). The updated summary becomes
+    the session's digest: it is saved with ``save_summary`` as a fresh
+    summary whose folded-turn cursor is the batch's last turn, so the
+    prompt builder keeps it whole and only folds in turns newer than that.
+    The previous digest (not the extractive lines) is what the model
+    updates. Runs on the event loop next to the chat
+    handlers but never inside one, and skips its pass while chat turns are
+    queued for a model slot.
+
+    A cursor is advanced (compare-and-swap) before its call, so several
+    workers sharing the DB never extract the same turns twice; a failed
+    call puts it back for the next pass.
+    """
+
+    def __init__(self, memory: MemoryManager, model_manager,
+                 client_factory: Callable[[], ContextManager[Optional[object]]],
+                 busy: Callable[[], bool] = lambda: False, interval: float = EXTRACT_INTERVAL):
+        self.memory = memory
+        self.store = memory.store
+        self.model_manager = model_manager
+        self.client_factory = client_factory
+        self.busy = busy
+        self.interval = interval
+        self.enabled = MEMORY_EXTRACTION
+        self._task: Optional[asyncio.Task] = None
+
+        self.passes = 0
+        self.skipped_busy = 0
+        self.calls = 0
+        self.failures = 0
+        self.turns_processed = 0
+        self.facts_stored = 0
+        self.summaries_saved = 0
+        self.last_run_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        with self.store.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS memory_extraction_state (
+                    session_id TEXT PRIMARY KEY,
+                    last_id INTEGER NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    # ---- Background job ----
+
+    def start(self):
+        """Start the periodic pass on the running event loop."""
+        if not self.enabled or (self._task and not self._task.done()):
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"⚠️ Memory extraction failed: {e}")
+
+    # ---- Extraction ----
+
+    async def run_once(self, force: bool = False) -> Dict:
+        """One pass; ``force`` ignores the turn/idle thresholds and the busy check."""
+        if not force and self.busy():
+            self.skipped_busy += 1
+            return {"sessions": 0, "facts": 0}
+        # The client is leased for the whole pass
+        with self.client_factory() as client:
+            if client is None:
+                return {"sessions": 0, "facts": 0}
+
+            await asyncio.to_thread(self.memory.flush)
+            due = await asyncio.to_thread(self._due_sessions, force)
+            self.passes += 1
+            sessions = facts = 0
+            for session_id, last_id in due[:EXTRACT_MAX_CALLS]:
+                if not force and self.busy():
+                    self.skipped_busy += 1
+                    break
+                stored = await self._extract_session(client, session_id, last_id)
+                if stored is not None:
+                    sessions += 1
+                    facts += stored
+        self.last_run_at = time.time()
+        if facts:
+            print(f"🧠 Extracted {facts} facts from {sessions} sessions")
+        return {"sessions": sessions, "facts": facts}
+
+    def _due_sessions(self, force: bool) -> List[Tuple[str, int]]:
+        """(session_id, cursor) for sessions worth a call, most new turns first."""
+        rows = self.store.query("""
+            SELECT m.session_id, COUNT(*), MAX(m.timestamp), COALESCE(e.last_id, 0)
+            FROM short_term_memory m
+            LEFT JOIN memory_extraction_state e ON e.session_id = m.session_id
+            WHERE m.id > COALESCE(e.last_id, 0)
+            GROUP BY m.session_id
+        """)
+        now = datetime.now()
+        due = []
+        for session_id, count, newest, last_id in rows:
+            try:
+                idle = (now - datetime.fromisoformat(newest)).total_seconds()
+            except ValueError:
+                idle = 0.0
+            if force or count >= EXTRACT_MIN_TURNS or idle >= EXTRACT_IDLE:
+                due.append((count, session_id, last_id))
+        due.sort(reverse=True)
+        return [(session_id, last_id) for _, session_id, last_id in due]
+
+    def _claim(self, session_id: str, old: int, new: int) -> bool:
+        """Move the session's cursor from ``old`` to ``new``, unless another worker already did."""
+        with self.store.transaction() as cursor:
+            cursor.execute(
+                "INSERT INTO memory_extraction_state (session_id, last_id, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_id = excluded.last_id, updated_at = excluded.updated_at "
+                "WHERE last_id = ?",
+                (session_id, new, datetime.now().isoformat(), old)
+            )
+            return cursor.execute("SELECT changes()").fetchone()[0] == 1
+
+    def _load_batch(self, session_id: str, last_id: int) -> Optional[Tuple[List[tuple], List[Dict], str]]:
+        """Claim the session's newest unprocessed turns; None if there's nothing (left) to do."""
+        turns = self.store.query(
+            "SELECT id, role, content, timestamp FROM short_term_memory WHERE session_id = ? AND id > ? "
+            "ORDER BY id DESC LIMIT ?",
+            (session_id, last_id, EXTRACT_MAX_TURNS)
+        )[::-1]
+        if not turns or not self._claim(session_id, last_id, turns[-1][0]):
+            return None
+        known = self.memory.get_long_term_memories(KNOWN_FACTS, session_id=session_id)
+        return turns, known, self.memory.get_summary_state(session_id).digest
+
+    async def _extract_session(self, client, session_id: str, last_id: int) -> Optional[int]:
+        """Facts stored for one session's batch; None if skipped or failed."""
+        batch = await asyncio.to_thread(self._load_batch, session_id, last_id)
+        if batch is None:
+            return None
+        turns, known, summary = batch
+        new_id = turns[-1][0]
+
+        transcript = "\n".join(
+            f"{'User' if role == 'user' else 'Riko'}: {' '.join(content.split())[:TURN_CHARS]}"
+            for _, role, content, _ in turns
+        )
+        prompt = EXTRACTION_PROMPT.format(
+            facts="\n".join(f"- [{f['category']}] {f['value']}" for f in known) or "(none)",
+            summary=summary or "(none)",
+        )
+        messages = [{"role": "system", "content": prompt}, {"role": "user", "content": transcript}]
+
+        self.calls += 1
+        try:
+            reply = await self.model_manager.chat_completion(client, messages, temperature=0.2, max_tokens=500)
+            facts, new_summary = parse_extraction(reply)
+        except Exception as e:
+            outcome = "unparseable" if isinstance(e, ValueError) else "error"
+            MEMORY_EXTRACTIONS.inc(outcome)
+            self.failures += 1
+            self.last_error = str(e)
+            if outcome == "error":
+                # Upstream trouble: hand the turns back for the next pass
+                await asyncio.to_thread(self._claim, session_id, new_id, last_id)
+            return None
+        MEMORY_EXTRACTIONS.inc("ok")
+
+        for fact in facts:
+            self.memory.store_long_term(fact["category"], fact["key"], fact["value"],
+                                        importance=fact["importance"], session_id=session_id)
+        digest = "\n".join(trim_summary(new_summary.splitlines(), DIGEST_BUDGET))
+        if digest:
+            # Turns after the batch are folded back in behind the digest by the prompt builder
+            self.memory.save_summary(digest, session_id, folded_through=turns[-1][3], digest=digest)
+            self.summaries_saved += 1
+        self.turns_processed += len(turns)
+        self.facts_stored += len(facts)
+        return len(facts)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "passes": self.passes,
+            "skipped_busy": self.skipped_busy,
+            "calls": self.calls,
+            "failures": self.failures,
+            "turns_processed": self.turns_processed,
+            "facts_stored": self.facts_stored,
+            "summaries_saved": self.summaries_saved,
+            "turns_per_call": round(self.turns_processed / (self.calls - self.failures), 1)
+            if self.calls > self.failures else None,
+            "last_run_at": self.last_run_at,
+            "last_error": self.last_error,
+        }
@@ -1,37 +1,185 @@
 """
 Jarvis Memory Manager - Long-term and Short-term memory using SQLite
 """
-import sqlite3
 import json
 import os
+import sqlite3
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Callable, Iterator, List, Dict, Optional
+
+from memory_patterns import memory_matcher, normalize_text
+from metrics import SQLITE_SECONDS, timed
+from sqlite_store import SQLiteStore
+from write_behind import WriteBehindQueue
+
+DB_PATH = os.getenv("MEMORY_DB_PATH") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "jarvis_memory.db")
+
+# "async": inserts go through the write-behind queue (may lose the last
+#          ~MEMORY_FLUSH_INTERVAL seconds of writes on a hard crash)
+# "sync":  every insert is committed before the call returns
+DURABILITY = os.getenv("MEMORY_DURABILITY", "async")
+FLUSH_INTERVAL = float(os.getenv("MEMORY_FLUSH_INTERVAL", "0.25"))
+
+# How many sessions keep their short-term window in RAM
+HOT_SESSIONS = int(os.getenv("MEMORY_HOT_SESSIONS", "1000"))
+
+# Highest-importance facts always in the system prompt; memory_search adds
+# the ones relevant to each message on top
+CORE_FACTS = int(os.getenv("MEMORY_CORE_FACTS", "8"))
+
+# Rows written before sessions existed belong to this one
+DEFAULT_SESSION = "default"
+
+# Pattern category -> (long-term key, importance) for facts taken from user messages
+EXTRACTED_FACTS = [
+    ("personal", "user_name_context", 5),     # Name introductions
+    ("preference", "user_preference", 3),     # Likes / dislikes
+    ("fact", "user_fact", 4),                 # Facts the user shares
+]
+
+def normalize_fact(value: str) -> str:
+    """Canonical form used to de-duplicate long-term facts."""
+    return normalize_text(value).strip(" .!?,;:।")
+
+
+class SessionWindow:
+    """A cached short-term window plus the session version it reflects.
+
+    ``version`` is the last version read from the DB; ``queued`` counts this
+    worker's writes added to the window since, which may not have committed.
+    """
+    __slots__ = ("messages", "version", "queued", "checked_epoch", "_context")
+
+    def __init__(self, messages: List[Dict], version: int, checked_epoch: int, queued: int = 0):
+        self.messages = messages
+        self.version = version
+        self.queued = queued
+        self.checked_epoch = checked_epoch
+        self._context: Optional[List[Dict]] = None
+
+    @property
+    def expected_version(self) -> int:
+        """The session version once this worker's queued writes have committed."""
+        return self.version + self.queued
+
+    @property
+    def context(self) -> List[Dict]:
+        """role/content pairs for the model, built once per window."""
+        if self._context is None:
+            self._context = [{"role": m["role"], "content": m["content"]} for m in self.messages]
+        return self._context
+
+
+class MemorySummary:
+    """A cached long-term memory summary plus the facts version it reflects."""
+    __slots__ = ("text", "version", "checked_epoch")
+
+    def __init__(self, text: str, version: int, checked_epoch: int):
+        self.text = text
+        self.version = version
+        self.checked_epoch = checked_epoch
+
+
+class ConversationSummary:
+    """A cached rolling conversation summary plus the newest turn folded into it.
+
+    ``digest`` is the leading part written by memory_extractor's LLM pass;
+    the rest (``tail``) are extractive lines for turns folded in after it.
+    """
+    __slots__ = ("text", "folded_through", "digest", "saved_at", "checked_epoch")
+
+    def __init__(self, text: str, folded_through: str, digest: str, saved_at: str, checked_epoch: int):
+        self.text = text
+        self.folded_through = folded_through  # Timestamp of the last turn in the summary ("" if none)
+        self.digest = digest
+        self.saved_at = saved_at
+        self.checked_epoch = checked_epoch
+
+    @property
+    def tail(self) -> str:
+        if self.digest and self.text.startswith(self.digest):
+            return self.text[len(self.digest):].lstrip("\n")
+        return self.text
+
+
+class SessionWindowCache:
+    """LRU of per-session cached state (short-term windows, memory summaries)."""
+
+    def __init__(self, max_sessions: int = HOT_SESSIONS):
+        self.max_sessions = max_sessions
+        self._windows: "OrderedDict[str, object]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, session_id: str):
+        with self._lock:
+            window = self._windows.get(session_id)
+            if window is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._windows.move_to_end(session_id)
+            return window
+
+    def put(self, session_id: str, window):
+        with self._lock:
+            self._windows[session_id] = window
+            self._windows.move_to_end(session_id)
+            while len(self._windows) > self.max_sessions:
+                self._windows.popitem(last=False)
+
+    def drop(self, session_id: str):
+        with self._lock:
+            self._windows.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._windows)
 
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "jarvis_memory.db")
 
 class MemoryManager:
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, durability: str = DURABILITY):
         self.db_path = db_path
-        self.short_term: List[Dict] = []  # Last 20 messages
-        self.max_short_term = 20
+        self.store = SQLiteStore(db_path)
+        self.max_short_term = 20  # Last 20 messages per session
+        self.sessions = SessionWindowCache()
+        self.summaries = SessionWindowCache()
+        self.latest_summaries = SessionWindowCache()
+        # Bumped whenever another connection is seen to have committed; a cached
+        # window re-checks its session version once per epoch (see get_short_term)
+        self._epoch = 0
+        self.refreshes = 0
+        self.summary_hits = 0
+        self.summary_misses = 0
+        self.fts_enabled = False
+        # Called with the session_id after store_long_term (e.g. vector_memory)
+        self.fact_listeners: List[Callable[[str], None]] = []
+        # Reader for turns moved to memory_archive (retention.RetentionManager registers itself)
+        self.archive = None
         self._init_db()
-        self._load_short_term()
+        self.writer: Optional[WriteBehindQueue] = None
+        if durability == "async":
+            self.writer = WriteBehindQueue(self.store, flush_interval=FLUSH_INTERVAL)
 
     def _init_db(self):
         """Initialize SQLite database with tables for long-term and short-term memory."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        with self.store.transaction() as cursor:
+            self._create_tables(cursor)
+
+    def _create_tables(self, cursor):
         # Short-term memory: recent conversation history
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS short_term_memory (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 role TEXT NOT NULL,
                 content TEXT NOT NULL,
-                timestamp TEXT NOT NULL
+                timestamp TEXT NOT NULL,
+                session_id TEXT NOT NULL DEFAULT 'default'
             )
         """)
-        
+
         # Long-term memory: important facts, preferences, names
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS long_term_memory (
@@ -40,184 +188,509 @@ class MemoryManager:
                 key TEXT NOT NULL,
                 value TEXT NOT NULL,
                 timestamp TEXT NOT NULL,
-                importance INTEGER DEFAULT 1
+                importance INTEGER DEFAULT 1,
+                session_id TEXT NOT NULL DEFAULT 'default',
+                value_norm TEXT NOT NULL DEFAULT ''
             )
         """)
-        
+
         # Conversation summaries for context
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS conversation_summaries (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 summary TEXT NOT NULL,
-                timestamp TEXT NOT NULL
+                timestamp TEXT NOT NULL,
+                session_id TEXT NOT NULL DEFAULT 'default',
+                folded_through TEXT NOT NULL DEFAULT '',
+                digest TEXT NOT NULL DEFAULT ''
+            )
+        """)
+
+        # Databases created before sessions existed: add the column in place
+        for table in ("short_term_memory", "long_term_memory", "conversation_summaries"):
+            columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+            if "session_id" not in columns:
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN session_id TEXT NOT NULL DEFAULT 'default'")
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(conversation_summaries)")}
+        for column in ("folded_through", "digest"):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE conversation_summaries ADD COLUMN {column} TEXT NOT NULL DEFAULT ''")
+
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_short_term_session ON short_term_memory (session_id, id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_long_term_session ON long_term_memory (session_id, importance, id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_summaries_session ON conversation_summaries (session_id, id)"
+        )
+        self._dedupe_long_term(cursor)
+        self._create_search_index(cursor)
+
+        # Old turns moved out of short_term_memory by retention.RetentionManager,
+        # as zlib-compressed JSON segments of [id, role, content, timestamp] rows
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS memory_archive (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                session_id TEXT NOT NULL,
+                first_id INTEGER NOT NULL,
+                last_id INTEGER NOT NULL,
+                first_timestamp TEXT NOT NULL,
+                last_timestamp TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                payload BLOB NOT NULL
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_archive_session ON memory_archive (session_id, first_id)"
+        )
+
+        # Per-session change counter shared by every worker on this DB file.
+        # Inserts bump it via trigger (so it commits atomically with the batch);
+        # clears bump it explicitly.
+        # facts_version does the same for long_term_memory (invalidates summaries)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS session_versions (
+                session_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                facts_version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(session_versions)")}
+        if "facts_version" not in columns:
+            cursor.execute("ALTER TABLE session_versions ADD COLUMN facts_version INTEGER NOT NULL DEFAULT 0")
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_short_term_version
+            AFTER INSERT ON short_term_memory
+            BEGIN
+                INSERT INTO session_versions (session_id, version) VALUES (NEW.session_id, 1)
+                ON CONFLICT(session_id) DO UPDATE SET version = version + 1;
+            END
+        """)
+        for event in ("INSERT", "UPDATE"):
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_long_term_version_{event.lower()}
+                AFTER {event} ON long_term_memory
+                BEGIN
+                    INSERT INTO session_versions (session_id, version, facts_version) VALUES (NEW.session_id, 0, 1)
+                    ON CONFLICT(session_id) DO UPDATE SET facts_version = facts_version + 1;
+                END
+            """)
+
+    def _create_search_index(self, cursor):
+        """FTS5 indexes over long-term facts and conversation summaries.
+
+        External-content tables (the text lives only in the base tables) kept
+        in sync by triggers; session_id is indexed too so a search can be
+        narrowed to one session inside the index. Builds without FTS5 fall
+        back to importance ordering (see memory_search).
+        """
+        indexes = (
+            ("long_term_fts", "long_term_memory", "value"),
+            ("summaries_fts", "conversation_summaries", "summary"),
+        )
+        for fts, table, column in indexes:
+            exists = cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).fetchone()
+            if not exists:
+                try:
+                    cursor.execute(
+                        f"CREATE VIRTUAL TABLE {fts} USING fts5({column}, session_id, content='{table}', "
+                        f"content_rowid='id', tokenize='unicode61 remove_diacritics 2')"
+                    )
+                except sqlite3.OperationalError as e:
+                    print(f"⚠️ FTS5 unavailable, memory search falls back to importance order: {e}")
+                    return
+                # Index rows written before the index existed
+                cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts}(rowid, {column}, session_id) VALUES (NEW.id, NEW.{column}, NEW.session_id);
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {column}, session_id)
+                    VALUES ('delete', OLD.id, OLD.{column}, OLD.session_id);
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{fts}_update AFTER UPDATE OF {column}, session_id ON {table} BEGIN
+                    INSERT INTO {fts}({fts}, rowid, {column}, session_id)
+                    VALUES ('delete', OLD.id, OLD.{column}, OLD.session_id);
+                    INSERT INTO {fts}(rowid, {column}, session_id) VALUES (NEW.id, NEW.{column}, NEW.session_id);
+                END
+            """)
+        self.fts_enabled = True
+
+    def _dedupe_long_term(self, cursor):
+        """One-time migration: collapse repeated facts and enforce uniqueness.
+
+        Older databases stored a new row every time a pattern matched; from
+        here on store_long_term upserts on (session, category, key, value_norm).
+        """
+        has_index = cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_long_term_unique'"
+        ).fetchone()
+        if has_index:
+            return
+
+        columns = {row[1] for row in cursor.execute("PRAGMA table_info(long_term_memory)")}
+        if "value_norm" not in columns:
+            cursor.execute("ALTER TABLE long_term_memory ADD COLUMN value_norm TEXT NOT NULL DEFAULT ''")
+        rows = cursor.execute("SELECT id, value FROM long_term_memory WHERE value_norm = ''").fetchall()
+        cursor.executemany(
+            "UPDATE long_term_memory SET value_norm = ? WHERE id = ?",
+            [(normalize_fact(value), row_id) for row_id, value in rows]
+        )
+        # Keep the newest copy of each fact, with the highest importance it was given
+        cursor.execute("""
+            UPDATE long_term_memory SET importance = (
+                SELECT MAX(l2.importance) FROM long_term_memory l2
+                WHERE l2.session_id = long_term_memory.session_id AND l2.category = long_term_memory.category
+                  AND l2.key = long_term_memory.key AND l2.value_norm = long_term_memory.value_norm
+            )
+        """)
+        cursor.execute("""
+            DELETE FROM long_term_memory WHERE id NOT IN (
+                SELECT MAX(id) FROM long_term_memory GROUP BY session_id, category, key, value_norm
             )
         """)
-        
-        conn.commit()
-        conn.close()
-
-    def _load_short_term(self):
-        """Load recent messages from DB into short-term memory."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
         cursor.execute(
-            "SELECT role, content, timestamp FROM short_term_memory ORDER BY id DESC LIMIT ?",
-            (self.max_short_term,)
+            "CREATE UNIQUE INDEX idx_long_term_unique ON long_term_memory (session_id, category, key, value_norm)"
         )
-        rows = cursor.fetchall()
-        conn.close()
-        self.short_term = [
+
+    @timed(SQLITE_SECONDS, "load_short_term")
+    def _load_short_term(self, session_id: str) -> List[Dict]:
+        """Load a session's recent messages from DB."""
+        rows = self.store.query(
+            "SELECT role, content, timestamp FROM short_term_memory WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+            (session_id, self.max_short_term)
+        )
+        return [
             {"role": r[0], "content": r[1], "timestamp": r[2]}
             for r in reversed(rows)
         ]
 
-    def add_message(self, role: str, content: str):
+    @timed(SQLITE_SECONDS, "session_version")
+    def _session_version(self, session_id: str) -> int:
+        row = self.store.query_one("SELECT version FROM session_versions WHERE session_id = ?", (session_id,))
+        return row[0] if row else 0
+
+    def _facts_version(self, session_id: str) -> int:
+        row = self.store.query_one("SELECT facts_version FROM session_versions WHERE session_id = ?", (session_id,))
+        return row[0] if row else 0
+
+    def _bump_session_version(self, cursor, session_id: str, facts: bool = False):
+        cursor.execute(
+            "INSERT INTO session_versions (session_id, version, facts_version) VALUES (?, 1, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET version = version + 1, facts_version = facts_version + ?",
+            (session_id, int(facts), int(facts))
+        )
+
+    def _changed_this_epoch(self, entry) -> bool:
+        """Whether ``entry`` still needs its once-per-epoch version check."""
+        if self.store.changed_elsewhere():
+            self._epoch += 1
+        if entry.checked_epoch == self._epoch:
+            return False
+        entry.checked_epoch = self._epoch
+        return True
+
+    def _is_stale(self, session_id: str, window: SessionWindow) -> bool:
+        """Has another worker changed this session since the window was built?
+
+        ``PRAGMA data_version`` tells us cheaply whether anyone else committed
+        at all; only then is the session's version row read. If the window
+        has writes of ours still queued they are flushed first: a half
+        committed queue would make a foreign write indistinguishable from
+        one of ours. After that the DB must be at exactly the version the
+        window expects; otherwise someone else wrote.
+        """
+        if not self._changed_this_epoch(window):
+            return False
+        if window.queued:
+            self.flush()
+        version = self._session_version(session_id)
+        if version != window.expected_version:
+            return True
+        window.version, window.queued = version, 0
+        return False
+
+    def _refresh_window(self, session_id: str) -> SessionWindow:
+        # Our own queued writes must land first, or the reload would drop them
+        self.flush()
+        version = self._session_version(session_id)
+        window = SessionWindow(self._load_short_term(session_id), version, self._epoch)
+        self.sessions.put(session_id, window)
+        return window
+
+    def _get_window(self, session_id: str) -> SessionWindow:
+        window = self.sessions.get(session_id)
+        if window is None:
+            window = self._refresh_window(session_id)
+        elif self._is_stale(session_id, window):
+            self.refreshes += 1
+            window = self._refresh_window(session_id)
+        return window
+
+    def get_short_term(self, session_id: str = DEFAULT_SESSION) -> List[Dict]:
+        """The session's short-term window: from the hot cache, else loaded from disk.
+
+        Under several gunicorn workers (or processes sharing the DB file) a
+        cached window is reloaded only when another worker has written to the
+        same session.
+        """
+        return self._get_window(session_id).messages
+
+    def context_version(self, session_id: str = DEFAULT_SESSION) -> int:
+        """The session's short-term version, counting this worker's still-queued writes."""
+        return self._get_window(session_id).expected_version
+
+    def _write(self, sql: str, params: tuple):
+        """Insert via the write-behind queue, or directly in sync mode."""
+        if self.writer:
+            self.writer.submit(sql, params)
+        else:
+            with SQLITE_SECONDS.time("write"):
+                self.store.execute(sql, params)
+
+    def flush(self):
+        """Commit any queued writes (no-op in sync mode)."""
+        if self.writer:
+            self.writer.flush()
+
+    def add_message(self, role: str, content: str, session_id: str = DEFAULT_SESSION):
         """Add a message to short-term memory."""
         timestamp = datetime.now().isoformat()
         msg = {"role": role, "content": content, "timestamp": timestamp}
-        
-        # Add to in-memory list
-        self.short_term.append(msg)
-        if len(self.short_term) > self.max_short_term:
-            self.short_term = self.short_term[-self.max_short_term:]
-        
+
+        # Add to in-memory window (a fresh list, so readers never see a partial update).
+        # The insert trigger will bump the session version once it commits.
+        window = self._get_window(session_id)
+        messages = window.messages + [msg]
+        self.sessions.put(session_id, SessionWindow(
+            messages[-self.max_short_term:], window.version, window.checked_epoch, window.queued + 1
+        ))
+
         # Save to DB
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO short_term_memory (role, content, timestamp) VALUES (?, ?, ?)",
-            (role, content, timestamp)
+        self._write(
+            "INSERT INTO short_term_memory (role, content, timestamp, session_id) VALUES (?, ?, ?, ?)",
+            (role, content, timestamp, session_id)
         )
-        conn.commit()
-        conn.close()
-        
+
         # Auto-detect important information from user messages
         if role == "user":
-            self._extract_important_info(content)
+            self._extract_important_info(content, session_id)
 
-    def _extract_important_info(self, content: str):
+    def _extract_important_info(self, content: str, session_id: str = DEFAULT_SESSION):
         """Detect and store important information from user messages."""
-        content_lower = content.lower()
-        
-        # Detect name introductions (Hindi patterns)
-        name_patterns = [
-            "mera naam", "mera name", "my name is", "mai hu", "main hu",
-            "मेरा नाम", "मैं हूं", "मैं हूँ", "i am", "i'm"
-        ]
-        for pattern in name_patterns:
-            if pattern in content_lower:
-                self.store_long_term("personal", "user_name_context", content, importance=5)
-                break
-        
-        # Detect preferences
-        pref_patterns = [
-            "mujhe pasand", "i like", "i love", "i prefer", "i hate", "i don't like",
-            "पसंद है", "अच्छा लगता", "पसंद नहीं", "favourite", "favorite"
-        ]
-        for pattern in pref_patterns:
-            if pattern in content_lower:
-                self.store_long_term("preference", "user_preference", content, importance=3)
-                break
-        
-        # Detect facts/information the user shares
-        fact_patterns = [
-            "i work", "i study", "i live", "meri age", "meri umar",
-            "मैं काम", "मैं पढ़", "मेरी उम्र", "i am a", "profession",
-            "mere ghar", "mere paas", "मेरे पास", "मेरे घर"
-        ]
-        for pattern in fact_patterns:
-            if pattern in content_lower:
-                self.store_long_term("fact", "user_fact", content, importance=4)
-                break
+        matched = memory_matcher.categories(content)
+        for category, key, importance in EXTRACTED_FACTS:
+            if category in matched:
+                self.store_long_term(category, key, content, importance=importance, session_id=session_id)
+
+    def store_long_term(self, category: str, key: str, value: str, importance: int = 1,
+                        session_id: str = DEFAULT_SESSION):
+        """Store information in long-term memory.
 
-    def store_long_term(self, category: str, key: str, value: str, importance: int = 1):
-        """Store information in long-term memory."""
+        A fact already stored (same category, key and normalized value) is
+        refreshed in place instead of being duplicated.
+        """
         timestamp = datetime.now().isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO long_term_memory (category, key, value, timestamp, importance) VALUES (?, ?, ?, ?, ?)",
-            (category, key, value, timestamp, importance)
+        # Rebuild the summary next time; the facts_version trigger tells other
+        # workers once the write commits
+        self.summaries.drop(session_id)
+        self._write(
+            "INSERT INTO long_term_memory (category, key, value, timestamp, importance, session_id, value_norm) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(session_id, category, key, value_norm) DO UPDATE SET "
+            "value = excluded.value, timestamp = excluded.timestamp, "
+            "importance = MAX(importance, excluded.importance)",
+            (category, key, value, timestamp, importance, session_id, normalize_fact(value))
         )
-        conn.commit()
-        conn.close()
+        for listener in self.fact_listeners:
+            listener(session_id)
 
-    def get_long_term_memories(self, limit: int = 10) -> List[Dict]:
+    def get_long_term_memories(self, limit: int = 10, session_id: str = DEFAULT_SESSION) -> List[Dict]:
         """Retrieve most important long-term memories."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT category, key, value, timestamp, importance FROM long_term_memory ORDER BY importance DESC, id DESC LIMIT ?",
-            (limit,)
+        rows = self.store.query(
+            "SELECT category, key, value, timestamp, importance FROM long_term_memory WHERE session_id = ? ORDER BY importance DESC, id DESC LIMIT ?",
+            (session_id, limit)
         )
-        rows = cursor.fetchall()
-        conn.close()
         return [
             {"category": r[0], "key": r[1], "value": r[2], "timestamp": r[3], "importance": r[4]}
             for r in rows
         ]
 
-    def get_conversation_context(self) -> List[Dict]:
-        """Get formatted conversation context for the AI."""
-        return [
-            {"role": msg["role"], "content": msg["content"]}
-            for msg in self.short_term
-        ]
+    def get_conversation_context(self, session_id: str = DEFAULT_SESSION) -> List[Dict]:
+        """Get formatted conversation context for the AI (shared; don't mutate)."""
+        return self._get_window(session_id).context
+
+    def get_memory_summary(self, session_id: str = DEFAULT_SESSION) -> str:
+        """Summary of stored memories for the prompt, memoized per session.
+
+        Rebuilt only after store_long_term / clear_all here, or when another
+        worker's commit moved the session's facts_version. Queued writes are
+        flushed before a rebuild, so under async durability a fact stored
+        this turn is in this turn's summary.
+        """
+        cached = self.summaries.get(session_id)
+        if cached is not None and not (
+            self._changed_this_epoch(cached) and self._facts_version(session_id) > cached.version
+        ):
+            self.summary_hits += 1
+            return cached.text
+        self.summary_misses += 1
 
-    def get_memory_summary(self) -> str:
+        # A miss usually follows store_long_term: commit the queued fact so
+        # this turn's summary already includes it
+        self.flush()
+        # Read the version first: a write landing mid-build then just means one extra rebuild
+        version = self._facts_version(session_id)
+        text = self._build_memory_summary(session_id)
+        self.summaries.put(session_id, MemorySummary(text, version, self._epoch))
+        return text
+
+    @timed(SQLITE_SECONDS, "build_summary")
+    def _build_memory_summary(self, session_id: str) -> str:
         """Generate a summary of all stored memories for context."""
-        memories = self.get_long_term_memories(20)
+        memories = self.get_long_term_memories(CORE_FACTS, session_id=session_id)
         if not memories:
             return ""
-        
+
         summary_parts = []
         for mem in memories:
             summary_parts.append(f"[{mem['category']}] {mem['value']}")
-        
+
         return "\n".join(summary_parts)
 
-    def save_summary(self, summary: str):
-        """Save a conversation summary."""
+    def save_summary(self, summary: str, session_id: str = DEFAULT_SESSION, folded_through: str = "",
+                     digest: str = ""):
+        """Save a conversation summary covering turns up to ``folded_through``.
+
+        ``digest`` is the LLM-written part ``summary`` starts with (kept as is
+        by later rolls), or "" if there is none.
+        """
         timestamp = datetime.now().isoformat()
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "INSERT INTO conversation_summaries (summary, timestamp) VALUES (?, ?)",
-            (summary, timestamp)
+        self.latest_summaries.put(session_id, ConversationSummary(summary, folded_through, digest, timestamp,
+                                                                  self._epoch))
+        self._write(
+            "INSERT INTO conversation_summaries (summary, timestamp, session_id, folded_through, digest) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (summary, timestamp, session_id, folded_through, digest)
         )
-        conn.commit()
-        conn.close()
 
-    def clear_short_term(self):
+    def get_summary_state(self, session_id: str = DEFAULT_SESSION) -> ConversationSummary:
+        """Most recent conversation summary and its folded-turn cursor, cached per session.
+
+        Once per epoch the newest row on disk is checked; it replaces the
+        cached summary only if it was saved after it (by another worker),
+        so this worker's still-queued save isn't undone.
+        """
+        state = self.latest_summaries.get(session_id)
+        if state is not None and not self._changed_this_epoch(state):
+            return state
+        with SQLITE_SECONDS.time("latest_summary"):
+            row = self.store.query_one(
+                "SELECT summary, folded_through, digest, timestamp FROM conversation_summaries "
+                "WHERE session_id = ? ORDER BY id DESC LIMIT 1",
+                (session_id,)
+            )
+        if state is None or (row and row[3] > state.saved_at):
+            state = ConversationSummary(*(row or ("", "", "", "")), self._epoch)
+            self.latest_summaries.put(session_id, state)
+        return state
+
+    def get_latest_summary(self, session_id: str = DEFAULT_SESSION) -> str:
+        """Most recent conversation summary ("" if none), cached per session."""
+        return self.get_summary_state(session_id).text
+
+    def _clear_window(self, session_id: str):
+        self.sessions.put(session_id, SessionWindow([], self._session_version(session_id), self._epoch))
+
+    def clear_short_term(self, session_id: str = DEFAULT_SESSION):
         """Clear short-term memory."""
-        self.short_term = []
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM short_term_memory")
-        conn.commit()
-        conn.close()
-
-    def clear_all(self):
+        self.flush()
+        with self.store.transaction() as cursor:
+            cursor.execute("DELETE FROM short_term_memory WHERE session_id = ?", (session_id,))
+            self._bump_session_version(cursor, session_id)
+        self._clear_window(session_id)
+
+    def clear_all(self, session_id: str = DEFAULT_SESSION):
         """Clear all memory."""
-        self.short_term = []
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM short_term_memory")
-        cursor.execute("DELETE FROM long_term_memory")
-        cursor.execute("DELETE FROM conversation_summaries")
-        conn.commit()
-        conn.close()
-
-    def get_all_history(self) -> List[Dict]:
-        """Get all conversation history for display."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT role, content, timestamp FROM short_term_memory ORDER BY id ASC"
-        )
-        rows = cursor.fetchall()
-        conn.close()
+        self.flush()
+        with self.store.transaction() as cursor:
+            cursor.execute("DELETE FROM short_term_memory WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM long_term_memory WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM conversation_summaries WHERE session_id = ?", (session_id,))
+            cursor.execute("DELETE FROM memory_archive WHERE session_id = ?", (session_id,))
+            self._bump_session_version(cursor, session_id, facts=True)
+        self._clear_window(session_id)
+        self.summaries.drop(session_id)
+        self.latest_summaries.drop(session_id)
+
+    def get_all_history(self, session_id: str = DEFAULT_SESSION) -> List[Dict]:
+        """Get all conversation history for display.
+
+        Materializes everything; prefer get_history_page / iter_history.
+        """
         return [
-            {"role": r[0], "content": r[1], "timestamp": r[2]}
-            for r in rows
+            {"role": m["role"], "content": m["content"], "timestamp": m["timestamp"]}
+            for m in self.iter_history(session_id)
         ]
+
+    @timed(SQLITE_SECONDS, "history_page")
+    def get_history_page(self, session_id: str = DEFAULT_SESSION, before_id: Optional[int] = None,
+                         limit: int = 50) -> Dict:
+        """One page of history, newest first, using keyset pagination on id.
+
+        Pass the returned ``next_before_id`` back as ``before_id`` to get the
+        next (older) page; it is None once the start of history is reached.
+        Archived turns keep their ids, so paging runs on into the archive.
+        """
+        self.flush()
+        before_id = before_id if before_id is not None else 2 ** 63 - 1
+        rows = self.store.query(
+            "SELECT id, role, content, timestamp FROM short_term_memory "
+            "WHERE session_id = ? AND id < ? ORDER BY id DESC LIMIT ?",
+            (session_id, before_id, limit + 1)
+        )
+        items = [{"id": r[0], "role": r[1], "content": r[2], "timestamp": r[3]} for r in rows]
+        if len(items) <= limit and self.archive is not None:
+            items.extend(self.archive.archive_page(
+                session_id, items[-1]["id"] if items else before_id, limit + 1 - len(items)
+            ))
+        has_more = len(items) > limit
+        items = items[:limit]
+        return {
+            "items": items,
+            "next_before_id": items[-1]["id"] if has_more else None,
+        }
+
+    def iter_history(self, session_id: str = DEFAULT_SESSION, batch_size: int = 500) -> Iterator[Dict]:
+        """Yield the whole history oldest first, archived turns included, one batch in memory at a time."""
+        self.flush()
+        if self.archive is not None:
+            yield from self.archive.iter_archive(session_id)
+        last_id = 0
+        while True:
+            rows = self.store.query(
+                "SELECT id, role, content, timestamp FROM short_term_memory "
+                "WHERE session_id = ? AND id > ? ORDER BY id ASC LIMIT ?",
+                (session_id, last_id, batch_size)
+            )
+            if not rows:
+                return
+            for r in rows:
+                yield {"id": r[0], "role": r[1], "content": r[2], "timestamp": r[3]}
+            last_id = rows[-1][0]
+
+    def close(self):
+        """Drain queued writes and close all pooled database connections."""
+        if self.writer:
+            self.writer.close()
+        self.store.close()
@@ -0,0 +1,135 @@
+"""
+Memory trigger patterns - one compiled, single-pass matcher for every category
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, NamedTuple, Set
+
+# category -> trigger phrases (Hinglish, English and Devanagari)
+MEMORY_PATTERNS: Dict[str, List[str]] = {
+    # Name introductions
+    "personal": [
+        "mera naam", "mera name", "my name is", "mai hu", "main hu",
+        "मेरा नाम", "मैं हूं", "मैं हूँ", "i am", "i'm",
+    ],
+    # Likes and dislikes
+    "preference": [
+        "mujhe pasand", "i like", "i love", "i prefer", "i hate", "i don't like",
+        "पसंद है", "अच्छा लगता", "पसंद नहीं", "favourite", "favorite",
+    ],
+    # Facts about the user's life
+    "fact": [
+        "i work", "i study", "i live", "meri age", "meri umar",
+        "मैं काम", "मैं पढ़", "मेरी उम्र", "i am a", "profession",
+        "mere ghar", "mere paas", "मेरे पास", "मेरे घर",
+    ],
+    # Exchanges worth remembering (checked on user message + AI reply)
+    "conversation_highlight": [
+        "yaad rakhunga", "yaad rakhta", "note karta", "remember",
+        "याद रखूंगा", "याद रखता", "नोट करता",
+        "tumhara naam", "aapka naam", "your name",
+    ],
+}
+
+def normalize_text(text: str) -> str:
+    """NFKC + casefold + collapsed whitespace; applied to patterns and input alike."""
+    if text.isascii():
+        # ASCII is already NFKC, and casefold() == lower() for it
+        text = text.lower()
+    else:
+        text = unicodedata.normalize("NFKC", text).casefold().replace("\u2019", "'")  # i’m -> i'm
+    return " ".join(text.split())
+
+
+def _trie_regex(phrases: Iterable[str]) -> str:
+    """Compile literal phrases into a prefix-factored regex.
+
+    Python's re tries alternation branches one by one; factoring common
+    prefixes ("i (?:a(?:m(?: a)?)|l(?:ike|ive|ove))...") means at most one
+    branch can proceed at each character. Optional tails are greedy, so the
+    longest phrase at a position wins.
+    """
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}  # End of phrase
+
+    def build(node: dict) -> str:
+        ends_here = "" in node
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        if ends_here:
+            return body + "?" if len(branches) == 1 and len(body) == 1 else "(?:" + body + ")?"
+        return body
+
+    return build(trie)
+
+
+class PatternMatch(NamedTuple):
+    category: str
+    pattern: str
+    start: int  # Offsets into normalize_text(text)
+    end: int
+
+
+class PatternMatcher:
+    """Finds every occurrence of every pattern, across all categories, in one pass.
+
+    All phrases are compiled into a single alternation, longest first, so each
+    regex search returns the longest phrase starting at the leftmost position.
+    Shorter phrases that are prefixes of it ("i am" inside "i am a") are
+    emitted from a precomputed table, and the next search starts one character
+    later, so overlapping phrases from different categories are all reported —
+    the same result as checking each phrase with ``in``, in a fraction of the
+    Python-level work.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        owners: Dict[str, List[str]] = {}
+        for category, patterns in categories.items():
+            for pattern in patterns:
+                owners.setdefault(normalize_text(pattern), []).append(category)
+
+        phrases = sorted(owners, key=len, reverse=True)
+        self._regex = re.compile(_trie_regex(phrases))
+        # phrase -> every (category, phrase) that matches at the same start
+        self._prefixes = {
+            phrase: [(category, other) for other in phrases if phrase.startswith(other)
+                     for category in owners[other]]
+            for phrase in phrases
+        }
+
+    def find_all(self, text: str) -> List[PatternMatch]:
+        """Every category/phrase occurrence, ordered by position."""
+        normalized = normalize_text(text)
+        return self._find_normalized(normalized)
+
+    def _find_normalized(self, normalized: str) -> List[PatternMatch]:
+        matches = []
+        search = self._regex.search
+        m = search(normalized)
+        while m is not None:
+            start = m.start()
+            for category, phrase in self._prefixes[m.group()]:
+                matches.append(PatternMatch(category, phrase, start, start + len(phrase)))
+            m = search(normalized, start + 1)
+        return matches
+
+    def categories(self, text: str) -> Set[str]:
+        """Just the set of categories that matched."""
+        normalized = normalize_text(text)
+        found = set()
+        search = self._regex.search
+        m = search(normalized)
+        while m is not None:
+            for category, _ in self._prefixes[m.group()]:
+                found.add(category)
+            m = search(normalized, m.start() + 1)
+        return found
+
+
+memory_matcher = PatternMatcher(MEMORY_PATTERNS)
@@ -0,0 +1,157 @@
+"""
+Memory search - relevance-ranked retrieval over long-term facts and summaries
+"""
+import heapq
+import os
+import re
+import time
+from typing import Dict, Iterable, List, Optional
+
+from memory_manager import MemoryManager, DEFAULT_SESSION
+from memory_patterns import normalize_text
+from metrics import RETRIEVAL_SECONDS, timed
+
+# Relevant memories added to the prompt per turn
+RELEVANT_K = int(os.getenv("MEMORY_RELEVANT_K", "5"))
+# A memory loses half its recency weight every this many days
+RECENCY_HALF_LIFE_DAYS = float(os.getenv("MEMORY_RECENCY_HALF_LIFE_DAYS", "30"))
+# Newest matches scored per search. bm25 costs ~2µs per row, so scoring
+# every match of a common word in a huge session would take tens of ms;
+# recency decay makes older matches lose anyway.
+SEARCH_WINDOW = int(os.getenv("MEMORY_SEARCH_WINDOW", "500"))
+MAX_QUERY_TERMS = 8
+
+_TERMS = re.compile(r"\w+")
+
+# Words too common to say anything about what the user is asking
+STOPWORDS = {
+    # Hinglish
+    "hai", "hain", "ho", "tha", "thi", "the", "ka", "ki", "ke", "ko", "se", "me", "mein", "main", "mai",
+    "mera", "meri", "mere", "mujhe", "tum", "tu", "aap", "hum", "ye", "yeh", "wo", "woh", "kya", "na",
+    "nahi", "bhi", "aur", "to", "toh", "ek", "kuch", "bahut", "bohot", "acha", "haan", "ji", "yaar", "riko",
+    "batao", "bata", "karo", "kar", "raha", "rahi", "rahe",
+    # English
+    "i", "me", "my", "you", "your", "a", "an", "is", "am", "are", "was", "were", "be", "of", "in", "on",
+    "at", "for", "and", "or", "it", "this", "that", "do", "what", "how", "can", "please", "tell",
+    # Devanagari
+    "है", "हैं", "का", "की", "के", "को", "से", "में", "मैं", "मेरा", "मेरी", "मुझे", "और", "भी", "क्या",
+}
+
+
+def match_query(message: str) -> Optional[str]:
+    """FTS5 MATCH expression for a user message (None if nothing searchable).
+
+    Each remaining word is quoted (no FTS syntax gets through), longer words
+    match as prefixes ("gaana" finds "gaane"), and terms are OR-ed so bm25
+    ranks by how many and how rare.
+    """
+    terms = []
+    for word in _TERMS.findall(normalize_text(message)):
+        if len(word) < 2 or word in STOPWORDS or word in terms:
+            continue
+        terms.append(word)
+        if len(terms) == MAX_QUERY_TERMS:
+            break
+    if not terms:
+        return None
+    return " OR ".join(f'"{t[:-1]}"*' if len(t) >= 5 else f'"{t}"' for t in terms)
+
+
+class MemoryRetriever:
+    """Pulls the memories that matter for the current message.
+
+    Candidates are the newest ``SEARCH_WINDOW`` matches in the FTS5 index
+    (narrowed to the session inside the index); each is then scored
+    relevance x importance x recency decay:
+
+        score = -bm25 * (importance / 5) * 0.5 ** (age_days / half_life)
+    """
+
+    def __init__(self, memory: MemoryManager):
+        self.memory = memory
+        self.store = memory.store
+        self.searches = 0
+        self.empty_queries = 0
+        self._shares = {}
+
+    def _session_share(self, session_id: str) -> float:
+        """Fraction of all facts that belong to this session (refreshed every minute)."""
+        cached = self._shares.get(session_id)
+        now = time.monotonic()
+        if cached is None or cached[1] < now:
+            own, = self.store.query_one("SELECT COUNT(*) FROM long_term_memory WHERE session_id = ?", (session_id,))
+            total, = self.store.query_one("SELECT COUNT(*) FROM long_term_memory")
+            cached = (own / total if total else 1.0, now + 60)
+            if len(self._shares) > 10000:
+                self._shares.clear()
+            self._shares[session_id] = cached
+        return cached[0]
+
+    def _scope(self, session_id: str, match: str) -> str:
+        """Narrow the match to the session inside the index.
+
+        Intersecting with the session's posting list pays off when the
+        session is a small part of the DB; when it holds most facts, the
+        join filter alone is cheaper. The exact check always happens in SQL.
+        """
+        if not _TERMS.search(session_id) or self._session_share(session_id) > 0.5:
+            return match
+        return f'session_id : "{session_id.replace(chr(34), " ")}" AND ({match})'
+
+    @timed(RETRIEVAL_SECONDS, "fts")
+    def search_facts(self, message: str, session_id: str = DEFAULT_SESSION, k: int = RELEVANT_K,
+                     exclude: Iterable[str] = ()) -> List[Dict]:
+        """The k most relevant long-term facts for ``message``, best first."""
+        match = match_query(message)
+        if match is None or not self.memory.fts_enabled:
+            self.empty_queries += 1
+            return []
+        self.searches += 1
+
+        rows = self.store.query(
+            "SELECT l.category, l.key, l.value, l.timestamp, l.importance, c.bm25, "
+            "julianday('now', 'localtime') - julianday(l.timestamp) FROM ("
+            "  SELECT rowid, bm25(long_term_fts) AS bm25 FROM long_term_fts WHERE long_term_fts MATCH ? "
+            "  ORDER BY rowid DESC LIMIT ?"
+            ") c JOIN long_term_memory l ON l.id = c.rowid WHERE l.session_id = ?",
+            (self._scope(session_id, match), SEARCH_WINDOW, session_id)
+        )
+        skip = set(exclude)
+        scored = []
+        for row in rows:
+            if row[2] in skip:
+                continue
+            age_days = row[6] if row[6] is not None and row[6] > 0 else 0.0
+            scored.append((-row[5] * (max(row[4], 1) / 5) * 0.5 ** (age_days / RECENCY_HALF_LIFE_DAYS), row))
+        return [
+            {"category": category, "key": key, "value": value, "timestamp": timestamp,
+             "importance": importance, "score": round(score, 4)}
+            for score, (category, key, value, timestamp, importance, _, _) in heapq.nlargest(k, scored, key=lambda p: p[0])
+        ]
+
+    def search_summaries(self, message: str, session_id: str = DEFAULT_SESSION, k: int = 3,
+                         exclude: Iterable[str] = ()) -> List[str]:
+        """Lines from older conversation summaries that mention the message's terms."""
+        match = match_query(message)
+        if match is None or not self.memory.fts_enabled:
+            return []
+        rows = self.store.query(
+            "SELECT s.summary FROM summaries_fts JOIN conversation_summaries s ON s.id = summaries_fts.rowid "
+            "WHERE summaries_fts MATCH ? AND s.session_id = ? ORDER BY rank LIMIT 5",
+            (self._scope(session_id, match), session_id)
+        )
+        terms = [t.strip('"*') for t in match.split(" OR ")]
+        skip = set(exclude)
+        lines = []
+        for summary, in rows:
+            for line in summary.splitlines():
+                lowered = normalize_text(line)
+                if line in skip or line in lines or not any(t in lowered for t in terms):
+                    continue
+                lines.append(line)
+                if len(lines) == k:
+                    return lines
+        return lines
+
+    def stats(self) -> Dict:
+        return {"enabled": self.memory.fts_enabled, "searches": self.searches, "empty_queries": self.empty_queries}
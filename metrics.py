@@ -0,0 +1,196 @@
+"""
+Metrics - Prometheus text-format counters, histograms and hot-path timers
+"""
+import asyncio
+import bisect
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Sequence, Tuple
+
+METRICS = os.getenv("METRICS", "1") == "1"
+
+# Seconds; spans a cached SQLite read (~50µs) to a slow completion
+LATENCY_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+LAG_BUCKETS = (0.5, 1, 2, 5, 10, 30, 60, 300, 900, 3600)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 1536, 2048, 4096, 8192)
+
+_NULL = nullcontext()
+_registry: List = []
+
+
+def _labels(names: Sequence[str], values: Tuple) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1):
+        if not METRICS:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels):
+        if not METRICS:
+            return
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def time(self, *labels):
+        """Context manager observing the block's wall time (no-op when disabled)."""
+        return _timer(self, labels) if METRICS else _NULL
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.label_names + ("le",)
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else _number(bound)
+                    lines.append(f"{self.name}_bucket{_labels(names, labels + (le,))} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {_number(total)}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read from ``fn`` at scrape time."""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            return []
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge", f"{self.name} {_number(value)}"]
+
+
+@contextmanager
+def _timer(histogram: Histogram, labels: Tuple):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - started, *labels)
+
+
+def timed(histogram: Histogram, *labels):
+    """Decorator observing each call's duration; returns the function untouched when disabled."""
+    def decorate(fn):
+        if not METRICS:
+            return fn
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, *labels)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - started, *labels)
+        return wrapper
+    return decorate
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    metric = Counter(name, help, labels)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, help, labels, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help: str, fn: Callable[[], float]) -> Gauge:
+    metric = Gauge(name, help, fn)
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """Every registered metric in the Prometheus text exposition format.
+
+    Values are per worker process; with several gunicorn workers each
+    scrape sees the worker that answered it.
+    """
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---- The app's metrics (defined here so any module can import them) ----
+
+CHAT_SECONDS = histogram("riko_chat_seconds", "End-to-end chat turn latency", ("endpoint", "source"))
+CHAT_TTFT_SECONDS = histogram("riko_chat_ttft_seconds", "Time to first streamed token")
+MODEL_SECONDS = histogram("riko_model_attempt_seconds", "Upstream completion attempt latency (streams: to first token)",
+                          ("model", "outcome"))
+MODEL_FALLBACKS = counter("riko_model_fallbacks_total", "Attempts on a model after an earlier one failed or was slow",
+                          ("model",))
+SQLITE_SECONDS = histogram("riko_sqlite_seconds", "SQLite reads and write batches in the memory layer", ("op",))
+SUPABASE_SYNC_LAG = histogram("riko_supabase_sync_lag_seconds", "Age of the oldest row in each batch pushed to Supabase",
+                              buckets=LAG_BUCKETS)
+SUPABASE_PUSH_SECONDS = histogram("riko_supabase_push_seconds", "Supabase batch insert latency")
+PROMPT_BUILD_SECONDS = histogram("riko_prompt_build_seconds", "Building the messages for a completion (memory, retrieval, packing)")
+RETRIEVAL_SECONDS = histogram("riko_memory_retrieval_seconds", "Relevant-memory lookups per turn", ("index",))
+PROMPT_TOKENS = histogram("riko_prompt_tokens", "Estimated prompt size per completion", ("part",),
+                          buckets=TOKEN_BUCKETS)
+MEMORY_EXTRACTIONS = counter("riko_memory_extractions_total", "Background memory-extraction completions", ("outcome",))
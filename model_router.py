@@ -0,0 +1,331 @@
+"""
+Model router - health-aware fallback across Groq models with circuit breakers
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, List, Optional
+
+from context_window import fit_to_model
+from metrics import MODEL_FALLBACKS, MODEL_SECONDS
+
+# Per-attempt limits. A model that hasn't answered (or sent its first token)
+# by then is treated as failed and the next one is tried.
+ATTEMPT_TIMEOUT = float(os.getenv("MODEL_ATTEMPT_TIMEOUT", "20"))
+FIRST_TOKEN_TIMEOUT = float(os.getenv("MODEL_FIRST_TOKEN_TIMEOUT", "8"))
+# Circuit breaker: open after this many consecutive failures, for a cooldown
+# that doubles on every re-open (capped)
+BREAKER_THRESHOLD = int(os.getenv("MODEL_BREAKER_THRESHOLD", "3"))
+BREAKER_COOLDOWN = float(os.getenv("MODEL_BREAKER_COOLDOWN", "30"))
+BREAKER_MAX_COOLDOWN = float(os.getenv("MODEL_BREAKER_MAX_COOLDOWN", "600"))
+# Hedging: if the first model hasn't answered by its p95 latency, also ask the next one
+HEDGE = os.getenv("MODEL_HEDGE", "0") == "1"
+HEDGE_MIN_DELAY = float(os.getenv("MODEL_HEDGE_MIN_DELAY", "1.0"))
+
+EWMA_ALPHA = 0.2
+
+
+class ModelHealth:
+    """Latency/error tracking plus a closed → open → half-open circuit breaker."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, model: str):
+        self.model = model
+        self.state = self.CLOSED
+        self.latency_ewma: Optional[float] = None  # seconds
+        self.error_ewma = 0.0
+        self.latencies = deque(maxlen=100)
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.cooldown = BREAKER_COOLDOWN
+        self.probe_in_flight = False
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_error: Optional[str] = None
+
+    def available(self, now: float) -> bool:
+        """May a request be sent now? Moves open → half-open after the cooldown."""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and now - self.opened_at >= self.cooldown:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self.probe_in_flight:
+            return True
+        return False
+
+    def on_attempt(self):
+        if self.state == self.HALF_OPEN:
+            self.probe_in_flight = True
+
+    def record_success(self, latency: float):
+        self.successes += 1
+        self.latencies.append(latency)
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.latency_ewma
+        )
+        self.error_ewma *= (1 - EWMA_ALPHA)
+        self.consecutive_failures = 0
+        self.probe_in_flight = False
+        if self.state != self.CLOSED:
+            print(f"✅ Model {self.model} recovered, closing circuit")
+        self.state = self.CLOSED
+        self.cooldown = BREAKER_COOLDOWN
+
+    def record_failure(self, error: str, permanent: bool = False):
+        self.failures += 1
+        self.last_error = error
+        self.error_ewma = EWMA_ALPHA + (1 - EWMA_ALPHA) * self.error_ewma
+        self.consecutive_failures += 1
+        was_probe = self.state == self.HALF_OPEN
+        self.probe_in_flight = False
+        if permanent or was_probe or self.consecutive_failures >= BREAKER_THRESHOLD:
+            if was_probe:
+                self.cooldown = min(self.cooldown * 2, BREAKER_MAX_COOLDOWN)
+            if permanent:
+                self.cooldown = BREAKER_MAX_COOLDOWN
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            print(f"⛔ Circuit open for {self.model} ({self.cooldown:.0f}s): {error}")
+
+    def p95(self) -> Optional[float]:
+        if len(self.latencies) < 10:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def snapshot(self) -> dict:
+        p95 = self.p95()
+        return {
+            "state": self.state,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "error_rate_ewma": round(self.error_ewma, 3),
+            "successes": self.successes,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_error": self.last_error,
+        }
+
+
+def _is_auth_error(error_msg: str) -> bool:
+    return "401" in error_msg
+
+
+def _is_permanent(error_msg: str) -> bool:
+    """Errors that won't fix themselves: retired or unknown model."""
+    lowered = error_msg.lower()
+    return "decommissioned" in lowered or "model_not_found" in lowered or "does not exist" in lowered
+
+
+class ModelManager:
+    def __init__(self, models: Optional[List[str]] = None):
+        self.models = models or [
+            "llama-3.1-8b-instant",    # Primary: Fast & Cheap
+            "mixtral-8x7b-32768",      # Secondary: Robust & Smart
+            "gemma-7b-it",             # Tertiary: Reliable Fallback
+        ]
+        self.health: Dict[str, ModelHealth] = {m: ModelHealth(m) for m in self.models}
+        self.fallbacks = 0
+        self.hedges_fired = 0
+        self.hedge_wins = 0
+
+    def route(self) -> List[str]:
+        """Models to try, in priority order, skipping open circuits.
+
+        If every circuit is open, the one closest to its half-open probe is
+        tried anyway rather than failing outright.
+        """
+        now = time.monotonic()
+        order = [m for m in self.models if self.health[m].available(now)]
+        for m in self.models:
+            if m not in order:
+                self.health[m].skipped += 1
+        if not order:
+            order = [min(self.models, key=lambda m: self.health[m].opened_at + self.health[m].cooldown)]
+        return order
+
+    async def _attempt(self, client, model, messages, temperature, max_tokens) -> str:
+        health = self.health[model]
+        health.on_attempt()
+        started = time.monotonic()
+        try:
+            completion = await asyncio.wait_for(
+                client.chat.completions.create(
+                    model=model,
+                    messages=fit_to_model(messages, model, max_tokens),
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                ),
+                timeout=ATTEMPT_TIMEOUT,
+            )
+        except asyncio.CancelledError:
+            # Lost a hedge race; says nothing about health
+            MODEL_SECONDS.observe(time.monotonic() - started, model, "cancelled")
+            raise
+        except Exception as e:
+            error_msg = str(e) or f"timed out after {ATTEMPT_TIMEOUT:g}s"
+            print(f"❌ Model {model} failed: {error_msg}")
+            MODEL_SECONDS.observe(time.monotonic() - started, model, "error")
+            if not _is_auth_error(error_msg):
+                health.record_failure(error_msg, permanent=_is_permanent(error_msg))
+            raise
+        finally:
+            # A probe that ended without a verdict (cancelled, bad key) must not hold the half-open slot
+            health.probe_in_flight = False
+        health.record_success(time.monotonic() - started)
+        MODEL_SECONDS.observe(time.monotonic() - started, model, "ok")
+        return completion.choices[0].message.content
+
+    async def chat_completion(self, client, messages, temperature=0.7, max_tokens=1024):
+        order = self.route()
+        if HEDGE and len(order) > 1:
+            return await self._hedged_completion(client, order, messages, temperature, max_tokens)
+
+        last_error = None
+        for i, model in enumerate(order):
+            try:
+                print(f"🧠 Trying model: {model}...")
+                if i:
+                    self.fallbacks += 1
+                    MODEL_FALLBACKS.inc(model)
+                return await self._attempt(client, model, messages, temperature, max_tokens)
+            except Exception as e:
+                last_error = e
+                # If it's an auth error (401), don't retry other models
+                if _is_auth_error(str(e)):
+                    raise e
+                continue  # Try next model automatically
+
+        # If all failed
+        raise last_error
+
+    async def _hedged_completion(self, client, order, messages, temperature, max_tokens):
+        """Race the primary against the next model once the primary is slow.
+
+        The backup fires after the primary's observed p95 (or immediately if
+        the primary fails first); the first successful answer wins and the
+        loser is cancelled.
+        """
+        pending = {}
+        queue = list(order)
+        last_error = None
+
+        def launch():
+            model = queue.pop(0)
+            print(f"🧠 Trying model: {model}...")
+            if model != order[0]:
+                MODEL_FALLBACKS.inc(model)
+            task = asyncio.ensure_future(self._attempt(client, model, messages, temperature, max_tokens))
+            pending[task] = model
+
+        launch()
+        hedge_delay = max(HEDGE_MIN_DELAY, self.health[order[0]].p95() or ATTEMPT_TIMEOUT)
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    pending, timeout=hedge_delay if queue else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Primary is slower than usual: hedge with the next model
+                    self.hedges_fired += 1
+                    self.fallbacks += 1
+                    launch()
+                    hedge_delay = None
+                    continue
+                for task in done:
+                    model = pending.pop(task)
+                    if task.exception() is None:
+                        if model != order[0]:
+                            self.hedge_wins += 1
+                        return task.result()
+                    last_error = task.exception()
+                    if _is_auth_error(str(last_error)):
+                        raise last_error
+                if not pending and queue:
+                    self.fallbacks += 1
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error
+
+    async def stream_completion(self, client, messages, temperature=0.7, max_tokens=1024) -> AsyncIterator[str]:
+        """Yield response tokens as they arrive.
+
+        Falls back to the next model only while nothing has been sent yet —
+        once a token has reached the client we can't switch models mid-reply.
+        """
+        last_error = None
+
+        for i, model in enumerate(self.route()):
+            health = self.health[model]
+            started = False
+            t0 = time.monotonic()
+            try:
+                print(f"🧠 Streaming model: {model}...")
+                if i:
+                    self.fallbacks += 1
+                    MODEL_FALLBACKS.inc(model)
+                health.on_attempt()
+                stream = await asyncio.wait_for(
+                    client.chat.completions.create(
+                        model=model,
+                        messages=fit_to_model(messages, model, max_tokens),
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        stream=True,
+                    ),
+                    timeout=FIRST_TOKEN_TIMEOUT,
+                )
+                chunks = stream.__aiter__()
+                while True:
+                    try:
+                        # Until the first token arrives the model may still be swapped out
+                        if started:
+                            chunk = await chunks.__anext__()
+                        else:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout=FIRST_TOKEN_TIMEOUT)
+                    except StopAsyncIteration:
+                        break
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if not started:
+                            # Health tracks time-to-first-token for streams
+                            health.record_success(time.monotonic() - t0)
+                            MODEL_SECONDS.observe(time.monotonic() - t0, model, "ok")
+                        started = True
+                        yield delta
+                if not started:
+                    health.record_success(time.monotonic() - t0)
+                    MODEL_SECONDS.observe(time.monotonic() - t0, model, "ok")
+                return
+            except Exception as e:
+                error_msg = str(e) or f"no first token after {FIRST_TOKEN_TIMEOUT:g}s"
+                print(f"❌ Model {model} failed: {error_msg}")
+                last_error = e
+                if not started:
+                    MODEL_SECONDS.observe(time.monotonic() - t0, model, "error")
+                if not started and not _is_auth_error(error_msg):
+                    health.record_failure(error_msg, permanent=_is_permanent(error_msg))
+                if started or _is_auth_error(error_msg):
+                    raise e
+                continue
+            finally:
+                # Also on a client disconnect (CancelledError / GeneratorExit) or a bad key:
+                # an unresolved probe would keep the model out of route() for good
+                health.probe_in_flight = False
+
+        raise last_error
+
+    def stats(self) -> dict:
+        return {
+            "models": {m: h.snapshot() for m, h in self.health.items()},
+            "fallbacks": self.fallbacks,
+            "hedges_fired": self.hedges_fired,
+            "hedge_wins": self.hedge_wins,
+        }
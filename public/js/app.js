@@ -11,6 +11,7 @@ class RikoApp {
         this.synthesis = window.speechSynthesis;
         this.hindiVoice = null;
         this.apiKey = localStorage.getItem('riko_api_key') || '';
+        this.sessionId = this._getSessionId();
 
         this.voiceModeActive = false;
         this.isListening = false;
@@ -245,14 +246,7 @@ class RikoApp {
 
 
         try {
-            const res = await fetch('/api/chat', {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message, api_key: this.apiKey })
-            });
-
-            if (!res.ok) throw new Error((await res.json()).detail || 'Server error');
-            const data = await res.json();
+            const data = await this._streamChat(message);
 
             if (this.vrmManager?.isLoaded) this.vrmManager.stopThinking();
 
@@ -297,6 +291,60 @@ class RikoApp {
         }
     }
 
+    // ========================================
+    //  STREAMING CHAT (SSE over fetch)
+    //  Shows tokens as they arrive, returns the final `done` payload
+    // ========================================
+
+    async _streamChat(message) {
+        const sentAt = performance.now();
+        const res = await fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ message, api_key: this.apiKey, session_id: this.sessionId })
+        });
+
+        if (!res.ok) throw new Error((await res.json()).detail || 'Server error');
+
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let done = null;
+
+        while (!done) {
+            const { value, done: ended } = await reader.read();
+            if (ended) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let sep;
+            while ((sep = buffer.indexOf('\n\n')) >= 0) {
+                const raw = buffer.slice(0, sep);
+                buffer = buffer.slice(sep + 2);
+
+                const event = (raw.match(/^event: (.*)$/m) || [])[1];
+                const payload = JSON.parse((raw.match(/^data: (.*)$/m) || [])[1] || '{}');
+
+                if (event === 'token') {
+                    if (!text) {
+                        this.lastTtftMs = Math.round(performance.now() - sentAt);
+                        console.log(`⚡ TTFT: ${this.lastTtftMs}ms`);
+                    }
+                    text += payload.delta;
+                    // Hide a half-streamed [ACTION:...] tag from the subtitle
+                    this._showSubtitle(text.replace(/\[ACTION:[^\]]*\]?$/, '').trim());
+                } else if (event === 'done') {
+                    done = payload;
+                } else if (event === 'error') {
+                    throw new Error(payload.detail || 'Server error');
+                }
+            }
+        }
+
+        if (!done) throw new Error('Stream ended early');
+        return done;
+    }
+
     _showEmotion(response) {
         if (!this.vrmManager?.isLoaded) return;
         const r = response.toLowerCase();
@@ -438,6 +486,18 @@ class RikoApp {
         this.synthesis.speak(utt);
     }
 
+    // One memory partition per browser, kept across reloads. A browser that used
+    // Riko before sessions existed (it has a key saved) keeps the 'default' memory.
+    _getSessionId() {
+        let id = localStorage.getItem('riko_session_id');
+        if (!id) {
+            if (localStorage.getItem('riko_api_key')) id = 'default';
+            else id = crypto.randomUUID ? crypto.randomUUID() : `s-${Date.now()}-${Math.random().toString(36).slice(2)}`;
+            localStorage.setItem('riko_session_id', id);
+        }
+        return id;
+    }
+
     _checkApiKey() { if (!this.apiKey) this._showApiKeyOverlay(); }
 
     _showApiKeyOverlay() {
@@ -498,13 +558,42 @@ class RikoApp {
 
     async _loadMemoryStats() {
         try {
-            const r = await fetch('/api/memory'); const d = await r.json();
-            document.getElementById('memoryStats').innerHTML = `<div>📝 Recent: ${d.short_term?.length || 0}</div><div>🧠 Long-term: ${d.long_term?.length || 0}</div>`;
+            const r = await fetch(`/api/memory?session_id=${encodeURIComponent(this.sessionId)}`); const d = await r.json();
+            document.getElementById('memoryStats').innerHTML = `<div>📝 Recent: ${d.short_term?.length || 0}</div><div>🧠 Long-term: ${d.long_term?.length || 0}</div><div class="memory-history" id="memoryHistory"></div>`;
+            this._renderHistoryPage(d.history || [], d.history_next_before_id);
         } catch (e) { }
     }
 
+    // History arrives newest-first; each "older" click fetches the next keyset page
+    _renderHistoryPage(items, nextBeforeId) {
+        const list = document.getElementById('memoryHistory');
+        if (!list) return;
+        document.getElementById('historyMoreBtn')?.remove();
+
+        for (const m of items) {
+            const row = document.createElement('div');
+            row.className = 'memory-history-item';
+            row.textContent = `${m.role === 'user' ? '🧑' : '🤖'} ${m.content}`;
+            list.appendChild(row);
+        }
+
+        if (nextBeforeId) {
+            const more = document.createElement('button');
+            more.className = 'btn-secondary'; more.id = 'historyMoreBtn'; more.textContent = 'Load older';
+            more.addEventListener('click', async () => {
+                more.disabled = true;
+                try {
+                    const r = await fetch(`/api/memory/history?session_id=${encodeURIComponent(this.sessionId)}&before_id=${nextBeforeId}&limit=50`);
+                    const page = await r.json();
+                    this._renderHistoryPage(page.items, page.next_before_id);
+                } catch (e) { more.disabled = false; }
+            });
+            list.appendChild(more);
+        }
+    }
+
     async _clearMemory(type) {
-        const url = type === 'all' ? '/api/memory/clear-all' : '/api/memory/clear';
+        const url = (type === 'all' ? '/api/memory/clear-all' : '/api/memory/clear') + `?session_id=${encodeURIComponent(this.sessionId)}`;
         if (type === 'all' && !confirm('Sab delete ho jaega!')) return;
         try { await fetch(url, { method: 'POST' }); this._showToast('Cleared 🧹', 'success'); if (type === 'all') location.reload(); } catch (e) { }
     }
@@ -0,0 +1,280 @@
+"""
+Response cache - exact and near-duplicate (MinHash) reuse of model replies
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+
+from memory_patterns import memory_matcher, normalize_text
+from sqlite_store import SQLiteStore
+
+RESPONSE_CACHE = os.getenv("RESPONSE_CACHE", "1") == "1"
+CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", "21600"))  # seconds
+CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "2000"))
+# Only short, self-contained turns are cached
+CACHE_MAX_WORDS = int(os.getenv("RESPONSE_CACHE_MAX_WORDS", "8"))
+# Minimum character-trigram Jaccard similarity for a fuzzy hit
+FUZZY_THRESHOLD = float(os.getenv("RESPONSE_CACHE_FUZZY_THRESHOLD", "0.8"))
+
+# MinHash signature: BANDS x ROWS hashes; two prompts become fuzzy candidates
+# when any band matches exactly (LSH), then the exact Jaccard decides
+BANDS, ROWS = 8, 4
+_PRIME = (1 << 61) - 1
+_SEEDS = [
+    (int.from_bytes(hashlib.blake2b(bytes([i]), digest_size=8).digest(), "big") % _PRIME | 1,
+     int.from_bytes(hashlib.blake2b(bytes([i, i]), digest_size=8).digest(), "big") % _PRIME)
+    for i in range(BANDS * ROWS)
+]
+
+# Words that point back at earlier turns ("woh wala", "usko", "again"...):
+# the right answer depends on the conversation, so such turns are never cached
+FOLLOW_UP_WORDS = {
+    "woh", "wo", "vo", "usko", "use", "uska", "uski", "iske", "iska", "isko", "yeh", "ye", "wahi", "wohi",
+    "phir", "fir", "dobara", "aur", "bhi", "pehle", "pichla", "pichle", "upar", "next", "agla", "agle",
+    "it", "that", "this", "those", "these", "them", "again", "more", "another", "same", "previous", "last",
+    "वो", "उसको", "उसे", "इसे", "फिर", "दोबारा", "और", "पहले",
+}
+
+_PUNCT = re.compile(r"[^\w\s]")
+_DIGITS = re.compile(r"\d+")
+
+
+def cache_key_text(message: str) -> str:
+    """Normalized form used for matching: casefolded, punctuation/emoji stripped."""
+    return " ".join(_PUNCT.sub(" ", normalize_text(message)).split())
+
+
+def _shingles(text: str) -> FrozenSet[str]:
+    padded = f" {text} "
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+def _minhash(shingles: FrozenSet[str]) -> List[int]:
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _SEEDS]
+
+
+def _bands(signature: List[int], fingerprint: str) -> List[Tuple]:
+    return [(fingerprint, i, tuple(signature[i * ROWS:(i + 1) * ROWS])) for i in range(BANDS)]
+
+
+class CacheEntry:
+    __slots__ = ("key", "text", "fingerprint", "response", "created_at", "shingles", "bands", "hits")
+
+    def __init__(self, key: str, text: str, fingerprint: str, response: str, created_at: float):
+        self.key = key
+        self.text = text
+        self.fingerprint = fingerprint
+        self.response = response
+        self.created_at = created_at
+        self.shingles = _shingles(text)
+        self.bands = _bands(_minhash(self.shingles), fingerprint)
+        self.hits = 0
+
+
+class ResponseCache:
+    """LRU + TTL cache of replies to short, context-free turns.
+
+    Entries are keyed on the normalized user message plus a fingerprint of
+    the context the reply depends on (the system message, which carries the
+    user's memory summary), so a reply is only reused for the same memory
+    state. Lookups try the exact key first, then near-duplicates via MinHash
+    LSH over character trigrams. Entries are persisted to SQLite so they
+    survive restarts and are shared between workers on an exact-key miss.
+    """
+
+    def __init__(self, store: SQLiteStore, max_entries: int = CACHE_SIZE, ttl: float = CACHE_TTL):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple, Set[str]] = {}
+        self._fingerprints: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.fuzzy_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self._puts = 0
+
+        with self.store.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS response_cache (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    fingerprint TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                )
+            """)
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_response_cache_created ON response_cache(created_at)")
+            cursor.execute("DELETE FROM response_cache WHERE created_at < ?", (time.time() - self.ttl,))
+        self._load()
+
+    def _load(self):
+        """Warm the in-memory LRU with the newest persisted entries."""
+        rows = self.store.query(
+            "SELECT key, text, fingerprint, response, created_at FROM response_cache "
+            "ORDER BY created_at DESC LIMIT ?", (self.max_entries,)
+        )
+        with self._lock:
+            for row in reversed(rows):
+                self._insert(CacheEntry(*row))
+
+    # ---- Keys ----
+
+    def fingerprint(self, context: str) -> str:
+        """Short hash of the context a reply depends on (memoized per string)."""
+        cached = self._fingerprints.get(context)
+        if cached is None:
+            cached = hashlib.blake2b(context.encode("utf-8"), digest_size=8).hexdigest()
+            self._fingerprints[context] = cached
+            while len(self._fingerprints) > 256:
+                self._fingerprints.popitem(last=False)
+        return cached
+
+    @staticmethod
+    def cacheable(message: str) -> bool:
+        """Short, self-contained turns only: no follow-ups and nothing to remember."""
+        text = cache_key_text(message)
+        words = text.split()
+        if not words or len(words) > CACHE_MAX_WORDS:
+            return False
+        if FOLLOW_UP_WORDS.intersection(words):
+            return False
+        # Personal facts go to the model (and into long-term memory) every time
+        return not memory_matcher.categories(message)
+
+    @staticmethod
+    def _key(text: str, fingerprint: str) -> str:
+        return f"{fingerprint}:{text}"
+
+    # ---- Lookup / store ----
+
+    def get(self, message: str, context: str) -> Optional[str]:
+        if not RESPONSE_CACHE or not self.cacheable(message):
+            self.bypassed += 1
+            return None
+        text = cache_key_text(message)
+        fingerprint = self.fingerprint(context)
+        key = self._key(text, fingerprint)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry.created_at < self.ttl:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.exact_hits += 1
+                return entry.response
+            if entry is not None:
+                self._remove(key)
+
+        # Another worker may have cached it
+        row = self.store.query_one(
+            "SELECT key, text, fingerprint, response, created_at FROM response_cache WHERE key = ? AND created_at >= ?",
+            (key, now - self.ttl)
+        )
+        if row is not None:
+            with self._lock:
+                self._insert(CacheEntry(*row))
+                self.exact_hits += 1
+            return row[3]
+
+        response = self._fuzzy_lookup(text, fingerprint, now)
+        if response is not None:
+            self.fuzzy_hits += 1
+            return response
+        self.misses += 1
+        return None
+
+    def _fuzzy_lookup(self, text: str, fingerprint: str, now: float) -> Optional[str]:
+        shingles = _shingles(text)
+        digits = _DIGITS.findall(text)
+        with self._lock:
+            candidates = set()
+            for band in _bands(_minhash(shingles), fingerprint):
+                candidates.update(self._buckets.get(band, ()))
+            best, best_score = None, FUZZY_THRESHOLD
+            for key in candidates:
+                entry = self._entries[key]
+                if now - entry.created_at >= self.ttl:
+                    continue
+                # "volume 10" and "volume 20" are close as strings but not as requests
+                if _DIGITS.findall(entry.text) != digits:
+                    continue
+                score = len(shingles & entry.shingles) / len(shingles | entry.shingles)
+                if score >= best_score:
+                    best, best_score = entry, score
+            if best is None:
+                return None
+            self._entries.move_to_end(best.key)
+            best.hits += 1
+            return best.response
+
+    def put(self, message: str, context: str, response: str):
+        if not RESPONSE_CACHE or not response or not self.cacheable(message):
+            return
+        text = cache_key_text(message)
+        fingerprint = self.fingerprint(context)
+        entry = CacheEntry(self._key(text, fingerprint), text, fingerprint, response, time.time())
+        with self._lock:
+            self._insert(entry)
+        self.store.execute(
+            "INSERT OR REPLACE INTO response_cache (key, text, fingerprint, response, created_at) VALUES (?, ?, ?, ?, ?)",
+            (entry.key, entry.text, entry.fingerprint, entry.response, entry.created_at)
+        )
+        self._puts += 1
+        if self._puts % 500 == 0:
+            self.prune()
+
+    def _insert(self, entry: CacheEntry):
+        if entry.key in self._entries:
+            self._remove(entry.key)
+        self._entries[entry.key] = entry
+        for band in entry.bands:
+            self._buckets.setdefault(band, set()).add(entry.key)
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def prune(self) -> int:
+        """Drop expired rows from SQLite (memory entries expire lazily)."""
+        with self.store.transaction() as cursor:
+            cursor.execute("DELETE FROM response_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            return cursor.execute("SELECT changes()").fetchone()[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+        self.store.execute("DELETE FROM response_cache")
+
+    def stats(self) -> Dict:
+        lookups = self.exact_hits + self.fuzzy_hits + self.misses
+        return {
+            "enabled": RESPONSE_CACHE,
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "fuzzy_hits": self.fuzzy_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "hit_rate": round((self.exact_hits + self.fuzzy_hits) / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,257 @@
+"""
+Memory retention - background compaction and archival of old conversation turns
+"""
+import json
+import os
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from memory_manager import MemoryManager
+
+# Newest turns kept in short_term_memory per session; older ones are archived
+KEEP_TURNS = int(os.getenv("MEMORY_KEEP_TURNS", "500"))
+# Turns older than this are archived even below KEEP_TURNS (0 disables)
+ARCHIVE_AFTER_DAYS = int(os.getenv("MEMORY_ARCHIVE_AFTER_DAYS", "30"))
+# Rows per compressed archive segment
+SEGMENT_SIZE = int(os.getenv("MEMORY_SEGMENT_SIZE", "1000"))
+# Archived turns are deleted for good once their segment is this old (0 keeps
+# them forever), and beyond this many segments per session, oldest first (0: no cap)
+ARCHIVE_KEEP_DAYS = int(os.getenv("MEMORY_ARCHIVE_KEEP_DAYS", "365"))
+ARCHIVE_MAX_SEGMENTS = int(os.getenv("MEMORY_ARCHIVE_MAX_SEGMENTS", "100"))
+# Summaries kept per session
+KEEP_SUMMARIES = int(os.getenv("MEMORY_KEEP_SUMMARIES", "50"))
+COMPACT_INTERVAL = float(os.getenv("MEMORY_COMPACT_INTERVAL", "3600"))
+
+
+class RetentionManager:
+    """Keeps the memory tables bounded.
+
+    Each ``compact()`` run:
+    - moves turns beyond the newest ``KEEP_TURNS`` per session (or older than
+      ``ARCHIVE_AFTER_DAYS``) into zlib-compressed JSON segments in
+      ``memory_archive``, one transaction per segment;
+    - deletes archive segments older than ``ARCHIVE_KEEP_DAYS`` or beyond
+      ``ARCHIVE_MAX_SEGMENTS`` per session;
+    - trims ``conversation_summaries`` to the newest ``KEEP_SUMMARIES``;
+    - returns freed pages to the OS with an incremental vacuum.
+
+    The short-term window (``max_short_term`` newest turns) is never archived,
+    so cached windows stay valid. Archived turns keep their ids and are
+    still served by MemoryManager's history reads. Long-term facts are de-duplicated on write
+    by MemoryManager.store_long_term.
+    """
+
+    def __init__(self, memory: MemoryManager, interval: float = COMPACT_INTERVAL):
+        self.memory = memory
+        self.store = memory.store
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+        self.runs = 0
+        self.rows_archived = 0
+        self.segments_written = 0
+        self.segments_pruned = 0
+        self.last_run_at: Optional[float] = None
+        self.last_run_ms: Optional[float] = None
+        # History reads (pager, NDJSON export) continue into the archive
+        memory.archive = self
+
+    # ---- Background job ----
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def _run(self):
+        # First pass soon after boot, then every interval
+        delay = min(60.0, self.interval)
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️ Memory compaction failed: {e}")
+
+    # ---- Compaction ----
+
+    def compact(self) -> Dict:
+        """Run one full compaction pass. Safe to call while serving traffic."""
+        with self._lock:
+            started = time.perf_counter()
+            self.memory.flush()
+
+            archived = 0
+            for session_id, cutoff_id in self._archive_cutoffs():
+                archived += self._archive_session(session_id, cutoff_id)
+            pruned = self._prune_archive()
+            summaries_trimmed = self._trim_summaries()
+
+            self.store.execute("PRAGMA incremental_vacuum")
+            self.store.execute("PRAGMA optimize")
+
+            self.runs += 1
+            self.rows_archived += archived
+            self.segments_pruned += pruned
+            self.last_run_at = time.time()
+            self.last_run_ms = (time.perf_counter() - started) * 1000
+            if archived or pruned or summaries_trimmed:
+                print(f"🧹 Compacted memory: {archived} turns archived, {pruned} archive segments pruned, "
+                      f"{summaries_trimmed} summaries trimmed")
+            return {"archived": archived, "segments_pruned": pruned, "summaries_trimmed": summaries_trimmed}
+
+    def _archive_cutoffs(self) -> List[tuple]:
+        """(session_id, first id to keep) for every session with something to archive."""
+        keep = max(KEEP_TURNS, self.memory.max_short_term)
+        cutoffs = {}
+
+        for session_id, in self.store.query(
+            "SELECT session_id FROM short_term_memory GROUP BY session_id HAVING COUNT(*) > ?", (keep,)
+        ):
+            row = self.store.query_one(
+                "SELECT id FROM short_term_memory WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                (session_id, keep - 1)
+            )
+            cutoffs[session_id] = row[0]
+
+        if ARCHIVE_AFTER_DAYS > 0:
+            threshold = (datetime.now() - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+            for session_id, in self.store.query(
+                "SELECT DISTINCT session_id FROM short_term_memory WHERE timestamp < ?", (threshold,)
+            ):
+                # First turn newer than the threshold, but never cut into the live window
+                first_recent = self.store.query_one(
+                    "SELECT MIN(id) FROM short_term_memory WHERE session_id = ? AND timestamp >= ?",
+                    (session_id, threshold)
+                )[0]
+                window_start = self.store.query_one(
+                    "SELECT id FROM short_term_memory WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?",
+                    (session_id, self.memory.max_short_term - 1)
+                )
+                if window_start is None:
+                    continue
+                cutoff = min(first_recent or window_start[0], window_start[0])
+                cutoffs[session_id] = max(cutoffs.get(session_id, 0), cutoff)
+
+        return list(cutoffs.items())
+
+    def _archive_session(self, session_id: str, cutoff_id: int) -> int:
+        archived = 0
+        while True:
+            with self.store.transaction() as cursor:
+                rows = cursor.execute(
+                    "SELECT id, role, content, timestamp FROM short_term_memory "
+                    "WHERE session_id = ? AND id < ? ORDER BY id LIMIT ?",
+                    (session_id, cutoff_id, SEGMENT_SIZE)
+                ).fetchall()
+                if not rows:
+                    return archived
+                payload = zlib.compress(
+                    json.dumps([list(r) for r in rows], ensure_ascii=False).encode("utf-8"), 6
+                )
+                cursor.execute(
+                    "INSERT INTO memory_archive (session_id, first_id, last_id, first_timestamp, "
+                    "last_timestamp, row_count, payload) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (session_id, rows[0][0], rows[-1][0], rows[0][3], rows[-1][3], len(rows), payload)
+                )
+                cursor.execute(
+                    "DELETE FROM short_term_memory WHERE session_id = ? AND id BETWEEN ? AND ?",
+                    (session_id, rows[0][0], rows[-1][0])
+                )
+            archived += len(rows)
+            self.segments_written += 1
+
+    def _prune_archive(self) -> int:
+        """Delete expired archive segments and each session's oldest beyond the cap."""
+        pruned = 0
+        with self.store.transaction() as cursor:
+            if ARCHIVE_KEEP_DAYS > 0:
+                threshold = (datetime.now() - timedelta(days=ARCHIVE_KEEP_DAYS)).isoformat()
+                cursor.execute("DELETE FROM memory_archive WHERE last_timestamp < ?", (threshold,))
+                pruned += cursor.execute("SELECT changes()").fetchone()[0]
+            if ARCHIVE_MAX_SEGMENTS > 0:
+                cursor.execute("""
+                    DELETE FROM memory_archive WHERE id IN (
+                        SELECT id FROM (
+                            SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY first_id DESC) AS rn
+                            FROM memory_archive
+                        ) WHERE rn > ?
+                    )
+                """, (ARCHIVE_MAX_SEGMENTS,))
+                pruned += cursor.execute("SELECT changes()").fetchone()[0]
+        return pruned
+
+    def _trim_summaries(self) -> int:
+        with self.store.transaction() as cursor:
+            cursor.execute("""
+                DELETE FROM conversation_summaries WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY id DESC) AS rn
+                        FROM conversation_summaries
+                    ) WHERE rn > ?
+                )
+            """, (KEEP_SUMMARIES,))
+            return cursor.execute("SELECT changes()").fetchone()[0]
+
+    # ---- Reading archives ----
+
+    def iter_archive(self, session_id: str) -> Iterator[Dict]:
+        """Yield archived turns for a session, oldest first, one segment at a time."""
+        last_id = 0
+        while True:
+            row = self.store.query_one(
+                "SELECT first_id, payload FROM memory_archive WHERE session_id = ? AND first_id > ? "
+                "ORDER BY first_id LIMIT 1",
+                (session_id, last_id)
+            )
+            if row is None:
+                return
+            last_id = row[0]
+            for row_id, role, content, timestamp in json.loads(zlib.decompress(row[1])):
+                yield {"id": row_id, "role": role, "content": content, "timestamp": timestamp}
+
+    def archive_page(self, session_id: str, before_id: int, limit: int) -> List[Dict]:
+        """Up to ``limit`` archived turns with id below ``before_id``, newest first."""
+        turns: List[Dict] = []
+        while len(turns) < limit:
+            row = self.store.query_one(
+                "SELECT first_id, payload FROM memory_archive WHERE session_id = ? AND first_id < ? "
+                "ORDER BY first_id DESC LIMIT 1",
+                (session_id, before_id)
+            )
+            if row is None:
+                break
+            rows = json.loads(zlib.decompress(row[1]))
+            turns.extend(
+                {"id": row_id, "role": role, "content": content, "timestamp": timestamp}
+                for row_id, role, content, timestamp in reversed(rows) if row_id < before_id
+            )
+            before_id = row[0]
+        return turns[:limit]
+
+    def stats(self) -> Dict:
+        segments, rows, compressed = self.store.query_one(
+            "SELECT COUNT(*), COALESCE(SUM(row_count), 0), COALESCE(SUM(LENGTH(payload)), 0) FROM memory_archive"
+        )
+        return {
+            "runs": self.runs,
+            "last_run_at": self.last_run_at,
+            "last_run_ms": round(self.last_run_ms, 1) if self.last_run_ms is not None else None,
+            "rows_archived": self.rows_archived,
+            "segments_pruned": self.segments_pruned,
+            "archive_segments": segments,
+            "archive_rows": rows,
+            "archive_bytes": compressed,
+        }
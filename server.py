@@ -2,24 +2,89 @@
 Riko AI Assistant - FastAPI Backend Server
 Hindi-speaking AI with human-like personality and memory
 """
+import time
+
+BOOT_STARTED = time.perf_counter()
+
 import os
 import json
+import asyncio
+import threading
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
 from datetime import datetime
-from typing import Optional
+from typing import Dict, Optional
 
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse, JSONResponse
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 
-from memory_manager import MemoryManager
+from memory_manager import MemoryManager, DEFAULT_SESSION
+from memory_search import MemoryRetriever, RELEVANT_K
+from memory_patterns import memory_matcher
+from context_window import SUMMARY_BUDGET, count_tokens, pack_history, prompt_tokens, roll_summary
+import metrics
+from metrics import CHAT_SECONDS, CHAT_TTFT_SECONDS, PROMPT_BUILD_SECONDS, PROMPT_TOKENS, timed
+from model_router import ModelManager
+from admission import AdmissionController, Rejected, client_key
+from retention import RetentionManager
+from memory_extractor import MemoryExtractor
+from response_cache import ResponseCache
+from intent_engine import intent_engine
+from single_flight import Abandoned, SingleFlight
+from static_assets import AssetIndex
 from supabase_manager import supabase_manager
 
 load_dotenv()
 
-app = FastAPI(title="Riko AI Assistant", version="1.0.0")
+# Warm up in the background after startup: semantic index, Groq client + connection
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") == "1"
+WARMUP_TIMEOUT = float(os.getenv("WARMUP_TIMEOUT", "10"))  # seconds
+
+
+class BootState:
+    """Boot phase timings (ms) and whether background warm-up has finished."""
+
+    def __init__(self):
+        self.phases = {}
+        self.ready = False
+        self.errors = []
+
+    def mark(self, phase: str, started: float):
+        self.phases[phase] = round((time.perf_counter() - started) * 1000, 1)
+
+    def stats(self) -> dict:
+        return {"ready": self.ready, "phases_ms": dict(self.phases), "warmup_errors": list(self.errors)}
+
+
+boot = BootState()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    _startup()
+    boot.mark("startup", started)
+    print(f"🚀 Riko serving in {boot.phases['import'] + boot.phases['startup']:.0f} ms "
+          f"(import {boot.phases['import']:.0f} ms, startup {boot.phases['startup']:.0f} ms)")
+    warmup = asyncio.create_task(_warm_up())
+    try:
+        yield
+    finally:
+        warmup.cancel()
+        await extractor.stop()
+        await groq_clients.close_all()
+        # Commit queued memory writes before the worker exits
+        retention.stop()
+        memory.close()
+        # Give the outbox one last push; anything left is retried on next boot
+        supabase_manager.stop()
+
+
+app = FastAPI(title="Riko AI Assistant", version="1.0.0", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -30,11 +95,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Memory
-memory = MemoryManager()
-
-# Groq client (lazy init)
-groq_client = None
+# Memory (opened in the lifespan; vector_memory once warm-up has built it)
+memory: Optional[MemoryManager] = None
+retention: Optional[RetentionManager] = None
+extractor: Optional[MemoryExtractor] = None
+retriever: Optional[MemoryRetriever] = None
+vector_memory = None
+response_cache: Optional[ResponseCache] = None
+admission = AdmissionController()
+single_flight = SingleFlight()
 
 SYSTEM_PROMPT = """Tu Riko hai — ek smart, caring AI assistant jo Hinglish mein baat karti hai. Tu ek real ladki jaisi hai — funny, warm, and always ready to help.
 
@@ -97,203 +166,805 @@ RULES for actions:
 """
 
 
-class ModelManager:
-    def __init__(self):
-        self.models = [
-            "llama-3.1-8b-instant",    # Primary: Fast & Cheap
-            "mixtral-8x7b-32768",      # Secondary: Robust & Smart
-            "gemma-7b-it",             # Tertiary: Reliable Fallback
-        ]
-
-    def chat_completion(self, client, messages, temperature=0.7, max_tokens=1024):
-        last_error = None
-        
-        for model in self.models:
-            try:
-                print(f"🧠 Trying model: {model}...")
-                completion = client.chat.completions.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens,
-                )
-                return completion.choices[0].message.content
-            except Exception as e:
-                error_msg = str(e)
-                print(f"❌ Model {model} failed: {error_msg}")
-                last_error = e
-                # If it's an auth error (401), don't retry other models
-                if "401" in error_msg:
-                    raise e
-                continue  # Try next model automatically
-        
-        # If all failed
-        raise last_error
-
 model_manager = ModelManager()
+# Background completions (memory extraction) get their own circuit breakers,
+# so their failures never take a model out of the chat rotation
+background_models = ModelManager()
 
 
-def get_groq_client(api_key: str = None):
-    """Get or create Groq client."""
-    global groq_client
-    
+class LatencyTracker:
+    """Rolling window of latency samples (ms) with percentile summary."""
+
+    def __init__(self, maxlen: int = 500):
+        self.samples = deque(maxlen=maxlen)
+        self.count = 0
+
+    def record(self, ms: float):
+        self.samples.append(ms)
+        self.count += 1
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {"count": 0}
+        ordered = sorted(self.samples)
+        pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 1)
+        return {
+            "count": self.count,
+            "p50_ms": pick(0.50),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "last_ms": round(self.samples[-1], 1),
+        }
+
+
+# Time-to-first-token and full-reply latency for /api/chat/stream
+ttft_tracker = LatencyTracker()
+stream_total_tracker = LatencyTracker()
+
+
+class GroqClientRegistry:
+    """One long-lived AsyncGroq client per API key, LRU-bounded.
+
+    Each client keeps its own keep-alive connection pool, so repeat requests
+    with the same key skip connection setup and TLS handshakes. Clients are
+    leased (``acquire``/``release``, or ``lease``); one evicted while leased
+    is closed when its last lease is released, not under a request using it.
+    """
+
+    def __init__(self, max_clients: int = 32):
+        self.max_clients = max_clients
+        self._clients: "OrderedDict[str, object]" = OrderedDict()
+        self._leases: Dict[int, int] = {}       # id(client) -> open leases
+        self._retired: Dict[int, object] = {}   # Evicted while leased: closed on last release
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str):
+        """The client for ``key`` (created on first use); hand it back with ``release``."""
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+            else:
+                client = self._create(key)
+                self._clients[key] = client
+                while len(self._clients) > self.max_clients:
+                    _, evicted = self._clients.popitem(last=False)
+                    if id(evicted) in self._leases:
+                        self._retired[id(evicted)] = evicted
+                    else:
+                        self._close_later(evicted)
+            self._leases[id(client)] = self._leases.get(id(client), 0) + 1
+            return client
+
+    def release(self, client):
+        with self._lock:
+            remaining = self._leases.pop(id(client), 0) - 1
+            if remaining > 0:
+                self._leases[id(client)] = remaining
+                return
+            retired = self._retired.pop(id(client), None)
+        if retired is not None:
+            self._close_later(retired)
+
+    @contextmanager
+    def lease(self, key: str):
+        client = self.acquire(key)
+        try:
+            yield client
+        finally:
+            self.release(client)
+
+    def _create(self, key: str):
+        import httpx
+        from groq import AsyncGroq
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10, keepalive_expiry=60),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        # The model router owns retries and fallback, so the SDK shouldn't retry on its own
+        return AsyncGroq(api_key=key, http_client=http_client, max_retries=0)
+
+    @staticmethod
+    def _close_later(client):
+        try:
+            asyncio.get_running_loop().create_task(client.close())
+        except RuntimeError:
+            pass  # No loop running; the pool is released with the object
+
+    async def close_all(self):
+        with self._lock:
+            clients = list(self._clients.values()) + list(self._retired.values())
+            self._clients.clear()
+            self._retired.clear()
+        for client in clients:
+            await client.close()
+
+
+groq_clients = GroqClientRegistry()
+
+
+def _resolve_api_key(api_key: str = None) -> Optional[str]:
     key = api_key or os.getenv("GROQ_API_KEY")
     if not key or key == "your_groq_api_key_here":
         return None
-    
+    return key
+
+
+@contextmanager
+def groq_client(api_key: str = None):
+    """Lease the pooled Groq client for this key (created on first use) for the block.
+
+    Yields None if there's no usable key or the client can't be created.
+    """
+    key = _resolve_api_key(api_key)
+    client = None
+    if key:
+        try:
+            client = groq_clients.acquire(key)
+        except Exception as e:
+            print(f"Groq init error: {e}")
     try:
-        from groq import Groq
-        groq_client = Groq(api_key=key)
-        
-        # Save key to .env - PRESERVE existing values
-        env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
-        existing_env = {}
-        if os.path.exists(env_path):
-            with open(env_path, "r") as f:
-                for line in f:
-                    line = line.strip()
-                    if "=" in line and not line.startswith("#"):
-                        k, v = line.split("=", 1)
-                        existing_env[k.strip()] = v.strip()
-        
-        existing_env["GROQ_API_KEY"] = key
-        
-        with open(env_path, "w") as f:
-            for k, v in existing_env.items():
-                f.write(f"{k}={v}\n")
-        
-        return groq_client
-    except Exception as e:
-        print(f"Groq init error: {e}")
-        return None
+        yield client
+    finally:
+        if client is not None:
+            groq_clients.release(client)
+
+
+def _persist_api_key(key: str):
+    """Save key to .env - PRESERVE existing values."""
+    os.environ["GROQ_API_KEY"] = key
+
+    env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".env")
+    existing_env = {}
+    if os.path.exists(env_path):
+        with open(env_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if "=" in line and not line.startswith("#"):
+                    k, v = line.split("=", 1)
+                    existing_env[k.strip()] = v.strip()
+
+    if existing_env.get("GROQ_API_KEY") == key:
+        return
+    existing_env["GROQ_API_KEY"] = key
+
+    with open(env_path, "w") as f:
+        for k, v in existing_env.items():
+            f.write(f"{k}={v}\n")
 
 
 class ChatRequest(BaseModel):
     message: str
     api_key: Optional[str] = None
+    session_id: str = Field(DEFAULT_SESSION, min_length=1, max_length=64)
 
 
 class ApiKeyRequest(BaseModel):
     api_key: str
 
 
+SUMMARY_HEADER = "Pichli baaton ka summary:\n"
+RELEVANT_HEADER = "Is baat se judi yaadein:\n"
+
+
+class PromptBuilder:
+    """Assembles the model messages with as little per-turn work as possible.
+
+    The system prompt template is split once around ``{memory_context}``, and
+    the finished system message is reused for as long as the session's
+    (memoized) memory summary is unchanged.
+    """
+
+    def __init__(self, template: str, empty_context: str = "Koi saved memory nahi hai abhi."):
+        self.prefix, self.suffix = template.split("{memory_context}", 1)
+        self.empty_context = empty_context
+        # session_id -> (memory summary it was built from, system message)
+        self._system_messages: "OrderedDict[str, tuple]" = OrderedDict()
+        self.max_sessions = 1000
+        self.hits = 0
+        self.misses = 0
+
+    def system_message(self, memory_context: str, session_id: str) -> dict:
+        cached = self._system_messages.get(session_id)
+        if cached is not None and cached[0] == memory_context:
+            self.hits += 1
+            self._system_messages.move_to_end(session_id)
+            return cached[1]
+
+        self.misses += 1
+        message = {"role": "system", "content": self.prefix + (memory_context or self.empty_context) + self.suffix}
+        self._system_messages[session_id] = (memory_context, message)
+        self._system_messages.move_to_end(session_id)
+        while len(self._system_messages) > self.max_sessions:
+            self._system_messages.popitem(last=False)
+        return message
+
+    def build(self, session_id: str = DEFAULT_SESSION, user_message: str = "") -> list:
+        """Build the system prompt + token-budgeted history for a completion.
+
+        The (cached) system message carries the session's core facts; facts
+        and older summary lines relevant to ``user_message`` are retrieved
+        per turn into a separate system message. History is packed
+        newest-first into HISTORY_BUDGET tokens; turns that don't fit are
+        folded into the session's rolling summary, sent as another system
+        message.
+        """
+        memory_context = memory.get_memory_summary(session_id)
+        messages = [self.system_message(memory_context, session_id)]
+
+        # Add conversation history (short-term memory); packed on the stored
+        # turns, whose timestamps are the summary's folded-turn cursor
+        history = memory.get_short_term(session_id)
+        kept, dropped = pack_history(history)
+        context = memory.get_conversation_context(session_id)
+        kept = context[len(dropped):] or context[-1:]
+
+        state = memory.get_summary_state(session_id)
+        summary = state.text
+        if dropped:
+            # The extractor's digest is kept whole; only the lines after it roll
+            tail, folded_through = roll_summary(
+                state.tail, dropped, budget=max(0, SUMMARY_BUDGET - count_tokens(state.digest)),
+                folded_through=state.folded_through,
+            )
+            # Only turns not folded in before move the cursor, so a row is written per new fold
+            if folded_through != state.folded_through:
+                summary = "\n".join(part for part in (state.digest, tail) if part)
+                memory.save_summary(summary, session_id, folded_through, digest=state.digest)
+        if summary:
+            messages.append({"role": "system", "content": SUMMARY_HEADER + summary})
+
+        relevant = self.relevant_memories(user_message, session_id, memory_context, summary)
+        if relevant:
+            messages.append({"role": "system", "content": RELEVANT_HEADER + "\n".join(relevant)})
+
+        messages.extend(kept)
+        if metrics.METRICS:
+            PROMPT_TOKENS.observe(prompt_tokens(messages), "total")
+            PROMPT_TOKENS.observe(prompt_tokens(kept), "history")
+        return messages
+
+    @staticmethod
+    def relevant_memories(user_message: str, session_id: str, memory_context: str, summary: str) -> list:
+        """Retrieved facts and old summary lines not already in the prompt."""
+        if not user_message:
+            return []
+        core = set(memory_context.splitlines())
+        k = RELEVANT_K + len(core)
+        # Keyword (bm25) and semantic (vector) rankings, merged by reciprocal rank fusion
+        fused = {}
+        rankings = [retriever.search_facts(user_message, session_id, k=k)]
+        if vector_memory is not None:
+            rankings.append(vector_memory.search(user_message, session_id, k=k))
+        for ranking in rankings:
+            for rank, fact in enumerate(ranking):
+                line = f"[{fact['category']}] {fact['value']}"
+                if line not in core:
+                    fused[line] = fused.get(line, 0.0) + 1.0 / (60 + rank)
+        lines = sorted(fused, key=fused.get, reverse=True)[:RELEVANT_K]
+        lines.extend(retriever.search_summaries(user_message, session_id, exclude=summary.splitlines()))
+        return lines
+
+    def stats(self) -> dict:
+        def rate(hits, misses):
+            total = hits + misses
+            return round(hits / total, 3) if total else None
+
+        return {
+            "summary_hits": memory.summary_hits,
+            "summary_misses": memory.summary_misses,
+            "summary_hit_rate": rate(memory.summary_hits, memory.summary_misses),
+            "system_message_hits": self.hits,
+            "system_message_misses": self.misses,
+            "system_message_hit_rate": rate(self.hits, self.misses),
+        }
+
+
+prompt_builder = PromptBuilder(SYSTEM_PROMPT)
+
+
+@timed(PROMPT_BUILD_SECONDS)
+def _build_messages(user_message: str, session_id: str = DEFAULT_SESSION) -> list:
+    """Build the system prompt + short-term history for a completion."""
+    return prompt_builder.build(session_id, user_message)
+
+
+def _reply_context(messages: list) -> str:
+    """What a cached reply depends on besides the message (response cache fingerprint).
+
+    The system message with the core facts, plus any facts retrieved for this
+    message. The rolling summary and retrieved summary lines are left out:
+    they change nearly every turn, and cached turns are context-free.
+    """
+    parts = []
+    for m in messages:
+        if m["role"] != "system" or m["content"].startswith(SUMMARY_HEADER):
+            continue
+        if m["content"].startswith(RELEVANT_HEADER):
+            parts.extend(line for line in m["content"].splitlines()[1:] if line.startswith("["))
+        else:
+            parts.append(m["content"])
+    return "\n".join(parts)
+
+
+def _ai_error_to_http(e: Exception) -> HTTPException:
+    """Map an upstream failure to the user-facing HTTP error."""
+    if isinstance(e, HTTPException):
+        return e
+    if isinstance(e, Rejected):
+        return _rejected_to_http(e)
+    if isinstance(e, Abandoned):
+        return HTTPException(status_code=503, detail="Pichla message beech mein atak gaya, phir bhejo! 🔁",
+                             headers={"Retry-After": "1"})
+    error_msg = str(e)
+    print(f"❌ AI ERROR: {error_msg}")  # Critical for debugging
+    if "rate limit" in error_msg.lower():
+        return HTTPException(status_code=429, detail="Dimag thak gaya (Rate Limit). 2 min ruk jao! 🛑",
+                             headers={"Retry-After": "120"})
+    if "401" in error_msg:
+        return HTTPException(status_code=401, detail="API Key galat hai! 🔑")
+    return HTTPException(status_code=500, detail=f"Mera server down hai ({error_msg}) 😵")
+
+
+def _rejected_to_http(e: Rejected) -> HTTPException:
+    """A turn turned away locally, before it reached Groq."""
+    if e.status == 429:
+        detail = f"Thoda dheere yaar! Bahut saare messages ek saath. {e.retry_after}s ruk jao 🛑"
+    else:
+        detail = f"Abhi bahut busy hoon, {e.retry_after}s mein phir try karo! ⏳"
+    return HTTPException(status_code=e.status, detail=detail, headers={"Retry-After": str(e.retry_after)})
+
+
+def _admit(request: ChatRequest) -> str:
+    """Charge the turn to its client before any work is done; returns the client key."""
+    key = client_key(request.api_key, request.session_id)
+    try:
+        admission.admit(key)
+    except Rejected as e:
+        raise _rejected_to_http(e)
+    return key
+
+
+def _flight_key(request: ChatRequest) -> tuple:
+    """Which in-flight turn a resubmit of this message would be a copy of (see SingleFlight)."""
+    return single_flight.key(request.session_id, request.message, memory.context_version(request.session_id))
+
+
+def _missing_key() -> HTTPException:
+    return HTTPException(status_code=400, detail="Groq API key not set. Please provide your API key.")
+
+
+def _require_api_key(api_key: Optional[str]):
+    """Refuse a model turn up front, before anything is stored, if there's no key to call with."""
+    if not _resolve_api_key(api_key):
+        raise _missing_key()
+
+
+@contextmanager
+def _leased_client_or_400(api_key: Optional[str]):
+    """The Groq client for a model call, held until the call is done."""
+    with groq_client(api_key) as client:
+        if client is None:
+            raise _missing_key()
+        yield client
+
+
 @app.post("/api/chat")
 async def chat(request: ChatRequest, background_tasks: BackgroundTasks):
     """Process a chat message and return AI response in Hindi."""
-    client = get_groq_client(request.api_key)
-    if not client:
-        raise HTTPException(
-            status_code=400,
-            detail="Groq API key not set. Please provide your API key."
-        )
+    started = time.perf_counter()
+    # Obvious ACTION commands ("YouTube kholo") are answered locally
+    intent = intent_engine.answer(request.message)
+    if not intent:
+        _require_api_key(request.api_key)
+    # A resubmit of a turn still waiting on the model shares its reply: no
+    # second upstream call, no second copy of the turn in memory
+    flight = None if intent else single_flight.get(_flight_key(request))
+    if flight is not None:
+        try:
+            ai_response = await single_flight.wait(flight)
+        except Exception as e:
+            CHAT_SECONDS.observe(time.perf_counter() - started, "chat", "error")
+            raise _ai_error_to_http(e)
+        CHAT_SECONDS.observe(time.perf_counter() - started, "chat", "coalesced")
+        return {"response": ai_response, "timestamp": datetime.now().isoformat()}
+    # Bursts are turned away here, before anything is stored or sent upstream
+    key = None if intent else _admit(request)
     
     # Store user message in memory
-    memory.add_message("user", request.message)
-    
-    # Build context with memories
-    memory_context = memory.get_memory_summary()
-    system_msg = SYSTEM_PROMPT.replace("{memory_context}", memory_context or "Koi saved memory nahi hai abhi.")
+    memory.add_message("user", request.message, request.session_id)
     
-    # Build messages for AI
-    messages = [{"role": "system", "content": system_msg}]
-    
-    # Add conversation history (short-term memory)
-    conversation = memory.get_conversation_context()
-    messages.extend(conversation)
+    if intent:
+        ai_response = intent.reply
+    else:
+        messages = _build_messages(request.message, request.session_id)
+        # Short context-free turns ("hi") are answered from cache
+        ai_response = response_cache.get(request.message, _reply_context(messages))
+        if ai_response is not None:
+            admission.refund(key)
+    source = "intent" if intent else "cache"
+    if ai_response is None:
+        source = "model"
+        flight_key = _flight_key(request)
+        flight = single_flight.lead(flight_key)
+        try:
+            # Use ModelManager for automatic fallback
+            with _leased_client_or_400(request.api_key) as client:
+                async with admission.slot():
+                    ai_response = await model_manager.chat_completion(
+                        client, 
+                        messages,
+                        temperature=0.8,
+                        max_tokens=600
+                    )
+        except Exception as e:
+            single_flight.finish(flight_key, flight, error=e)
+            CHAT_SECONDS.observe(time.perf_counter() - started, "chat", "error")
+            raise _ai_error_to_http(e)
+        finally:
+            single_flight.finish(flight_key, flight, ai_response)
+        response_cache.put(request.message, _reply_context(messages), ai_response)
+        
+    # Store in memory (Local + Cloud). The user message was already added
+    # above; the local write-behind queue commits both off the request path.
+    memory.add_message("assistant", ai_response, request.session_id)
+    # Queue for Supabase in background (batched by the outbox sync worker)
+    background_tasks.add_task(
+        supabase_manager.save_messages,
+        [("user", request.message), ("assistant", ai_response)],
+        session_id=request.session_id
+    )
     
+    CHAT_SECONDS.observe(time.perf_counter() - started, "chat", source)
+    return {
+        "response": ai_response,
+        "timestamp": datetime.now().isoformat()
+    }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _error_event(e: Exception) -> str:
+    err = _ai_error_to_http(e)
+    event = {"status": err.status_code, "detail": err.detail}
+    if err.headers:
+        event["retry_after"] = int(err.headers["Retry-After"])
+    return _sse("error", event)
+
+
+async def _follow_flight(flight):
+    """SSE for a resubmitted turn: the original's reply, in one token event."""
+    started = time.perf_counter()
     try:
-        # Use ModelManager for automatic fallback
-        ai_response = model_manager.chat_completion(
-            client, 
-            messages,
-            temperature=0.8,
-            max_tokens=600
+        ai_response = await single_flight.wait(flight)
+    except Exception as e:
+        CHAT_SECONDS.observe(time.perf_counter() - started, "stream", "error")
+        yield _error_event(e)
+        return
+    total_ms = (time.perf_counter() - started) * 1000
+    CHAT_SECONDS.observe(total_ms / 1000, "stream", "coalesced")
+    yield _sse("token", {"delta": ai_response})
+    yield _sse("done", {
+        "response": ai_response,
+        "ttft_ms": round(total_ms, 1),
+        "total_ms": round(total_ms, 1),
+        "cached": False,
+        "fast_path": False,
+        "coalesced": True,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+async def _yield_local(response: str):
+    """A reply produced without the model (cache or intent fast path), sent as one token event."""
+    yield response
+
+
+async def _stream_model(api_key: Optional[str], messages: list):
+    """Model tokens, once one of the worker's completion slots is free."""
+    with _leased_client_or_400(api_key) as client:
+        async with admission.slot():
+            async for delta in model_manager.stream_completion(
+                client,
+                messages,
+                temperature=0.8,
+                max_tokens=600
+            ):
+                yield delta
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest, background_tasks: BackgroundTasks):
+    """Stream the AI response token-by-token as Server-Sent Events.
+
+    Events: ``token`` ({"delta"}), then ``done`` ({"response", "ttft_ms",
+    "total_ms", "cached", "fast_path", "coalesced"?, "timestamp"}) or ``error`` ({"status", "detail",
+    "retry_after"?}). Rate-limited turns are refused with 429/503 + Retry-After before streaming.
+    A resubmit of a turn still in flight gets that turn's reply (``coalesced``).
+    """
+    intent = intent_engine.answer(request.message)
+    if not intent:
+        _require_api_key(request.api_key)
+    flight = None if intent else single_flight.get(_flight_key(request))
+    if flight is not None:
+        return StreamingResponse(
+            _follow_flight(flight),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
         )
-        
-        # Store in memory (Local + Cloud)
-        memory.add_message("user", request.message)
-        # Run Supabase inserts in background
-        background_tasks.add_task(supabase_manager.save_message, "user", request.message)
-        
-        memory.add_message("assistant", ai_response)
-        background_tasks.add_task(supabase_manager.save_message, "assistant", ai_response)
-        
-        return {
+    key = None if intent else _admit(request)
+    
+    memory.add_message("user", request.message, request.session_id)
+    messages = None if intent else _build_messages(request.message, request.session_id)
+    if intent:
+        local_reply = intent.reply
+    else:
+        local_reply = response_cache.get(request.message, _reply_context(messages))
+        if local_reply is not None:
+            admission.refund(key)
+    flight_key = None if local_reply is not None else _flight_key(request)
+
+    # Filled in by the stream; read by the background cloud sync afterwards
+    turn = {}
+
+    async def event_stream():
+        # Led from here rather than the handler: a client gone before the
+        # stream starts never runs this body, so there's no flight to leak
+        flight = single_flight.lead(flight_key) if flight_key is not None else None
+        started = time.perf_counter()
+        ttft_ms = None
+        parts = []
+        try:
+            if local_reply is not None:
+                tokens = _yield_local(local_reply)
+            else:
+                tokens = _stream_model(request.api_key, messages)
+            async for delta in tokens:
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                    ttft_tracker.record(ttft_ms)
+                    CHAT_TTFT_SECONDS.observe(ttft_ms / 1000)
+                parts.append(delta)
+                yield _sse("token", {"delta": delta})
+            ai_response = "".join(parts)
+            single_flight.finish(flight_key, flight, ai_response)
+        except Exception as e:
+            single_flight.finish(flight_key, flight, error=e)
+            CHAT_SECONDS.observe(time.perf_counter() - started, "stream", "error")
+            yield _error_event(e)
+            return
+        finally:
+            # Client gone mid-stream: duplicates stop waiting (no-op once finished)
+            single_flight.finish(flight_key, flight)
+
+        total_ms = (time.perf_counter() - started) * 1000
+        stream_total_tracker.record(total_ms)
+        CHAT_SECONDS.observe(total_ms / 1000, "stream",
+                             "intent" if intent else "cache" if local_reply is not None else "model")
+        turn["response"] = ai_response
+        if local_reply is None:
+            response_cache.put(request.message, _reply_context(messages), ai_response)
+
+        memory.add_message("assistant", ai_response, request.session_id)
+
+        yield _sse("done", {
             "response": ai_response,
+            "ttft_ms": round(ttft_ms or total_ms, 1),
+            "total_ms": round(total_ms, 1),
+            "cached": local_reply is not None and intent is None,
+            "fast_path": intent is not None,
             "timestamp": datetime.now().isoformat()
-        }
-        
-    except Exception as e:
-        error_msg = str(e)
-        print(f"❌ AI ERROR: {error_msg}")  # Critical for debugging
-        if "rate limit" in error_msg.lower():
-             raise HTTPException(status_code=429, detail="Dimag thak gaya (Rate Limit). 2 min ruk jao! 🛑")
-        if "401" in error_msg:
-             raise HTTPException(status_code=401, detail="API Key galat hai! 🔑")
-             
-        raise HTTPException(status_code=500, detail=f"Mera server down hai ({error_msg}) 😵")
-
+        })
 
+    def sync_turn():
+        if "response" not in turn:
+            return
+        supabase_manager.save_messages(
+            [("user", request.message), ("assistant", turn["response"])], session_id=request.session_id
+        )
 
+    # Cloud sync runs after the stream has been fully sent
+    background_tasks.add_task(sync_turn)
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=background_tasks,
+    )
 
 
-def _check_ai_memory_storage(ai_response: str, user_message: str):
+def _check_ai_memory_storage(ai_response: str, user_message: str, session_id: str = DEFAULT_SESSION):
     """Check if conversation contains important info to store long-term."""
-    important_keywords = [
-        "yaad rakhunga", "yaad rakhta", "note karta", "remember",
-        "याद रखूंगा", "याद रखता", "नोट करता",
-        "tumhara naam", "aapka naam", "your name"
-    ]
-    
-    combined = (ai_response + " " + user_message).lower()
-    for keyword in important_keywords:
-        if keyword in combined:
-            memory.store_long_term(
-                "conversation_highlight",
-                "important_exchange",
-                f"User: {user_message} | Riko: {ai_response[:200]}",
-                importance=4
-            )
-            break
+    if "conversation_highlight" in memory_matcher.categories(ai_response + " " + user_message):
+        memory.store_long_term(
+            "conversation_highlight",
+            "important_exchange",
+            f"User: {user_message} | Riko: {ai_response[:200]}",
+            importance=4,
+            session_id=session_id
+        )
 
 
 @app.post("/api/key")
 async def set_api_key(request: ApiKeyRequest):
     """Set the Groq API key."""
-    client = get_groq_client(request.api_key)
-    if client:
+    with groq_client(request.api_key) as client:
+        valid = client is not None
+    if valid:
+        if os.getenv("GROQ_API_KEY") != request.api_key:
+            await run_in_threadpool(_persist_api_key, request.api_key)
         return {"status": "ok", "message": "API key set successfully!"}
     else:
         raise HTTPException(status_code=400, detail="Invalid API key")
 
 
 @app.get("/api/memory")
-async def get_memory():
-    """Get conversation history and memories."""
+async def get_memory(session_id: str = Query(DEFAULT_SESSION, max_length=64)):
+    """Get recent memories plus the newest page of history.
+
+    Older history is paged via /api/memory/history?before_id=<history_next_before_id>.
+    """
+    memory.flush()  # Show writes still sitting in the write-behind queue
+    page = memory.get_history_page(session_id)
     return {
-        "short_term": memory.get_conversation_context(),
-        "long_term": memory.get_long_term_memories(),
-        "history": memory.get_all_history()
+        "short_term": memory.get_conversation_context(session_id),
+        "long_term": memory.get_long_term_memories(session_id=session_id),
+        "history": page["items"],
+        "history_next_before_id": page["next_before_id"]
     }
 
 
+@app.get("/api/memory/history")
+def get_history_page(
+    session_id: str = Query(DEFAULT_SESSION, max_length=64),
+    before_id: Optional[int] = Query(None, ge=1),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Page through history, newest first (keyset pagination on message id)."""
+    return memory.get_history_page(session_id, before_id, limit)
+
+
+@app.get("/api/memory/history.ndjson")
+def stream_history(session_id: str = Query(DEFAULT_SESSION, max_length=64)):
+    """Stream the full history, oldest first, as newline-delimited JSON."""
+    lines = (json.dumps(msg, ensure_ascii=False) + "\n" for msg in memory.iter_history(session_id))
+    return StreamingResponse(lines, media_type="application/x-ndjson")
+
+
 @app.post("/api/memory/clear")
-async def clear_memory():
+async def clear_memory(session_id: str = Query(DEFAULT_SESSION, max_length=64)):
     """Clear short-term memory."""
-    memory.clear_short_term()
+    memory.clear_short_term(session_id)
     return {"status": "ok", "message": "Short-term memory cleared"}
 
 
 @app.post("/api/memory/clear-all")
-async def clear_all_memory():
+async def clear_all_memory(session_id: str = Query(DEFAULT_SESSION, max_length=64)):
     """Clear all memory."""
-    memory.clear_all()
+    memory.clear_all(session_id)
     return {"status": "ok", "message": "All memory cleared"}
 
 
+def _startup():
+    """What a request can't do without: the memory DB, caches and static index."""
+    global memory, retention, extractor, retriever, response_cache, assets
+    memory = MemoryManager()
+    retention = RetentionManager(memory)
+    # Facts and summaries from recent turns, one batched completion per session;
+    # holds off while chat turns are queued for a model slot
+    extractor = MemoryExtractor(memory, background_models, groq_client, busy=lambda: admission.waiting > 0)
+    retriever = MemoryRetriever(memory)
+    response_cache = ResponseCache(memory.store)
+    assets = AssetIndex(public_dir)
+    retention.start()
+    extractor.start()
+    # Connects on its own thread; rows wait in the local outbox until then
+    supabase_manager.start()
+
+
+def _build_vector_memory():
+    """Import NumPy (and any embedding model) and catch the index up."""
+    global vector_memory
+    started = time.perf_counter()
+    from vector_memory import VectorMemory
+    index = VectorMemory(memory)
+    index.sync()
+    vector_memory = index
+    boot.mark("vector_memory", started)
+
+
+def _import_groq():
+    started = time.perf_counter()
+    with groq_client() as client:
+        if client is None:
+            import groq  # noqa: F401  (still worth having loaded before the first key arrives)
+    boot.mark("groq_import", started)
+
+
+async def _warm_up():
+    """Off the request path: heavy imports, the semantic index, the first Groq connection.
+
+    Until this finishes turns still work - retrieval is keyword-only and the
+    first model call pays for the import and handshake itself.
+    """
+    started = time.perf_counter()
+    if STARTUP_WARMUP:
+        steps = [asyncio.to_thread(_build_vector_memory), asyncio.to_thread(_import_groq)]
+        results = await asyncio.gather(*steps, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                boot.errors.append(repr(result))
+        with groq_client() as client:
+            if client is not None:
+                connect_started = time.perf_counter()
+                try:
+                    # Any authenticated call will do; it leaves a pooled TLS connection behind
+                    await asyncio.wait_for(client.models.list(), WARMUP_TIMEOUT)
+                    boot.mark("groq_connect", connect_started)
+                except Exception as e:
+                    boot.errors.append(f"groq connect: {e!r}")
+    else:
+        await asyncio.to_thread(_build_vector_memory)
+    boot.mark("warmup", started)
+    boot.ready = True
+    print(f"✅ Warm-up done in {boot.phases['warmup']:.0f} ms")
+
+
+@app.get("/api/stats")
+async def stats():
+    """Server-side latency stats for the streaming chat path."""
+    return {
+        "time_to_first_token": ttft_tracker.summary(),
+        "stream_total": stream_total_tracker.summary(),
+        "supabase_sync": supabase_manager.sync_status(),
+        "hot_sessions": len(memory.sessions),
+        "cross_worker_refreshes": memory.refreshes,
+        "retention": retention.stats(),
+        "memory_extraction": extractor.stats(),
+        "prompt_cache": prompt_builder.stats(),
+        "memory_search": retriever.stats(),
+        "vector_memory": vector_memory.stats() if vector_memory else {"enabled": False, "loading": True},
+        "model_router": model_manager.stats(),
+        "background_model_router": background_models.stats(),
+        "response_cache": response_cache.stats(),
+        "intent_fast_path": intent_engine.stats(),
+        "static_assets": assets.stats(),
+        "admission": admission.stats(),
+        "single_flight": single_flight.stats(),
+        "boot": boot.stats(),
+    }
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus scrape endpoint (this worker's metrics)."""
+    if not metrics.METRICS:
+        raise HTTPException(status_code=404, detail="Metrics disabled")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+metrics.gauge("riko_admission_inflight", "Model calls running in this worker", lambda: admission.inflight)
+metrics.gauge("riko_admission_waiting", "Turns queued for a model slot", lambda: admission.waiting)
+metrics.gauge("riko_memory_write_queue", "Memory writes waiting for the write-behind flush",
+              lambda: memory.writer.pending if memory and memory.writer else 0)
+metrics.gauge("riko_supabase_backlog", "Outbox rows not yet synced to Supabase",
+              lambda: supabase_manager.outbox.backlog() if supabase_manager.outbox else 0)
+metrics.gauge("riko_response_cache_entries", "Replies held in the response cache", lambda: response_cache.stats()["entries"])
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness probe: 503 until background warm-up has finished."""
+    if not boot.ready:
+        return JSONResponse(status_code=503, content={"status": "warming_up", **boot.stats()})
+    return {"status": "ready", **boot.stats()}
+
+
 @app.get("/api/health")
 async def health():
-    """Health check endpoint."""
+    """Liveness check (answers as soon as the server is up)."""
     has_key = bool(os.getenv("GROQ_API_KEY") and os.getenv("GROQ_API_KEY") != "your_groq_api_key_here")
     return {
         "status": "online",
@@ -302,30 +973,32 @@ async def health():
     }
 
 
-# Serve static files
+# Serve static files (indexed, versioned and compressed once at startup)
 public_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "public")
-if os.path.exists(public_dir):
-    app.mount("/public", StaticFiles(directory=public_dir), name="public")
+assets: Optional[AssetIndex] = None
 
 
 @app.get("/")
-async def root():
+async def root(request: Request):
     """Serve the main HTML page."""
-    index_path = os.path.join(public_dir, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
+    response = assets.response("index.html", request.headers)
+    if response is not None:
+        return response
     return {"message": "Riko AI Assistant API is running"}
 
 
 @app.get("/{path:path}")
-async def serve_static(path: str):
-    """Serve static files."""
-    file_path = os.path.join(public_dir, path)
-    if os.path.exists(file_path) and os.path.isfile(file_path):
-        return FileResponse(file_path)
+async def serve_static(path: str, request: Request):
+    """Serve static files (/public/... and root-relative paths alike)."""
+    response = assets.response(path, request.headers, request.query_params.get("v"))
+    if response is not None:
+        return response
     raise HTTPException(status_code=404, detail="File not found")
 
 
+boot.mark("import", BOOT_STARTED)
+
+
 if __name__ == "__main__":
     import uvicorn
     print("\n" + "="*60)
@@ -0,0 +1,110 @@
+"""
+Single flight - duplicate chat turns share one in-flight completion
+"""
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+from response_cache import cache_key_text
+
+SINGLE_FLIGHT = os.getenv("SINGLE_FLIGHT", "1") == "1"
+# How long a duplicate waits on the original before giving up (seconds)
+SINGLE_FLIGHT_MAX_WAIT = float(os.getenv("SINGLE_FLIGHT_MAX_WAIT", "90"))
+
+
+class Abandoned(Exception):
+    """The turn a duplicate was waiting on ended without a reply."""
+
+
+class Flight:
+    """One in-flight turn: the future its duplicates await, and how many do."""
+    __slots__ = ("future", "waiters")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.waiters = 0
+
+
+class SingleFlight:
+    """In-flight model turns, keyed by (session, normalized message, context version).
+
+    The context version is the session's short-term window version right
+    after the original turn stored its user message. A resubmit of the same
+    message (voice double-trigger, a mobile retry) that arrives before the
+    reply sees exactly that version - nothing was said in between - and
+    attaches to the original's future instead of storing the message again
+    and making its own upstream call. Once the reply is in, the version has
+    moved on and a repeat is a new turn.
+
+    Per worker process and per event loop; the dict is only touched from
+    the loop, so it needs no lock.
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT, max_wait: float = SINGLE_FLIGHT_MAX_WAIT):
+        self.enabled = enabled
+        self.max_wait = max_wait
+        self._flights: Dict[Tuple, Flight] = {}
+        self.leaders = 0
+        self.coalesced = 0
+        self.abandoned = 0
+        self.peak_waiters = 0
+
+    @staticmethod
+    def key(session_id: str, message: str, version: int) -> Tuple:
+        return (session_id, cache_key_text(message), version)
+
+    def get(self, key: Tuple) -> Optional[Flight]:
+        """The in-flight turn a duplicate should join, if any."""
+        if not self.enabled:
+            return None
+        return self._flights.get(key)
+
+    def lead(self, key: Tuple) -> Optional[Flight]:
+        """Register a turn about to call the model; resolve it with ``finish``."""
+        if not self.enabled:
+            return None
+        flight = self._flights[key] = Flight(asyncio.get_running_loop().create_future())
+        self.leaders += 1
+        return flight
+
+    def finish(self, key: Tuple, flight: Optional[Flight], response: Optional[str] = None,
+               error: Optional[BaseException] = None):
+        """Hand the reply (or failure) to every duplicate and retire the key."""
+        if flight is None:
+            return
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+        future = flight.future
+        if future.done():
+            return
+        if response is not None:
+            future.set_result(response)
+            return
+        if error is None and flight.waiters:
+            self.abandoned += flight.waiters
+        future.set_exception(error or Abandoned("original request ended without a reply"))
+        future.exception()  # Marked retrieved, so asyncio doesn't log it when nobody waited
+
+    async def wait(self, flight: Flight) -> str:
+        """The original turn's reply. Raises its error, or Abandoned on timeout."""
+        self.coalesced += 1
+        flight.waiters += 1
+        self.peak_waiters = max(self.peak_waiters, flight.waiters)
+        try:
+            # Shielded: a duplicate hanging up must not cancel the original
+            return await asyncio.wait_for(asyncio.shield(flight.future), self.max_wait)
+        except asyncio.TimeoutError:
+            self.abandoned += 1
+            raise Abandoned("timed out waiting for the original request")
+        finally:
+            flight.waiters -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "in_flight": len(self._flights),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "peak_waiters": self.peak_waiters,
+        }
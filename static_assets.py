@@ -0,0 +1,263 @@
+"""
+Static assets - fingerprinted, precompressed frontend files served from memory
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import posixpath
+import re
+import threading
+from typing import Dict, Optional
+
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only without it
+    brotli = None
+
+# Files above this size are hashed at startup but streamed from disk
+STATIC_INLINE_MAX_BYTES = int(os.getenv("STATIC_INLINE_MAX_BYTES", str(8 * 1024 * 1024)))
+# Re-check file mtimes on every request (frontend development without restarts)
+STATIC_RELOAD = os.getenv("STATIC_RELOAD", "0") == "1"
+COMPRESS_MIN_BYTES = 512
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+COMPRESSIBLE = ("text/", "application/javascript", "application/json", "image/svg+xml", "application/xml")
+
+# References rewritten to carry ?v=<version>, so each can be cached forever
+_HTML_REF = re.compile(r'''(?P<pre>\b(?:src|href)=)(?P<q>["'])(?P<url>[^"'?#:]+)(?P=q)''')
+_JS_REF = re.compile(r'''(?P<pre>\bfrom\s*|\bimport\s*\(?\s*)(?P<q>["'])(?P<url>\.{1,2}/[^"'?#]+)(?P=q)''')
+_CSS_REF = re.compile(r'''(?P<pre>url\(\s*)(?P<q>["']?)(?P<url>[^"')?#:]+)(?P=q)''')
+
+mimetypes.add_type("application/javascript", ".js")
+mimetypes.add_type("application/javascript", ".mjs")
+mimetypes.add_type("model/gltf-binary", ".vrm")
+
+
+class Asset:
+    __slots__ = ("path", "file_path", "content_type", "version", "etags", "variants", "mtime")
+
+    def __init__(self, path: str, file_path: str, content_type: str, version: str,
+                 variants: Dict[str, bytes], mtime: float):
+        self.path = path
+        self.file_path = file_path
+        self.content_type = content_type
+        self.version = version
+        # encoding -> bytes ("identity" missing for files streamed from disk)
+        self.variants = variants
+        # Strong ETags differ per encoding: the bytes on the wire differ
+        self.etags = {"identity": f'"{version}"'}
+        self.etags.update({enc: f'"{version}-{enc}"' for enc in variants if enc != "identity"})
+        self.mtime = mtime
+
+
+def _accepted_encodings(header: str) -> set:
+    """Codings the client accepts (q=0 excluded)."""
+    accepted = set()
+    for part in header.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q=") and q[2:].strip() in ("0", "0.0", "0.00", "0.000"):
+            continue
+        if coding:
+            accepted.add(coding.strip())
+    return accepted
+
+
+class AssetIndex:
+    """Everything under ``public/`` read, versioned and compressed once at startup.
+
+    Each file's version is a content hash. References from HTML (src/href),
+    JS modules (relative imports) and CSS (url()) to other indexed files are
+    rewritten to ``?v=<version>``, dependencies first, so a changed module
+    changes the URL of everything that imports it. Requests carrying the
+    current version get ``Cache-Control: immutable``; unversioned ones
+    (index.html, bookmarks) get ``no-cache`` and a strong ETag, so
+    revalidation is a 304 with no body. gzip (and brotli, when installed)
+    variants are computed once; only indexed paths are ever served.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._assets: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+        self._versions: Dict[str, str] = {}
+        self.hits = 0
+        self.not_modified = 0
+        self.compressed_bytes_saved = 0
+        self.build()
+
+    # ---- Build ----
+
+    def _scan(self) -> Dict[str, str]:
+        files = {}
+        if not os.path.isdir(self.root):
+            return files
+        for directory, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                if name.startswith("."):
+                    continue
+                file_path = os.path.join(directory, name)
+                path = os.path.relpath(file_path, self.root).replace(os.sep, "/")
+                files[path] = file_path
+        return files
+
+    def build(self):
+        """(Re)index the whole directory."""
+        files = self._scan()
+        self._versions = {}
+        assets = {}
+        visiting = set()
+
+        def version_of(path: str) -> str:
+            if path in self._versions:
+                return self._versions[path]
+            visiting.add(path)
+            asset = self._load(path, files[path], files, version_of, visiting)
+            visiting.discard(path)
+            assets[path] = asset
+            self._versions[path] = asset.version
+            return asset.version
+
+        for path in sorted(files):
+            version_of(path)
+        with self._lock:
+            self._assets = assets
+
+        raw = sum(len(a.variants.get("identity", b"")) for a in assets.values())
+        best = sum(min(len(v) for v in a.variants.values()) for a in assets.values() if a.variants)
+        print(f"📦 Static assets: {len(assets)} files, {raw // 1024} KB -> {best // 1024} KB compressed"
+              f"{'' if brotli else ' (gzip only, brotli not installed)'}")
+
+    def _load(self, path: str, file_path: str, files: Dict[str, str], version_of, visiting: set) -> Asset:
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        mtime = os.path.getmtime(file_path)
+        if os.path.getsize(file_path) > STATIC_INLINE_MAX_BYTES:
+            digest = hashlib.blake2b(digest_size=8)
+            with open(file_path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+            return Asset(path, file_path, content_type, digest.hexdigest(), {}, mtime)
+
+        with open(file_path, "rb") as f:
+            body = f.read()
+        pattern = {"text/html": _HTML_REF, "application/javascript": _JS_REF, "text/css": _CSS_REF}.get(content_type)
+        if pattern is not None:
+            body = self._rewrite(path, body, pattern, files, version_of, visiting)
+
+        variants = {"identity": body}
+        if content_type.startswith(COMPRESSIBLE) and len(body) >= COMPRESS_MIN_BYTES:
+            # mtime=0 keeps the gzip bytes (and so the ETag) stable across restarts
+            candidates = [("gzip", gzip.compress(body, compresslevel=9, mtime=0))]
+            if brotli is not None:
+                candidates.append(("br", brotli.compress(body, quality=11)))
+            for encoding, data in candidates:
+                if len(data) < len(body) * 0.9:
+                    variants[encoding] = data
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        version = hashlib.blake2b(body, digest_size=8).hexdigest()
+        return Asset(path, file_path, content_type, version, variants, mtime)
+
+    def _rewrite(self, path: str, body: bytes, pattern, files: Dict[str, str], version_of, visiting: set) -> bytes:
+        try:
+            text = body.decode("utf-8")
+        except UnicodeDecodeError:
+            return body
+        base = posixpath.dirname(path)
+
+        def versioned(m: re.Match) -> str:
+            url = m.group("url")
+            target = self.resolve(url, base)
+            if target is None or target not in files or target in visiting:
+                return m.group(0)
+            q = m.group("q")
+            return f"{m.group('pre')}{q}{url}?v={version_of(target)}{q}"
+
+        return pattern.sub(versioned, text).encode("utf-8")
+
+    @staticmethod
+    def resolve(url: str, base: str = "") -> Optional[str]:
+        """Index key for a URL path ("/public/js/app.js" -> "js/app.js"), None if outside."""
+        if url.startswith("/"):
+            path = url.lstrip("/")
+            if path.startswith("public/"):
+                path = path[len("public/"):]
+        else:
+            path = posixpath.join(base, url)
+        path = posixpath.normpath(path)
+        if path.startswith("..") or path.startswith("/") or path == ".":
+            return None
+        return path
+
+    # ---- Serve ----
+
+    def get(self, path: str) -> Optional[Asset]:
+        key = self.resolve("/" + path)
+        if key is None:
+            return None
+        asset = self._assets.get(key)
+        if STATIC_RELOAD and (asset is None or self._changed(asset)):
+            self.build()
+            asset = self._assets.get(key)
+        return asset
+
+    @staticmethod
+    def _changed(asset: Asset) -> bool:
+        try:
+            return os.path.getmtime(asset.file_path) != asset.mtime
+        except OSError:
+            return True
+
+    def response(self, path: str, headers, version: Optional[str] = None) -> Optional[Response]:
+        """The response for a GET of ``path`` (None: not an asset)."""
+        asset = self.get(path)
+        if asset is None:
+            return None
+        self.hits += 1
+
+        accepted = _accepted_encodings(headers.get("accept-encoding", ""))
+        encoding = "identity"
+        for candidate in ("br", "gzip"):
+            if candidate in asset.variants and candidate in accepted:
+                encoding = candidate
+                break
+        out = {
+            "ETag": asset.etags[encoding],
+            "Cache-Control": IMMUTABLE if version == asset.version else REVALIDATE,
+        }
+        if len(asset.variants) > 1:
+            out["Vary"] = "Accept-Encoding"
+
+        if self._not_modified(headers.get("if-none-match"), asset):
+            self.not_modified += 1
+            return Response(status_code=304, headers=out)
+        if not asset.variants:
+            return FileResponse(asset.file_path, media_type=asset.content_type, headers=out)
+        if encoding != "identity":
+            out["Content-Encoding"] = encoding
+            self.compressed_bytes_saved += len(asset.variants["identity"]) - len(asset.variants[encoding])
+        return Response(asset.variants[encoding], media_type=asset.content_type, headers=out)
+
+    @staticmethod
+    def _not_modified(if_none_match: Optional[str], asset: Asset) -> bool:
+        """If-None-Match uses weak comparison; any encoding of the same bytes matches."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return bool(tags & set(asset.etags.values()))
+
+    def stats(self) -> Dict:
+        return {
+            "files": len(self._assets),
+            "brotli": brotli is not None,
+            "hits": self.hits,
+            "not_modified": self.not_modified,
+            "compressed_bytes_saved": self.compressed_bytes_saved,
+        }
@@ -1,26 +1,210 @@
 import os
+import random
+import socket
+import threading
 import time
+import uuid
 from datetime import datetime
-from supabase import create_client, Client
+from typing import Iterable, List, Optional, Tuple
+
 from dotenv import load_dotenv
 
+from memory_manager import DB_PATH
+from metrics import SUPABASE_PUSH_SECONDS, SUPABASE_SYNC_LAG
+from sqlite_store import SQLiteStore
+
 load_dotenv()
 
+# Outbox sync tuning
+SYNC_BATCH_SIZE = int(os.getenv("SUPABASE_SYNC_BATCH", "200"))
+SYNC_INTERVAL = float(os.getenv("SUPABASE_SYNC_INTERVAL", "2.0"))
+SYNC_MAX_BACKOFF = float(os.getenv("SUPABASE_SYNC_MAX_BACKOFF", "300"))
+# Optional unique column on the Supabase table. When set, every row carries a
+# stable "<origin>:<outbox id>" key and batches are upserted with
+# ignore-duplicates, so a batch resent after a crash can't create duplicates.
+DEDUPE_COLUMN = os.getenv("SUPABASE_DEDUPE_COLUMN", "")
+# Only one process pushes at a time (gunicorn runs several workers on one
+# outbox): the pusher holds a lease in supabase_sync_state, renewed before
+# every batch. Must outlast a push, or another worker could resend it.
+SYNC_LEASE = float(os.getenv("SUPABASE_SYNC_LEASE", "60"))
+
+# PostgreSQL error classes (SQLSTATE prefix) that resending won't fix: bad data
+# (22), constraint violations (23), undefined column/table and other schema
+# mismatches (42). PGRST1xx/2xx are PostgREST request and schema-cache errors.
+PERMANENT_SQLSTATES = ("22", "23", "42")
+PERMANENT_PGRST = ("PGRST1", "PGRST2")
+
+
+def _is_permanent_error(error: Exception) -> bool:
+    """A rejected row (4xx-type), as opposed to an outage, timeout or auth trouble worth retrying."""
+    status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return 400 <= status < 500 and status not in (401, 403, 408, 429)
+    code = str(getattr(error, "code", None) or "")
+    return code.startswith(PERMANENT_PGRST) or (len(code) == 5 and code.startswith(PERMANENT_SQLSTATES))
+
+
+class SupabaseOutbox:
+    """Durable local queue of rows waiting to be pushed to Supabase.
+
+    Rows live in the ``supabase_outbox`` table of the local SQLite DB. The id
+    of the last row confirmed by Supabase is kept as a high-water mark in
+    ``supabase_sync_state``; the mark is advanced and synced rows deleted in
+    the same local transaction, so a restart resumes exactly where it left off.
+    Rows Supabase rejects for good are moved to ``supabase_dead_letter`` in
+    that transaction instead of blocking the rows behind them. Processes
+    sharing the DB take turns through ``claim_lease``, so a row is pushed by
+    one of them only.
+    """
+
+    def __init__(self, db_path: str = DB_PATH):
+        self.store = SQLiteStore(db_path)
+        with self.store.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS supabase_outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    user_id TEXT,
+                    session_id TEXT
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS supabase_dead_letter (
+                    id INTEGER PRIMARY KEY,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    timestamp TEXT NOT NULL,
+                    user_id TEXT,
+                    session_id TEXT,
+                    error TEXT NOT NULL,
+                    failed_at TEXT NOT NULL
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS supabase_sync_state (
+                    name TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+            """)
+            for table in ("supabase_outbox", "supabase_dead_letter"):
+                columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+                if "session_id" not in columns:
+                    # Rows queued before sessions had their own column carry the session in user_id
+                    cursor.execute(f"ALTER TABLE {table} ADD COLUMN session_id TEXT")
+                    cursor.execute(f"UPDATE {table} SET session_id = user_id, user_id = NULL")
+            cursor.execute(
+                "INSERT OR IGNORE INTO supabase_sync_state (name, value) VALUES ('high_water_mark', '0')"
+            )
+            cursor.execute(
+                "INSERT OR IGNORE INTO supabase_sync_state (name, value) VALUES ('origin', ?)",
+                (uuid.uuid4().hex,)
+            )
+        self.origin = self._state("origin")
+
+    def _state(self, name: str) -> str:
+        return self.store.query_one("SELECT value FROM supabase_sync_state WHERE name = ?", (name,))[0]
+
+    @property
+    def high_water_mark(self) -> int:
+        return int(self._state("high_water_mark"))
+
+    def claim_lease(self, owner: str, ttl: float = SYNC_LEASE) -> bool:
+        """Take or renew the sync lease for ``owner``; False while another process holds it."""
+        now = time.time()
+        with self.store.transaction() as cursor:
+            row = cursor.execute("SELECT value FROM supabase_sync_state WHERE name = 'sync_lease'").fetchone()
+            if row:
+                holder, _, until = row[0].rpartition("|")
+                if holder != owner and float(until) > now:
+                    return False
+            cursor.execute(
+                "INSERT OR REPLACE INTO supabase_sync_state (name, value) VALUES ('sync_lease', ?)",
+                (f"{owner}|{now + ttl}",)
+            )
+        return True
+
+    def release_lease(self, owner: str):
+        self.store.execute(
+            "DELETE FROM supabase_sync_state WHERE name = 'sync_lease' AND value LIKE ?", (f"{owner}|%",)
+        )
+
+    def enqueue(self, rows: Iterable[Tuple[str, str, str, Optional[str], Optional[str]]]):
+        """Append (role, content, timestamp, user_id, session_id) rows in one transaction."""
+        self.store.executemany(
+            "INSERT INTO supabase_outbox (role, content, timestamp, user_id, session_id) VALUES (?, ?, ?, ?, ?)",
+            rows
+        )
+
+    def peek(self, limit: int) -> List[tuple]:
+        return self.store.query(
+            "SELECT id, role, content, timestamp, user_id, session_id FROM supabase_outbox "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (self.high_water_mark, limit)
+        )
+
+    def ack(self, last_id: int, rejected: Iterable[Tuple[tuple, str]] = ()):
+        """Advance the high-water mark and drop everything at or below it.
+
+        ``rejected`` (row, error) pairs are kept in the dead-letter table.
+        """
+        with self.store.transaction() as cursor:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO supabase_dead_letter "
+                "(id, role, content, timestamp, user_id, session_id, error, failed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [row + (error, datetime.now().isoformat()) for row, error in rejected]
+            )
+            cursor.execute(
+                "UPDATE supabase_sync_state SET value = ? WHERE name = 'high_water_mark'",
+                (str(last_id),)
+            )
+            cursor.execute("DELETE FROM supabase_outbox WHERE id <= ?", (last_id,))
+
+    def backlog(self) -> int:
+        return self.store.query_one(
+            "SELECT COUNT(*) FROM supabase_outbox WHERE id > ?", (self.high_water_mark,)
+        )[0]
+
+    def dead_letters(self) -> int:
+        return self.store.query_one("SELECT COUNT(*) FROM supabase_dead_letter")[0]
+
+
 class SupabaseManager:
-    def __init__(self):
+    def __init__(self, db_path: str = DB_PATH):
         self.url = os.getenv("SUPABASE_URL")
         self.key = os.getenv("SUPABASE_KEY")
-        self.client: Client = None
+        self.client = None  # supabase.Client, created on the sync worker
         self.is_connected = False
-        
-        self._connect()
+        self.db_path = db_path
+        self.outbox: Optional[SupabaseOutbox] = None
+
+        # Sync worker state
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._worker: Optional[threading.Thread] = None
+        # Held for a whole sync pass, so stop()'s drain never runs alongside the loop
+        self._sync_lock = threading.Lock()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.standby_passes = 0
+        self._failures = 0
+        self.batches_sent = 0
+        self.rows_sent = 0
+        self.rows_rejected = 0
+        self.last_sync_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url and self.key and "your_supabase_url" not in self.url)
 
     def _connect(self):
-        if not self.url or not self.key or "your_supabase_url" in self.url:
-            print("⚠️ Supabase credentials missing. Using local memory only.")
+        if not self.enabled:
             return
 
         try:
+            # The SDK takes ~200ms to import: load it here, off the boot path
+            from supabase import create_client
             self.client = create_client(self.url, self.key)
             self.is_connected = True
             print("✅ Connected to Supabase!")
@@ -28,22 +212,210 @@ class SupabaseManager:
             print(f"❌ Supabase connection failed: {e}")
             self.is_connected = False
 
-    def save_message(self, role, content, user_id=None):
-        if not self.is_connected:
+    def save_message(self, role, content, session_id=None, user_id=None):
+        """Queue one message for cloud sync."""
+        self.save_messages([(role, content)], session_id=session_id, user_id=user_id)
+
+    def save_messages(self, messages: List[Tuple[str, str]], session_id=None, user_id=None):
+        """Queue (role, content) messages in the local outbox.
+
+        ``session_id`` is the chat session (the browser's id, or "default");
+        ``user_id`` is only for a real account id, never a session.
+
+        This is a single local commit; the sync worker pushes the rows to
+        Supabase in batches, retrying outages with backoff until they are
+        accepted. Rows rejected for good are dead-lettered.
+        """
+        if not self.enabled:
             return None
 
+        timestamp = datetime.now().isoformat()
+        self._get_outbox().enqueue(
+            (role, content, timestamp, user_id, session_id) for role, content in messages
+        )
+        self._ensure_worker()
+        # A full batch goes out right away, unless we're backing off an outage
+        if not self._failures and self._get_outbox().backlog() >= SYNC_BATCH_SIZE:
+            self._wake.set()
+
+    def _get_outbox(self) -> SupabaseOutbox:
+        if self.outbox is None:
+            self.outbox = SupabaseOutbox(self.db_path)
+        return self.outbox
+
+    # ---- Sync worker ----
+
+    def _ensure_worker(self):
+        if self._worker and self._worker.is_alive():
+            return
+        self._stop.clear()
+        self._worker = threading.Thread(target=self._run, name="supabase-sync", daemon=True)
+        self._worker.start()
+
+    def _run(self):
+        # Warm the connection up front so the first batch doesn't pay for it
+        if not self.is_connected:
+            self._connect()
+        while not self._stop.is_set():
+            # Linger so messages from several turns share one round-trip
+            self._wake.wait(self._next_delay())
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self.sync_once()
+
+    def _next_delay(self) -> float:
+        """Regular interval, or exponential backoff with jitter after failures."""
+        if not self._failures:
+            return SYNC_INTERVAL
+        backoff = min(SYNC_MAX_BACKOFF, SYNC_INTERVAL * (2 ** self._failures))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def sync_once(self) -> int:
+        """Push every pending outbox row in batches, if this process holds the sync lease. Returns rows sent."""
+        if not self.enabled:
+            return 0
+        with self._sync_lock:
+            return self._sync_pass()
+
+    def _sync_pass(self) -> int:
+        outbox = self._get_outbox()
+        if not outbox.claim_lease(self.owner):
+            # Another worker is pushing this outbox
+            self.standby_passes += 1
+            return 0
+        if not self.is_connected:
+            self._connect()
+            if not self.is_connected:
+                self._failures += 1
+                return 0
+
+        sent = 0
+        while True:
+            # Renewed per batch; if it lapsed and someone else took over, leave the rest to them
+            if sent and not outbox.claim_lease(self.owner):
+                break
+            rows = outbox.peek(SYNC_BATCH_SIZE)
+            if not rows:
+                break
+            try:
+                with SUPABASE_PUSH_SECONDS.time():
+                    self._push(rows, outbox.origin)
+                outbox.ack(rows[-1][0])
+                accepted = len(rows)
+            except Exception as e:
+                try:
+                    if not _is_permanent_error(e):
+                        raise
+                    # Something in the batch is rejected for good: find it row by row
+                    accepted = self._push_singly(rows, outbox)
+                except Exception as e:
+                    self._failures += 1
+                    self.last_error = str(e)
+                    print(f"⚠️ Supabase sync failed (attempt {self._failures}, {outbox.backlog()} queued): {e}")
+                    break
+            self._observe_lag(rows[0][3])
+            self._failures = 0
+            self.batches_sent += 1
+            self.rows_sent += accepted
+            self.last_sync_at = time.time()
+            sent += accepted
+        return sent
+
+    def _push_singly(self, rows: List[tuple], outbox: SupabaseOutbox) -> int:
+        """Resend a rejected batch one row at a time, dead-lettering the rows Supabase refuses.
+
+        Returns rows accepted. A transient error acks the rows done so far and is re-raised.
+        """
+        rejected = []
+        for i, row in enumerate(rows):
+            try:
+                self._push([row], outbox.origin)
+            except Exception as e:
+                if not _is_permanent_error(e):
+                    if i:
+                        outbox.ack(rows[i - 1][0], rejected)
+                        self.rows_rejected += len(rejected)
+                    raise
+                rejected.append((row, str(e)))
+                self.last_error = str(e)
+                print(f"⚠️ Supabase rejected outbox row {row[0]}, moved to supabase_dead_letter: {e}")
+        outbox.ack(rows[-1][0], rejected)
+        self.rows_rejected += len(rejected)
+        return len(rows) - len(rejected)
+
+    @staticmethod
+    def _observe_lag(timestamp: str):
+        """How long the oldest row of a synced batch waited in the outbox."""
         try:
-            data = {
-                "role": role,
-                "content": content,
-                "timestamp": datetime.now().isoformat()
-            }
+            SUPABASE_SYNC_LAG.observe(max(0.0, time.time() - datetime.fromisoformat(timestamp).timestamp()))
+        except ValueError:
+            pass
+
+    def _push(self, rows: List[tuple], origin: str):
+        from postgrest.types import ReturnMethod
+        payload = []
+        for row_id, role, content, timestamp, user_id, session_id in rows:
+            data = {"role": role, "content": content, "timestamp": timestamp}
             if user_id:
                 data["user_id"] = user_id
-                
-            self.client.table("messages").insert(data).execute()
-        except Exception as e:
-            print(f"⚠️ Failed to save to Supabase: {e}")
+            if session_id:
+                data["session_id"] = session_id
+            if DEDUPE_COLUMN:
+                data[DEDUPE_COLUMN] = f"{origin}:{row_id}"
+            payload.append(data)
+
+        table = self.client.table("messages")
+        if DEDUPE_COLUMN:
+            table.upsert(
+                payload, ignore_duplicates=True, on_conflict=DEDUPE_COLUMN, returning=ReturnMethod.minimal
+            ).execute()
+        else:
+            table.insert(payload, returning=ReturnMethod.minimal).execute()
+
+    def start(self):
+        """Start the sync worker (picks up rows left over from a previous run).
+
+        The worker connects to Supabase in the background; until then rows
+        simply wait in the outbox.
+        """
+        if not self.enabled:
+            print("⚠️ Supabase credentials missing. Using local memory only.")
+            return
+        self._ensure_worker()
+
+    def stop(self, drain: bool = True):
+        """Stop the sync worker, pushing what's queued first if possible.
+
+        The drain only runs once the worker has exited; a worker stuck in a
+        slow push keeps its batch (and the lease, until it expires).
+        """
+        self._stop.set()
+        self._wake.set()
+        if self._worker:
+            self._worker.join(timeout=5)
+            if self._worker.is_alive():
+                return
+        if self.outbox is None:
+            return
+        if drain:
+            self.sync_once()
+        self.outbox.release_lease(self.owner)
+
+    def sync_status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "connected": self.is_connected,
+            "standby_passes": self.standby_passes,
+            "backlog": self.outbox.backlog() if self.outbox else 0,
+            "batches_sent": self.batches_sent,
+            "rows_sent": self.rows_sent,
+            "rows_rejected": self.rows_rejected,
+            "dead_letter": self.outbox.dead_letters() if self.outbox else 0,
+            "consecutive_failures": self._failures,
+            "last_sync_at": self.last_sync_at,
+            "last_error": self.last_error,
+        }
 
     def get_recent_messages(self, limit=10):
         if not self.is_connected:
@@ -55,9 +427,9 @@ class SupabaseManager:
                 .order("timestamp", desc=True)\
                 .limit(limit)\
                 .execute()
-            
+
             # Return in correct order (oldest first)
-            return response.data[::-1] 
+            return response.data[::-1]
         except Exception as e:
             print(f"⚠️ Failed to fetch from Supabase: {e}")
             return []
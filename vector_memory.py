@@ -0,0 +1,314 @@
+"""
+Vector memory - embedding index over long-term facts for semantic recall (CPU, NumPy)
+"""
+import os
+import re
+import threading
+import zlib
+from typing import Dict, List, Optional
+
+from memory_manager import MemoryManager, DEFAULT_SESSION
+from memory_patterns import normalize_text
+from memory_search import STOPWORDS
+from metrics import RETRIEVAL_SECONDS, timed
+
+try:
+    import numpy as np
+except ImportError:  # Optional: semantic recall is skipped without NumPy
+    np = None
+
+VECTOR_MEMORY = os.getenv("VECTOR_MEMORY", "1") == "1"
+# Optional sentence-transformers model (must already be in the local cache;
+# nothing is downloaded). Unset: the built-in hashing vectorizer.
+VECTOR_MODEL = os.getenv("VECTOR_MODEL", "")
+VECTOR_DIM = int(os.getenv("VECTOR_DIM", "256"))
+# Cosine similarity below this isn't worth a prompt line
+VECTOR_MIN_SIMILARITY = float(os.getenv("VECTOR_MIN_SIMILARITY", "0.25"))
+INDEX_BATCH = 512
+
+_WORDS = re.compile(r"\w+")
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and character trigrams, L2-normalized.
+
+    Needs no model or network; trigrams make spelling variants that Hinglish
+    is full of ("pasand"/"pasandida", "gaana"/"gana") land close together.
+    """
+
+    def __init__(self, dim: int = VECTOR_DIM):
+        self.dim = dim
+        self.name = f"hashing-{dim}"
+
+    def _features(self, text: str) -> List[int]:
+        features = []
+        for word in _WORDS.findall(normalize_text(text)):
+            if word in STOPWORDS:
+                continue
+            features.append(zlib.crc32(word.encode("utf-8")))
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                features.append(zlib.crc32(padded[i:i + 3].encode("utf-8")) ^ 0x5BD1E995)
+        return features
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            hashes = np.fromiter(self._features(text), dtype=np.uint32)
+            if not hashes.size:
+                continue
+            # Low bits pick the bucket, the top bit the sign
+            signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+            np.add.at(matrix[i], hashes % self.dim, signs)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return matrix / np.maximum(norms, 1e-9)
+
+
+class ModelEmbedder:
+    """A small sentence-transformers model on CPU (loaded from the local cache only)."""
+
+    def __init__(self, model_name: str):
+        os.environ.setdefault("HF_HUB_OFFLINE", "1")
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"{model_name}-{self.dim}"
+
+    def embed(self, texts: List[str]) -> "np.ndarray":
+        return self.model.encode(texts, batch_size=64, normalize_embeddings=True,
+                                 convert_to_numpy=True).astype(np.float32)
+
+
+def make_embedder():
+    if VECTOR_MODEL:
+        try:
+            return ModelEmbedder(VECTOR_MODEL)
+        except Exception as e:
+            print(f"⚠️ Embedding model {VECTOR_MODEL} unavailable ({e}), using hashing vectorizer")
+    return HashingEmbedder()
+
+
+class VectorMemory:
+    """Embeddings of long-term facts in a memory-mapped float32 matrix.
+
+    Row ``r`` of ``<db>.vectors`` holds the unit vector of the fact recorded
+    at row ``r`` of the ``memory_vectors`` table. Rows are assigned inside a
+    write transaction and the vector is written before it commits, so workers
+    sharing the DB share one index. New facts are embedded incrementally:
+    store_long_term marks the index stale and the next search embeds only
+    facts newer than the last indexed id. Facts deleted since (clear-all)
+    are dropped when a search meets them.
+    """
+
+    def __init__(self, memory: MemoryManager, path: Optional[str] = None, embedder=None):
+        self.memory = memory
+        self.store = memory.store
+        self.path = path or memory.db_path + ".vectors"
+        self.enabled = VECTOR_MEMORY and np is not None
+        self._lock = threading.Lock()
+        self._stale = True
+        self.searches = 0
+        self.embedded = 0
+        if not self.enabled:
+            if VECTOR_MEMORY:
+                print("⚠️ NumPy not installed, semantic memory recall disabled")
+            return
+
+        self.embedder = embedder or make_embedder()
+        self.dim = self.embedder.dim
+        with self.store.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS memory_vectors (
+                    row INTEGER PRIMARY KEY,
+                    fact_id INTEGER NOT NULL UNIQUE,
+                    session_id TEXT NOT NULL
+                )
+            """)
+            cursor.execute("CREATE TABLE IF NOT EXISTS memory_vector_state (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            row = cursor.execute("SELECT value FROM memory_vector_state WHERE name = 'embedder'").fetchone()
+            if row is None or row[0] != self.embedder.name or not os.path.exists(self.path):
+                # New index, or vectors from a different embedder: start over
+                cursor.execute("DELETE FROM memory_vectors")
+                cursor.execute(
+                    "INSERT OR REPLACE INTO memory_vector_state (name, value) VALUES ('embedder', ?)",
+                    (self.embedder.name,)
+                )
+                with open(self.path, "wb"):
+                    pass
+
+        self._matrix = None
+        self._capacity = 0
+        self._fact_ids = np.zeros(0, dtype=np.int64)
+        self._sessions = np.zeros(0, dtype=np.int32)  # -1: fact deleted
+        self._session_codes: Dict[str, int] = {}
+        self._session_rows: Dict[int, List[int]] = {}
+        self._row_arrays: Dict[int, "np.ndarray"] = {}  # _session_rows as arrays, built on demand
+        memory.fact_listeners.append(self._on_fact_stored)
+
+    # ---- Storage ----
+
+    def _open(self, rows_needed: int):
+        """(Re)map the vectors file with room for at least ``rows_needed`` rows."""
+        size = os.path.getsize(self.path) // (4 * self.dim)
+        if rows_needed > size:
+            size = max(rows_needed, 2 * size, 1024)
+            with open(self.path, "r+b") as f:
+                f.truncate(size * 4 * self.dim)
+        if self._matrix is None or size != self._capacity:
+            if self._matrix is not None:
+                self._matrix.flush()
+            self._matrix = np.memmap(self.path, dtype=np.float32, mode="r+", shape=(size, self.dim))
+            self._capacity = size
+
+    def _code(self, session_id: str) -> int:
+        code = self._session_codes.get(session_id)
+        if code is None:
+            code = self._session_codes[session_id] = len(self._session_codes)
+        return code
+
+    def _load_rows(self):
+        """Pick up rows added by this or another worker since the last call."""
+        rows = self.store.query(
+            "SELECT row, fact_id, session_id FROM memory_vectors WHERE row >= ? ORDER BY row",
+            (len(self._fact_ids),)
+        )
+        if not rows:
+            return
+        start = len(self._fact_ids)
+        self._fact_ids = np.concatenate([self._fact_ids, np.array([r[1] for r in rows], dtype=np.int64)])
+        codes = np.array([self._code(r[2]) for r in rows], dtype=np.int32)
+        self._sessions = np.concatenate([self._sessions, codes])
+        for offset, code in enumerate(codes.tolist()):
+            self._session_rows.setdefault(code, []).append(start + offset)
+            self._row_arrays.pop(code, None)
+        self._open(len(self._fact_ids))
+
+    def _on_fact_stored(self, session_id: str):
+        self._stale = True
+
+    # ---- Indexing ----
+
+    def sync(self) -> int:
+        """Embed facts committed since the last sync; returns how many."""
+        if not self.enabled:
+            return 0
+        with self._lock:
+            added = 0
+            while True:
+                self._load_rows()
+                last_id = int(self._fact_ids.max()) if len(self._fact_ids) else 0
+                facts = self.store.query(
+                    "SELECT id, value, session_id FROM long_term_memory WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, INDEX_BATCH)
+                )
+                if not facts:
+                    return added
+                vectors = self.embedder.embed([f[1] for f in facts])
+                with self.store.transaction() as cursor:
+                    start = cursor.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM memory_vectors").fetchone()[0]
+                    if start != len(self._fact_ids):
+                        # Another worker indexed in between; catch up and retry
+                        continue
+                    self._open(start + len(facts))
+                    self._matrix[start:start + len(facts)] = vectors
+                    self._matrix.flush()
+                    cursor.executemany(
+                        "INSERT INTO memory_vectors (row, fact_id, session_id) VALUES (?, ?, ?)",
+                        [(start + i, f[0], f[2]) for i, f in enumerate(facts)]
+                    )
+                added += len(facts)
+                self.embedded += len(facts)
+
+    # ---- Search ----
+
+    def _prepare(self):
+        if self._stale:
+            self._stale = False
+            self.memory.flush()
+        self.sync()
+
+    def search(self, message: str, session_id: str = DEFAULT_SESSION, k: int = 5) -> List[Dict]:
+        return self.search_many([message], session_id, k)[0]
+
+    @timed(RETRIEVAL_SECONDS, "vector")
+    def search_many(self, messages: List[str], session_id: str = DEFAULT_SESSION, k: int = 5) -> List[List[Dict]]:
+        """Batched cosine top-k for several messages against one session's facts."""
+        if not self.enabled or not messages:
+            return [[] for _ in messages]
+        self._prepare()
+        self.searches += len(messages)
+
+        rows = self._rows(session_id)
+        if not rows.size:
+            return [[] for _ in messages]
+        queries = self.embedder.embed(messages)
+        total = len(self._fact_ids)
+        if rows.size == total:
+            scores = queries @ self._matrix[:total].T
+        elif rows.size * 2 > total:
+            # Most of the index: one pass over the whole matrix beats a gather
+            scores = (queries @ self._matrix[:total].T)[:, rows]
+        else:
+            scores = queries @ self._matrix[rows].T
+
+        results = []
+        for row_scores in scores:
+            top = min(k * 2, row_scores.size)  # Headroom for deleted facts
+            best = np.argpartition(-row_scores, top - 1)[:top]
+            best = best[np.argsort(-row_scores[best])]
+            picked = [(int(rows[i]), float(row_scores[i])) for i in best if row_scores[i] >= VECTOR_MIN_SIMILARITY]
+            results.append(self._facts(picked)[:k])
+        return results
+
+    def _rows(self, session_id: str) -> "np.ndarray":
+        code = self._session_codes.get(session_id)
+        rows = self._row_arrays.get(code)
+        if rows is None:
+            rows = np.array(self._session_rows.get(code, ()), dtype=np.int64)
+            if code is not None:
+                self._row_arrays[code] = rows
+        return rows
+
+    def _facts(self, picked: List[tuple]) -> List[Dict]:
+        if not picked:
+            return []
+        ids = [int(self._fact_ids[row]) for row, _ in picked]
+        placeholders = ",".join("?" * len(ids))
+        found = {
+            r[0]: r for r in self.store.query(
+                f"SELECT id, category, key, value, timestamp, importance FROM long_term_memory WHERE id IN ({placeholders})",
+                ids
+            )
+        }
+        facts = []
+        for (row, score), fact_id in zip(picked, ids):
+            fact = found.get(fact_id)
+            if fact is None:
+                self._drop_row(row)
+                continue
+            facts.append({
+                "category": fact[1], "key": fact[2], "value": fact[3], "timestamp": fact[4],
+                "importance": fact[5], "similarity": round(score, 4),
+            })
+        return facts
+
+    def _drop_row(self, row: int):
+        """Forget a row whose fact was deleted (the vector stays, unused)."""
+        code = int(self._sessions[row])
+        if code >= 0:
+            self._sessions[row] = -1
+            rows = self._session_rows.get(code)
+            if rows and row in rows:
+                rows.remove(row)
+                self._row_arrays.pop(code, None)
+
+    def stats(self) -> Dict:
+        if not self.enabled:
+            return {"enabled": False}
+        return {
+            "enabled": True,
+            "embedder": self.embedder.name,
+            "vectors": len(self._fact_ids),
+            "embedded": self.embedded,
+            "searches": self.searches,
+        }
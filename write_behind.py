@@ -0,0 +1,153 @@
+"""
+Write-behind queue - coalesces SQLite inserts into batched transactions
+"""
+import atexit
+import sqlite3
+import threading
+import time
+from typing import List, Sequence, Tuple
+
+from metrics import SQLITE_SECONDS, timed
+from sqlite_store import SQLiteStore
+
+
+class WriteBehindQueue:
+    """Buffers writes and commits them from a background thread.
+
+    A batch is flushed when ``max_batch`` writes are pending, when the oldest
+    pending write is ``flush_interval`` seconds old, on ``flush()``, or on
+    ``close()`` (also registered with atexit so a normal exit drains it).
+    Consecutive writes with the same SQL go through one ``executemany``, and
+    each batch is a single transaction, so a chat turn costs one commit
+    instead of one per message — and none of it on the request path.
+
+    A batch that keeps failing is retried row by row after ``max_attempts``
+    flushes; rows SQLite rejects outright (constraint violations, bad
+    parameters) are logged and dropped so they can't block every later
+    write. Operational errors (locked or full database) are never dropped.
+    """
+
+    def __init__(self, store: SQLiteStore, max_batch: int = 64,
+                 flush_interval: float = 0.25, max_pending: int = 10000, max_attempts: int = 3):
+        self.store = store
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+
+        self._pending: List[Tuple[str, Sequence]] = []
+        self._cond = threading.Condition()
+        # Held while a batch is being written so flush() sees a fully committed state
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._failed_attempts = 0
+
+        self.batches_written = 0
+        self.rows_written = 0
+        self.rows_dropped = 0
+
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, sql: str, params: Sequence):
+        """Queue a write. Falls back to writing inline once shut down or overloaded."""
+        with self._cond:
+            if not self._closed:
+                self._pending.append((sql, params))
+                # Wake the worker to start the flush timer, or to flush a full batch
+                if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                    self._cond.notify()
+                if len(self._pending) < self.max_pending:
+                    return
+        # Closed, or the writer can't keep up: apply backpressure to the caller
+        self.flush()
+        if self._closed:
+            self._write([(sql, params)])
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def flush(self) -> bool:
+        """Synchronously commit everything queued so far."""
+        with self._write_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                return self._write(batch)
+            return True
+
+    def close(self):
+        """Stop the worker and drain whatever is still queued."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify()
+        self._thread.join(timeout=10)
+        self.flush()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._pending and not self._closed:
+                    self._cond.wait()
+                deadline = time.monotonic() + self.flush_interval
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                if self._closed:
+                    return
+            if not self.flush():
+                time.sleep(self.flush_interval)  # Back off before retrying a failed batch
+
+    @timed(SQLITE_SECONDS, "write_batch")
+    def _write(self, batch: List[Tuple[str, Sequence]]) -> bool:
+        try:
+            with self.store.transaction() as conn:
+                # Group runs of identical SQL so each run is one executemany
+                start = 0
+                while start < len(batch):
+                    sql = batch[start][0]
+                    end = start
+                    while end < len(batch) and batch[end][0] == sql:
+                        end += 1
+                    conn.executemany(sql, [params for _, params in batch[start:end]])
+                    start = end
+            self.batches_written += 1
+            self.rows_written += len(batch)
+            self._failed_attempts = 0
+            return True
+        except Exception as e:
+            print(f"⚠️ Memory write-behind failed ({len(batch)} rows): {e}")
+            self._failed_attempts += 1
+            if self._failed_attempts >= self.max_attempts:
+                # Likely one bad row: find it instead of retrying the whole batch forever
+                self._failed_attempts = 0
+                batch = self._write_singly(batch)
+                if not batch:
+                    return True
+            if not self._closed:
+                # Put the batch back at the front so ordering is kept for the retry
+                with self._cond:
+                    self._pending[:0] = batch
+            return False
+
+    def _write_singly(self, batch: List[Tuple[str, Sequence]]) -> List[Tuple[str, Sequence]]:
+        """Commit rows one at a time, dropping those SQLite rejects; returns the rows still to retry."""
+        for i, (sql, params) in enumerate(batch):
+            try:
+                with self.store.transaction() as conn:
+                    conn.execute(sql, params)
+            except sqlite3.OperationalError:
+                # Locked, read-only or full database: nothing wrong with the row itself
+                return batch[i:]
+            except Exception as e:
+                self.rows_dropped += 1
+                print(f"⚠️ Memory write-behind dropped a row it can't write ({sql.split('(')[0].strip()}): {e}")
+                continue
+            self.rows_written += 1
+        return []